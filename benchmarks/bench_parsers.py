@@ -0,0 +1,145 @@
+# benchmarks/bench_parsers.py
+"""
+Benchmark PDF text backends: throughput and extraction parity.
+
+Every backend reads the same corpus; parity is the share of documents
+whose regex extraction matches the pdfplumber reference field for field.
+A corpus directory is scored with the lenders in config.yaml; without one,
+synthetic statements are generated and scored with a built-in lender.
+
+Usage:
+    python -m benchmarks.bench_parsers [PDF_DIR] [N]
+"""
+import logging
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+import yaml
+
+from modules.extractor import Extractor
+from modules.pdf_parser import PDFParser
+from modules.text_backends import available_backends
+
+REFERENCE = 'pdfplumber'
+
+EXAMPLE_LENDER = {
+    "name": "example_bank",
+    "regex_patterns": {
+        "StatementDate": r"Statement Date[:\s]+(?P<value>\d{1,2}/\d{1,2}/\d{4})",
+        "MostRecentPaymentAmount": r"Payment Amount[:\s]*\$(?P<value>[\d,]+\.\d{2})",
+        "AmountPrincipal": r"Principal Balance[:\s]*\$(?P<value>[\d,]+\.\d{2})",
+        "AmountInterestRate": r"Interest Rate[:\s]*(?P<value>\d+\.\d+)%",
+        "PropertyAddress": r"Property Address[:\s]*(?P<value>[^\n]+)",
+    },
+}
+
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """
+    Build a minimal PDF with one Helvetica text line per string.
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        body = "".join(
+            "({}) Tj T*\n".format(line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)"))
+            for line in lines
+        )
+        stream = f"BT /F1 10 Tf 14 TL 72 740 Td\n{body}ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(out)
+
+
+def synthetic_corpus(n: int, seed: int = 42) -> List[bytes]:
+    rnd = random.Random(seed)
+    corpus = []
+    for i in range(n):
+        summary = [
+            "Example Bank Mortgage Statement",
+            f"Statement Date: {rnd.randint(1, 12)}/{rnd.randint(1, 28)}/{rnd.randint(2018, 2025)}",
+            f"Property Address: {i} Main St, Anytown, USA",
+            f"Principal Balance: ${rnd.uniform(1e4, 5e5):,.2f}",
+            f"Interest Rate: {rnd.uniform(2, 9):.3f}%",
+        ]
+        filler = [f"Transaction {j}: ${rnd.uniform(1, 5000):,.2f}" for j in range(40)]
+        payment = [f"Payment Amount: ${rnd.uniform(500, 5000):,.2f}"]
+        corpus.append(make_pdf([summary, filler, filler + payment]))
+    return corpus
+
+
+def load_corpus(path: str) -> List[bytes]:
+    corpus = []
+    for root, _, files in os.walk(path):
+        for fname in sorted(files):
+            if fname.lower().endswith(".pdf"):
+                with open(os.path.join(root, fname), "rb") as f:
+                    corpus.append(f.read())
+    return corpus
+
+
+def load_lenders() -> List[Dict]:
+    try:
+        with open("config.yaml") as f:
+            lenders = (yaml.safe_load(f) or {}).get("lenders") or []
+    except OSError:
+        lenders = []
+    return lenders or [EXAMPLE_LENDER]
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    if args and os.path.isdir(args[0]):
+        corpus = load_corpus(args[0])
+        source, lenders = args[0], load_lenders()
+    else:
+        corpus = synthetic_corpus(int(args[0]) if args else 200)
+        source, lenders = "synthetic", [EXAMPLE_LENDER]
+    # pdfminer logs a warning for every page without a CropBox
+    logging.getLogger("pdfminer").setLevel(logging.ERROR)
+    extractor = Extractor(lenders, {"model": "none"})
+    parser = PDFParser({})
+
+    results = {}
+    for name in available_backends():
+        start = time.perf_counter()
+        texts = [parser.extract_text(pdf, backend=name) for pdf in corpus]
+        elapsed = time.perf_counter() - start
+        fields = [extractor.extract_with_regex(t) for t in texts]
+        hit_rate = sum(extractor.score_text(t)[1] for t in texts) / max(len(texts), 1)
+        results[name] = (elapsed, fields, hit_rate)
+
+    reference = results.get(REFERENCE, next(iter(results.values())))[1]
+    print(f"corpus: {source} ({len(corpus)} documents)")
+    print(f"{'backend':<12}{'docs/s':>10}{'speedup':>9}{'hit rate':>10}{'parity':>8}")
+    ref_s = results[REFERENCE][0] if REFERENCE in results else None
+    for name, (elapsed, fields, hit_rate) in results.items():
+        same = sum(1 for a, b in zip(fields, reference) if a == b)
+        speedup = f"{ref_s / elapsed:.1f}x" if ref_s else "-"
+        print(
+            f"{name:<12}{len(corpus) / elapsed:>10,.1f}{speedup:>9}"
+            f"{hit_rate:>10.1%}{same / max(len(corpus), 1):>8.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/bench_records.py
+"""
+Benchmark memory use of in-memory record representations.
+
+Loads N synthetic validated records from JSON lines (the indexer's
+records file) into plain dicts, `__slots__` records and one RecordBatch,
+and reports the memory each holds (tracemalloc) along with the time to
+build it and to convert everything back to writer rows.
+
+Usage:
+    python -m benchmarks.bench_records [N]
+"""
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from typing import Callable, Dict, List
+
+from modules.models import StatementRecord
+from modules.records import RecordBatch, RecordSchema
+
+STREETS = ["Main St", "Oak Avenue", "Elm St", "Maple Dr", "Cedar Ln", "Pine Rd"]
+CITIES = ["Anytown", "Springfield", "Riverside", "Fairview"]
+
+
+def synthetic_records(n: int, seed: int = 7) -> List[Dict]:
+    """
+    JSON-mode StatementRecord dicts: monthly statements for n // 12
+    properties, so addresses repeat the way a real backfill's do.
+    """
+    rng = random.Random(seed)
+    properties = max(1, n // 12)
+    addresses = [
+        f"{rng.randint(1, 9999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}" for _ in range(properties)
+    ]
+    start = date(2020, 1, 1)
+    out = []
+    for i in range(n):
+        stmt_date = start + timedelta(days=30 * (i % 60))
+        out.append(StatementRecord.model_construct(
+            StatementFileName=f"statement_{i:07d}.pdf",
+            StatementDate=stmt_date,
+            MostRecentPaymentDate=stmt_date - timedelta(days=rng.randint(1, 20)),
+            MostRecentPaymentAmount=round(rng.uniform(500, 5000), 2),
+            AmountPrincipal=round(rng.uniform(50_000, 900_000), 2),
+            AmountInterest=round(rng.uniform(100, 3000), 2),
+            AmountTaxInsurance=round(rng.uniform(50, 900), 2),
+            AmountUnpaidBalance=round(rng.uniform(50_000, 900_000), 2),
+            AmountInterestRate=round(rng.uniform(2, 8), 3),
+            PastDueAmount=0.0,
+            LinkToStatement=f"https://drive.google.com/file/d/{i:028x}/view",
+            PropertyAddress=addresses[i % properties],
+        ).model_dump(mode='json'))
+    return out
+
+
+def measure(build: Callable[[], object]):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    held = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return held, size, elapsed
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    lines = [json.dumps(r) for r in synthetic_records(n)]
+    schema = RecordSchema.from_lenders([])
+    headers = list(schema.fields)
+
+    def load():
+        return (json.loads(line) for line in lines)
+
+    variants = [
+        ("dict", lambda: list(load()), lambda held: [[r.get(c, '') for c in headers] for r in held]),
+        ("__slots__", lambda: [schema.record(r) for r in load()], lambda held: [r.to_row(headers) for r in held]),
+        ("RecordBatch", lambda: RecordBatch(schema, load()), lambda held: held.to_rows(headers)),
+    ]
+    print(f"records: {n}")
+    baseline = None
+    for name, build, to_rows in variants:
+        held, size, build_s = measure(build)
+        start = time.perf_counter()
+        to_rows(held)
+        rows_s = time.perf_counter() - start
+        baseline = baseline or size
+        print(f"{name:<12} {size / 2**20:8.1f} MiB  {size / n:6.0f} B/record  "
+              f"({baseline / size:4.1f}x smaller)  build {build_s:.2f}s  to rows {rows_s:.2f}s")
+        del held
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/bench_replay.py
+"""
+Load-test ProcessingChain offline by replaying a recorded cassette.
+
+Record a cassette during a real run (config `cassette: {mode: record,
+path: ...}` or CASSETTE_MODE=record CASSETTE_PATH=...), then replay it
+here with the same config.yaml. MULTIPLY serves each recorded Drive file
+that many times; LATENCY_SCALE scales the recorded latencies (0 = none).
+The chain installs the cassette in its parse workers too (parse_s/file_s
+timeouts or executor: process), so LLM calls made there are replayed; the
+replayed-call count below only covers this process.
+
+Usage:
+    python -m benchmarks.bench_replay CASSETTE [MULTIPLY] [LATENCY_SCALE]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import yaml
+
+from modules.cassette import Cassette
+from modules.processing_chain import ProcessingChain
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    if not args:
+        print(__doc__)
+        sys.exit(2)
+    multiply = int(args[1]) if len(args) > 1 else 100
+    latency_scale = float(args[2]) if len(args) > 2 else 1.0
+    with open("config.yaml") as f:
+        config = yaml.safe_load(f)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Fresh state so every replayed file is new
+        config['store'] = {'persist_path': os.path.join(tmp, 'processed.json')}
+        config['index'] = dict(config.get('index') or {}, persist_path=os.path.join(tmp, 'index'))
+        config.pop('cassette', None)
+        cassette = Cassette({
+            'mode': 'replay', 'path': args[0], 'multiply': multiply, 'latency_scale': latency_scale,
+        }).install()
+        try:
+            chain = ProcessingChain(config)
+            start = time.perf_counter()
+            result = chain({})
+            elapsed = time.perf_counter() - start
+        finally:
+            cassette.close()
+
+    files = result['processed']
+    print(f"cassette: {args[0]} (x{multiply}, latency x{latency_scale})")
+    print(f"files: {files} (failed: {len(result.get('failed', []))})")
+    print(f"elapsed: {elapsed:.2f}s  throughput: {files / elapsed if elapsed else 0:,.1f} files/s")
+    print(f"replayed calls: {cassette.calls} (inexact matches: {cassette.misses})")
+    queue = result.get('queue') or {}
+    if queue:
+        print(f"queue wait p50={queue.get('p50_wait_s')}s p95={queue.get('p95_wait_s')}s")
+
+
+if __name__ == "__main__":
+    main()
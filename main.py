@@ -8,8 +8,10 @@ from modules.drive_watcher import DriveWatcher
 from modules.pdf_parser import PDFParser
 from modules.extractor import Extractor
 from modules.writer import Writer
+from modules.fanout_writer import FanoutWriter
 from modules.utils import setup_logging
-from modules.processing_chain import ProcessingChain
+from modules import cassette
+from modules.processing_chain import ProcessingChain, parse_and_extract
 from langfuse.callback import CallbackHandler
 
 
@@ -30,6 +32,19 @@ def main():
     )
     setup_logging(log_level)
 
+    # Profiling switch: PROFILE=1 profiles every document, PROFILE=0.05 a 5% sample
+    profile_env = os.environ.get("PROFILE")
+    if profile_env:
+        prof_cfg = config.get("profiling") or {}
+        prof_cfg["enabled"] = profile_env.lower() not in ("0", "false", "no")
+        try:
+            rate = float(profile_env)
+            if 0 < rate <= 1:
+                prof_cfg["sample_rate"] = rate
+        except ValueError:
+            pass
+        config["profiling"] = prof_cfg
+
     # Drive settings
     drive_cfg = config.get("drive", {})
     drive_cfg["folder_id"] = (
@@ -41,6 +56,19 @@ def main():
         or drive_cfg.get("credentials_json")
     )
 
+    # Source settings (local directory/archive backfills)
+    source_cfg = config.setdefault("source", {}) or {}
+    source_cfg["type"] = (
+        os.environ.get("SOURCE_TYPE")
+        or source_cfg.get("type")
+        or "drive"
+    )
+    source_cfg["path"] = (
+        os.environ.get("SOURCE_PATH")
+        or source_cfg.get("path")
+    )
+    config["source"] = source_cfg
+
     # OCR settings
     ocr_cfg = config.get("ocr", {})
     ocr_cfg["tesseract_cmd"] = (
@@ -66,7 +94,13 @@ def main():
         or out_cfg.get("type")
         or "sheets"
     )
-    if out_cfg.get("type") == "sheets":
+    # A fanout output configures every destination type it lists
+    if out_cfg.get("type") == "fanout":
+        sinks = (out_cfg.get("fanout") or {}).get("sinks") or []
+        sink_types = {s if isinstance(s, str) else s.get("type") for s in sinks}
+    else:
+        sink_types = {out_cfg.get("type")}
+    if "sheets" in sink_types:
         sheets = out_cfg.get("sheets", {})
         sheets["spreadsheet_id"] = (
             os.environ.get("SPREADSHEET_ID")
@@ -76,7 +110,7 @@ def main():
             os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
             or sheets.get("credentials_json")
         )
-    elif out_cfg.get("type") == "airtable":
+    if "airtable" in sink_types:
         at = out_cfg.get("airtable", {})
         at["base_id"] = (
             os.environ.get("AIRTABLE_BASE_ID")
@@ -90,31 +124,55 @@ def main():
             os.environ.get("AIRTABLE_TOKEN")
             or at.get("token")
         )
+    for local_type in sink_types & {"csv", "sqlite", "parquet"}:
+        local = out_cfg.setdefault(local_type, {})
+        # OUTPUT_PATH only applies to a single local destination
+        local["path"] = (
+            (os.environ.get("OUTPUT_PATH") if out_cfg["type"] == local_type else None)
+            or local.get("path")
+        )
+
+    # Record/replay of external calls: CASSETTE_MODE=record|replay CASSETTE_PATH=...
+    cassette_cfg = config.get("cassette") or {}
+    cassette_cfg["mode"] = os.environ.get("CASSETTE_MODE") or cassette_cfg.get("mode")
+    cassette_cfg["path"] = os.environ.get("CASSETTE_PATH") or cassette_cfg.get("path")
+    # Patch the clients before any component builds one
+    tape = cassette.from_config(cassette_cfg)
 
     # 4) Initialize components
-    watcher   = DriveWatcher(drive_cfg)
-    parser    = PDFParser(ocr_cfg)
-    extractor = Extractor(config.get("lenders", []), llm_cfg)
-    writer    = Writer(out_cfg)
+    parser_cfg = config.get("parser", {}) or {}
+    parser    = PDFParser(ocr_cfg, parser_cfg)
+    streaming = bool(parser_cfg.get("streaming", False))
+    extractor = Extractor(config.get("lenders", []), llm_cfg, config.get("regex", {}))
+    writer    = FanoutWriter(out_cfg) if out_cfg.get("type") == "fanout" else Writer(out_cfg)
 
-    # 5) Process new PDFs (legacy loop)
-    files = watcher.list_new_pdfs()
+    # 5) Process new PDFs (legacy loop, Drive only; backfills go through the chain)
+    if source_cfg["type"] == "local":
+        files = []
+    else:
+        watcher = DriveWatcher(drive_cfg)
+        files   = watcher.list_new_pdfs()
     logging.info(f"Found {len(files)} new PDF(s) to process")
     for meta in files:
         logging.info(f"Downloading {meta['name']} ({meta['id']})")
         pdf_bytes = watcher.download_file(meta["id"])
-        text      = parser.extract_text(pdf_bytes)
-        record    = extractor.extract(text)
+        record    = parse_and_extract(parser, extractor, streaming, pdf_bytes)
+        # Drop the raw PDF before writing so it is not held for the rest of the loop
+        del pdf_bytes
         if record.get("needs_review"):
             logging.warning(f"Record for {meta['name']} needs review, skipping write")
             continue
         writer.append_record(record)
         logging.info(f"Appended record for {meta['name']}")
+    # Write anything still buffered by the writer
+    writer.close()
 
     # 6) Run ProcessingChain for unified orchestration (without invoke)
     chain = ProcessingChain(config)
     result = chain({})
     logging.info(f"Processed {result['processed']} file(s)")
+    if tape:
+        tape.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,492 @@
+# modules/cassette.py
+"""
+Record external calls (Drive, OpenAI, Sheets, Slack) into a cassette file
+during a real run, and replay them offline for load testing.
+
+Recording wraps the client objects the modules already use in proxies that
+log every call on the way down to a plain-data result (a Drive `execute()`,
+an OpenAI `create()`, a gspread `append_rows()`, ...) with its arguments,
+result and latency. Replay serves the same results without a network,
+sleeping for the recorded latency times `latency_scale`, and can multiply
+the Drive listing so one recorded folder stands in for a much larger one.
+
+Patched call points:
+    - drive: modules.drive_watcher.build
+    - openai: modules.extractor.openai and langfuse.openai.openai
+    - sheets: gspread.service_account and gspread.authorize
+    - slack: modules.notifier.requests
+
+Worker processes (the parse pool and the process executor) do not inherit
+the patches: the chain passes `install_worker` and the active cassette's
+config as their initializer, so they record to (or replay from) the same
+file.
+"""
+import base64
+import hashlib
+import importlib
+import inspect
+import json
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Tuple
+
+MODES = ('record', 'replay')
+
+# Suffix given to the copies of each Drive file when multiplying the corpus
+_COPY_RE = re.compile(r"~r\d+$")
+_SECRET_PREFIXES = ('https://hooks.slack.com/',)
+_MAX_KEY_ARGS = 120
+
+# Cassette installed in this process, if any
+_active: Optional['Cassette'] = None
+
+
+class CassetteMiss(KeyError):
+    """
+    Replay reached a call that was never recorded.
+    """
+
+
+class Cassette:
+    def __init__(self, config: Dict):
+        """
+        Initialize a cassette.
+
+        Args:
+            config: Dict containing:
+                - mode: 'record' or 'replay'.
+                - path: Cassette file (JSON lines).
+                - latency_scale: Replay waits recorded latency times this
+                  (default 1.0; 0 replays as fast as possible).
+                - multiply: Replay serves each listed Drive file this many
+                  times under distinct IDs (default 1).
+                - strict: Replay fails on calls whose arguments were not
+                  recorded instead of reusing a recording of the same
+                  method (default False).
+        """
+        self.config = dict(config)
+        self.mode = config.get('mode', 'replay')
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {self.mode!r} (choose from {', '.join(MODES)})")
+        self.path = config['path']
+        self.latency_scale = float(config.get('latency_scale', 1.0))
+        self.multiply = max(1, int(config.get('multiply', 1) or 1))
+        self.strict = bool(config.get('strict', False))
+        self.calls = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._patches: List[Tuple[object, str, object]] = []
+        self._file = None
+        self._by_key: Dict[str, List[Dict]] = defaultdict(list)
+        self._by_op: Dict[str, List[Dict]] = defaultdict(list)
+        self._served: Dict[str, int] = defaultdict(int)
+        if self.mode == 'record':
+            # Unbuffered: each entry is one append, so worker processes
+            # recording to the same file do not interleave lines
+            self._file = open(self.path, 'ab', buffering=0)
+        else:
+            self._load()
+
+    def _load(self) -> None:
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._by_key[entry['key']].append(entry)
+                    self._by_op[entry['op']].append(entry)
+
+    # Installation
+
+    def install(self) -> 'Cassette':
+        """
+        Patch the call points listed in the module docstring.
+        """
+        import gspread
+        import requests
+        import modules.drive_watcher as drive_watcher
+        import modules.extractor as extractor
+        import modules.notifier as notifier
+
+        self._patch(drive_watcher, 'build', self._factory('drive', drive_watcher.build))
+        self._patch(gspread, 'service_account', self._factory('sheets', gspread.service_account))
+        self._patch(gspread, 'authorize', self._factory('sheets', gspread.authorize))
+        self._patch(notifier, 'requests', _Proxy(self, 'slack', requests, 'requests'))
+        openai_proxy = _Proxy(self, 'openai', extractor.openai, 'openai')
+        self._patch(extractor, 'openai', openai_proxy)
+        try:
+            self._patch(importlib.import_module('langfuse.openai'), 'openai', openai_proxy)
+        except ImportError:
+            pass
+        global _active
+        _active = self
+        return self
+
+    def uninstall(self) -> None:
+        global _active
+        for owner, name, original in reversed(self._patches):
+            setattr(owner, name, original)
+        self._patches.clear()
+        if _active is self:
+            _active = None
+
+    def close(self) -> None:
+        self.uninstall()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _patch(self, owner, name: str, value) -> None:
+        self._patches.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, value)
+
+    def _factory(self, service: str, build: Callable) -> Callable:
+        """
+        Replacement for a client constructor (e.g. googleapiclient build).
+        Replay never calls the real constructor, so no credentials are needed.
+        """
+        def make(*args, **kwargs):
+            target = build(*args, **kwargs) if self.mode == 'record' else None
+            return _Proxy(self, service, target, '')
+        return make
+
+    # Recording
+
+    def record_call(self, service: str, path: str, op: str, fn: Callable, args, kwargs):
+        stack = self._callback_stack()
+        stack.append([])
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            entry = {'error': {'type': f"{type(e).__module__}.{type(e).__qualname__}", 'message': str(e)}}
+            raise
+        else:
+            entry = {'value': _encode(result)} if _is_data(result) else {'object': True}
+            return result
+        finally:
+            entry.update(key=f"{service}:{path}", op=f"{service}:{op}", latency=time.perf_counter() - started)
+            fired = stack.pop()
+            if fired:
+                entry['callbacks'] = fired
+            self._write(entry)
+
+    def record_attribute(self, service: str, path: str, op: str, value) -> None:
+        self._write({
+            'key': f"{service}:{path}", 'op': f"{service}:{op}", 'latency': 0.0,
+            'attribute': True, 'value': _encode(value),
+        })
+
+    def wrap_callback(self, fn: Callable) -> Callable:
+        """
+        Log the arguments of a callback fired while a recorded call runs
+        (e.g. per-request results of a Drive batch).
+        """
+        def callback(*args):
+            stack = self._callback_stack()
+            if stack:
+                stack[-1].append([_encode_arg(a) for a in args])
+            return fn(*args)
+        return callback
+
+    def _callback_stack(self) -> List[List]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _write(self, entry: Dict) -> None:
+        line = json.dumps(entry, sort_keys=True)
+        with self._lock:
+            self.calls += 1
+            if self._file is not None:
+                self._file.write((line + "\n").encode('utf-8'))
+
+    # Replay
+
+    def lookup(self, service: str, path: str, op: str) -> Tuple[Dict, bool]:
+        """
+        Next recorded entry for a call, cycling through repeated recordings.
+        Falls back to any recording of the same method unless strict.
+
+        Returns:
+            (entry, exact) where exact is False for a same-method fallback.
+
+        Raises:
+            CassetteMiss if nothing matches.
+        """
+        key, op_key = f"{service}:{path}", f"{service}:{op}"
+        with self._lock:
+            self.calls += 1
+            entries, counter = self._by_key.get(key), key
+            if not entries and not self.strict:
+                entries, counter = self._by_op.get(op_key), op_key
+                if entries:
+                    self.misses += 1
+                    logging.debug(f"Cassette: no exact recording for {key}, reusing {op_key}")
+            if not entries:
+                self.misses += 1
+                raise CassetteMiss(key)
+            served = self._served[counter]
+            self._served[counter] = served + 1
+            return entries[served % len(entries)], counter == key
+
+    def replay_entry(self, service: str, entry: Dict, callback: Optional[Callable]):
+        if self.latency_scale > 0 and entry.get('latency'):
+            time.sleep(entry['latency'] * self.latency_scale)
+        if callback is not None:
+            for args in entry.get('callbacks', []):
+                callback(*[_decode_arg(a) for a in args])
+        if 'error' in entry:
+            raise _rebuild_error(entry['error'])
+        value = _decode(entry['value'])
+        if service == 'drive' and self.multiply > 1:
+            value = self._multiply_listing(value)
+        return value
+
+    def _multiply_listing(self, value):
+        if not isinstance(value, dict) or not isinstance(value.get('files'), list):
+            return value
+        files = []
+        for meta in value['files']:
+            files.append(meta)
+            for i in range(1, self.multiply):
+                copy = dict(meta)
+                copy['id'] = f"{meta.get('id')}~r{i}"
+                # Distinct checksums so copies are not linked as duplicates
+                if copy.get('md5Checksum'):
+                    copy['md5Checksum'] = f"{meta['md5Checksum']}~r{i}"
+                files.append(copy)
+        return dict(value, files=files)
+
+
+class _Proxy:
+    """
+    Stands in for a client object, or one of its methods or sub-objects.
+    `_path` is the chain of attribute accesses and calls that produced it.
+    """
+    def __init__(self, cassette: Cassette, service: str, target, path: str, op: str = None, callback=None):
+        object.__setattr__(self, '_cassette', cassette)
+        object.__setattr__(self, '_service', service)
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_path', path)
+        object.__setattr__(self, '_op', path if op is None else op)
+        object.__setattr__(self, '_callback', callback)
+
+    def __getattr__(self, name: str):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        cassette, target = self._cassette, self._target
+        path, op = _join(self._path, name), _join(self._op, name)
+        if cassette.mode == 'record':
+            value = getattr(target, name)
+            # Exception classes and other types are used as-is (e.g. requests.HTTPError)
+            if issubclass(type(value), type):
+                return value
+            if not callable(value) and _is_data(value):
+                cassette.record_attribute(self._service, path, op, value)
+                return value
+            return _Proxy(cassette, self._service, value, path, op, self._callback)
+        # type() rather than isinstance(): lazy SDK proxies build a client on __class__
+        if target is not None and issubclass(type(inspect.getattr_static(target, name, None)), type):
+            return getattr(target, name)
+        entries = cassette._by_key.get(f"{self._service}:{path}")
+        if entries and entries[0].get('attribute'):
+            # Recorded plain attribute, e.g. response.status_code
+            return _decode(entries[0]['value'])
+        return _Proxy(cassette, self._service, None, path, op, self._callback)
+
+    def __setattr__(self, name: str, value) -> None:
+        # e.g. openai.api_key; ignored on replay
+        if self._cassette.mode == 'record':
+            setattr(self._target, name, value)
+
+    def __call__(self, *args, **kwargs):
+        cassette = self._cassette
+        callback = self._callback
+        for value in list(args) + list(kwargs.values()):
+            if callable(value) and not isinstance(value, _Proxy):
+                callback = value
+        path = f"{self._path}({_canon(args, kwargs)})"
+        op = f"{self._op}()"
+        if cassette.mode == 'record':
+            args = tuple(_unwrap(a, cassette) for a in args)
+            kwargs = {k: _unwrap(v, cassette) for k, v in kwargs.items()}
+            result = cassette.record_call(self._service, path, op, self._target, args, kwargs)
+            if _is_data(result):
+                return result
+            return _Proxy(cassette, self._service, result, path, op, callback)
+        entry, exact = cassette.lookup(self._service, path, op)
+        if entry.get('object'):
+            cassette.replay_entry(self._service, dict(entry, value=None), None)
+            return _Proxy(cassette, self._service, None, path, op, callback)
+        value = cassette.replay_entry(self._service, entry, callback)
+        if not exact:
+            value = _fit_embeddings(value, kwargs)
+        return value
+
+    def __repr__(self) -> str:
+        return f"<cassette proxy {self._service}:{self._path}>"
+
+
+def _fit_embeddings(value, kwargs: Dict):
+    """
+    Resize a reused embeddings response to the number of inputs requested,
+    since batches rarely line up with the recorded ones.
+    """
+    inputs = kwargs.get('input')
+    data = getattr(value, 'data', None)
+    if not isinstance(inputs, list) or not isinstance(data, list) or not data:
+        return value
+    fitted = []
+    for i in range(len(inputs)):
+        item = SimpleNamespace(**vars(data[i % len(data)]))
+        item.index = i
+        fitted.append(item)
+    value.data = fitted
+    return value
+
+
+def _join(path: str, name: str) -> str:
+    return f"{path}.{name}" if path else name
+
+
+def _unwrap(value, cassette: Cassette):
+    if isinstance(value, _Proxy):
+        return value._target
+    if callable(value):
+        return cassette.wrap_callback(value)
+    return value
+
+
+def _canon(args, kwargs) -> str:
+    """
+    Stable text for call arguments: proxies by path, callables and secrets
+    masked, copy suffixes from multiply dropped, long values hashed.
+    """
+    def default(value):
+        if isinstance(value, _Proxy):
+            return f"<{value._path}>"
+        if callable(value):
+            return '<callable>'
+        if isinstance(value, bytes):
+            return hashlib.sha256(value).hexdigest()
+        return f"<{type(value).__name__}>"
+
+    def clean(value):
+        if isinstance(value, str):
+            if value.startswith(_SECRET_PREFIXES):
+                return '<redacted>'
+            return _COPY_RE.sub('', value)
+        if isinstance(value, (list, tuple)):
+            return [clean(v) for v in value]
+        if isinstance(value, dict):
+            return {str(k): clean(v) for k, v in value.items()}
+        return value
+
+    text = json.dumps([clean(list(args)), clean(kwargs)], sort_keys=True, default=default)[1:-1]
+    if len(text) > _MAX_KEY_ARGS:
+        text = 'sha256:' + hashlib.sha256(text.encode('utf-8')).hexdigest()[:24]
+    return text
+
+
+def _is_data(value) -> bool:
+    if value is None or isinstance(value, (str, bytes, int, float, bool)):
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(_is_data(v) for v in value)
+    if isinstance(value, dict):
+        return all(isinstance(k, str) and _is_data(v) for k, v in value.items())
+    # pydantic responses (OpenAI SDK)
+    return callable(getattr(value, 'model_dump', None))
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if callable(getattr(value, 'model_dump', None)):
+        return {'__object__': value.model_dump(mode='json')}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if isinstance(value, dict):
+        if '__bytes__' in value:
+            return base64.b64decode(value['__bytes__'])
+        if '__object__' in value:
+            return _namespace(value['__object__'])
+        return {k: _decode(v) for k, v in value.items()}
+    return value
+
+
+def _namespace(value):
+    """
+    Attribute access over a recorded SDK response (resp.choices[0].message).
+    """
+    if isinstance(value, dict):
+        return SimpleNamespace(**{k: _namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_namespace(v) for v in value]
+    return value
+
+
+def _encode_arg(value):
+    if isinstance(value, BaseException):
+        return {'__error__': {'type': f"{type(value).__module__}.{type(value).__qualname__}", 'message': str(value)}}
+    return _encode(value) if _is_data(value) else None
+
+
+def _decode_arg(value):
+    if isinstance(value, dict) and '__error__' in value:
+        return _rebuild_error(value['__error__'])
+    return _decode(value)
+
+
+def _rebuild_error(error: Dict) -> Exception:
+    """
+    The recorded exception type if it can be built from a message,
+    otherwise a RuntimeError naming it.
+    """
+    module, _, name = error['type'].rpartition('.')
+    try:
+        cls = getattr(importlib.import_module(module), name)
+        if isinstance(cls, type) and issubclass(cls, Exception):
+            return cls(error['message'])
+    except Exception:
+        pass
+    return RuntimeError(f"{error['type']}: {error['message']}")
+
+
+def active() -> Optional[Cassette]:
+    """
+    Cassette installed in this process, or None.
+    """
+    return _active
+
+
+def install_worker(config: Dict) -> None:
+    """
+    Worker process initializer: install a cassette from the parent's config.
+    Calls made in a worker are counted in the worker, not in the parent.
+    """
+    Cassette(config).install()
+
+
+def from_config(config: Optional[Dict]) -> Optional[Cassette]:
+    """
+    Cassette installed for the configured mode, or None when disabled.
+    """
+    if not config or not config.get('mode') or not config.get('path'):
+        return None
+    return Cassette(config).install()
@@ -0,0 +1,236 @@
+# modules/deadlines.py
+"""
+Time budgets for processing a file: an overall per-file deadline split into
+per-stage timeouts, with cancellation.
+
+Parsing runs in a worker process that is killed (and replaced) when its
+budget runs out, so a PDF that makes the parser spin cannot stall the run.
+WorkerPool keeps those processes alive between files and starts them with
+spawn/forkserver, never by forking the multithreaded pipeline process. Blocking I/O
+(downloads) runs on a helper thread that is abandoned on timeout; the
+socket timeout of the client eventually ends it.
+"""
+import multiprocessing
+import queue
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+
+class StageTimeout(Exception):
+    """
+    A stage (or the whole file) ran past its time budget.
+    """
+    def __init__(self, stage: str, seconds: float):
+        super().__init__(f"{stage} timed out after {seconds:.1f}s")
+        self.stage = stage
+        self.seconds = seconds
+
+
+class Deadline:
+    def __init__(self, seconds: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        """
+        Track the remaining budget for one file.
+
+        Args:
+            seconds: Total budget; None for no per-file limit.
+        """
+        self.seconds = seconds
+        self._clock = clock
+        self._start = clock()
+
+    def remaining(self) -> Optional[float]:
+        if self.seconds is None:
+            return None
+        return self.seconds - (self._clock() - self._start)
+
+    def budget(self, stage_limit: Optional[float] = None) -> Optional[float]:
+        """
+        Timeout for the next stage: its own limit capped by the time left.
+
+        Raises:
+            StageTimeout if the file's budget is already spent.
+        """
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise StageTimeout('file', self.seconds)
+        limits = [t for t in (stage_limit, remaining) if t is not None]
+        return min(limits) if limits else None
+
+
+def call_with_timeout(stage: str, timeout: Optional[float], fn: Callable, *args):
+    """
+    Run fn on a helper thread and wait at most `timeout` seconds for it.
+
+    Raises:
+        StageTimeout if fn has not returned in time (the thread is left to
+        finish on its own), or whatever fn raised.
+    """
+    if timeout is None:
+        return fn(*args)
+    outcome: dict = {}
+
+    def target():
+        try:
+            outcome['result'] = fn(*args)
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, name=f"{stage}-call", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise StageTimeout(stage, timeout)
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+
+def _child_result(conn, fn: Callable, args: Tuple) -> None:
+    try:
+        result = ('ok', fn(*args))
+    except BaseException as e:
+        result = ('error', e)
+    try:
+        conn.send(result)
+    except Exception as e:
+        # Unpicklable result or exception
+        conn.send(('error', RuntimeError(repr(e))))
+
+
+def _worker_loop(conn, initializer: Optional[Callable], initargs: Tuple) -> None:
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+        except Exception as e:
+            # The call could not be unpickled in the worker
+            conn.send(('error', RuntimeError(f"worker could not load the call: {e!r}")))
+            continue
+        if task is None:
+            return
+        # Imports done while unpickling the call do not count against its timeout
+        conn.send(('started', None))
+        fn, args = task
+        _child_result(conn, fn, args)
+
+
+class _Worker:
+    def __init__(self, ctx, initializer: Optional[Callable] = None, initargs: Tuple = ()):
+        self.conn, child_conn = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_loop, args=(child_conn, initializer, initargs), daemon=True)
+        self.proc.start()
+        child_conn.close()
+
+    def receive(self, stage: str, timeout: Optional[float]) -> Tuple:
+        """
+        Next (status, value) message; the worker is killed if none comes.
+        """
+        if not self.conn.poll(timeout):
+            self.stop(kill=True)
+            raise StageTimeout(stage, timeout)
+        try:
+            return self.conn.recv()
+        except EOFError:
+            # The worker died without reporting (e.g. killed by the OS)
+            self.proc.join(1)
+            code = self.proc.exitcode
+            self.stop(kill=True)
+            raise RuntimeError(f"{stage} worker exited with code {code}")
+
+    def stop(self, kill: bool = False) -> None:
+        if not kill:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.proc.join(1)
+        if self.proc.is_alive():
+            self.proc.terminate()
+            self.proc.join(1)
+            if self.proc.is_alive():
+                self.proc.kill()
+                self.proc.join(1)
+        self.conn.close()
+
+
+class WorkerPool:
+    def __init__(self, size: int, start_method: Optional[str] = None, start_timeout_s: float = 120.0,
+                 initializer: Optional[Callable] = None, initargs: Tuple = ()):
+        """
+        Long-lived worker processes for calls that must be killable.
+
+        A worker runs one call at a time and is reused for the next; one
+        that runs past its timeout or dies is killed and replaced by a fresh
+        one on the next call. Workers start lazily.
+
+        Args:
+            size: Maximum concurrent calls (callers beyond it wait).
+            start_method: multiprocessing start method (default 'forkserver'
+                where available, else 'spawn'). Workers never fork the
+                calling process, whose other threads may hold locks.
+            start_timeout_s: Time allowed for a worker to start and load a
+                call (imports included) before its own timeout applies.
+            initializer: Picklable callable run as initializer(*initargs)
+                once in each worker before its first call, e.g. to patch
+                clients the way the calling process has them patched.
+        """
+        if start_method is None:
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self._ctx = multiprocessing.get_context(start_method)
+        self.size = max(1, size)
+        self.start_timeout_s = start_timeout_s
+        self.restarts = 0
+        self._initializer = initializer
+        self._initargs = initargs
+        self._idle: queue.Queue = queue.Queue()
+        for _ in range(self.size):
+            self._idle.put(None)
+
+    def run(self, stage: str, timeout: Optional[float], fn: Callable, *args):
+        """
+        Run fn(*args) on a worker, killing the worker after `timeout` seconds.
+
+        Args:
+            stage: Stage name used in errors.
+            timeout: Seconds before the worker is killed (None waits forever).
+            fn: Picklable module-level callable; its arguments and result
+                must be picklable.
+
+        Raises:
+            StageTimeout if the worker was killed, or the exception fn raised.
+        """
+        worker = self._idle.get()
+        try:
+            if worker is None or not worker.proc.is_alive():
+                if worker is not None:
+                    worker.stop(kill=True)
+                    self.restarts += 1
+                worker = _Worker(self._ctx, self._initializer, self._initargs)
+            try:
+                worker.conn.send((fn, args))
+            except (BrokenPipeError, OSError) as e:
+                worker.stop(kill=True)
+                raise RuntimeError(f"{stage} worker unavailable: {e}")
+            status, value = worker.receive(stage, self.start_timeout_s)
+            if status == 'started':
+                status, value = worker.receive(stage, timeout)
+        finally:
+            # A killed worker is replaced on its next use
+            self._idle.put(worker)
+        if status == 'error':
+            raise value
+        return value
+
+    def shutdown(self) -> None:
+        """
+        Stop every idle worker (call once no run() is in progress).
+        """
+        for _ in range(self.size):
+            worker = self._idle.get()
+            if worker is not None and worker.proc.is_alive():
+                worker.stop()
+            self._idle.put(None)
@@ -1,11 +1,56 @@
 # modules/drive_watcher.py
 """
 Watch a Google Drive folder for new PDF statements, authenticating via service account.
+
+googleapiclient service objects (and their httplib2 connections) are not
+thread-safe, so downloads borrow a client from a bounded pool instead of
+sharing one service across threads.
 """
-from typing import List, Dict
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+import google.auth
+import httplib2
 from google.oauth2.service_account import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 
+# Drive accepts at most 100 calls per batch request
+BATCH_LIMIT = 100
+DEFAULT_METADATA_FIELDS = 'id,name,parents,md5Checksum,size,permissions(id,type,role,emailAddress)'
+
+
+class ServicePool:
+    """
+    Bounded pool of Drive service clients, each used by one thread at a time.
+    Its size is the concurrency limit for requests made through it.
+    """
+    def __init__(self, factory: Callable, size: int):
+        self.size = size
+        self._factory = factory
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.created = 0
+
+    @contextmanager
+    def client(self):
+        with self._slots:
+            try:
+                service = self._idle.get_nowait()
+            except queue.Empty:
+                service = self._factory()
+                with self._lock:
+                    self.created += 1
+            try:
+                yield service
+            finally:
+                self._idle.put(service)
+
 class DriveWatcher:
     def __init__(self, config: Dict):
         """
@@ -15,6 +60,9 @@ class DriveWatcher:
             config: Dict containing:
                 - folder_id: Google Drive folder ID to watch.
                 - credentials_json: Path to service-account JSON key file.
+                - max_concurrency: Concurrent downloads/batch calls, one
+                  service client each (default 4).
+                - http_timeout_s: Socket timeout for Drive requests (optional).
         """
         self.folder_id = config['folder_id']
         creds_path = config.get('credentials_json')
@@ -26,34 +74,66 @@ class DriveWatcher:
             "https://www.googleapis.com/auth/drive.readonly",
             "https://www.googleapis.com/auth/spreadsheets"
         ]
+        self._creds = None
         try:
             if creds_path:
-                creds = Credentials.from_service_account_file(creds_path, scopes=scopes)
-                self.service = build('drive', 'v3', credentials=creds)
+                self._creds = Credentials.from_service_account_file(creds_path, scopes=scopes)
             else:
                 raise FileNotFoundError
         except (FileNotFoundError, ValueError):
-            
-            self.service = build('drive', 'v3')
+            self._creds = None
+        self.http_timeout = config.get('http_timeout_s')
+        if self.http_timeout and self._creds is None:
+            # build() only looks up application default credentials when it
+            # creates the Http itself; a timeout needs our own Http
+            self._creds, _ = google.auth.default(scopes=scopes)
+        # Used for listing from the calling thread
+        self.service = self._build_service()
+        self.max_concurrency = max(1, int(config.get('max_concurrency', 4) or 4))
+        self._pool = ServicePool(self._build_service, self.max_concurrency)
+
+    def _build_service(self):
+        if self.http_timeout:
+            http = httplib2.Http(timeout=float(self.http_timeout))
+            return build('drive', 'v3', http=AuthorizedHttp(self._creds, http=http))
+        if self._creds:
+            return build('drive', 'v3', credentials=self._creds)
+        return build('drive', 'v3')
+
+    def iter_new_pdfs(self) -> Iterator[Dict]:
+        """
+        Lazily list PDF files in the monitored Drive folder, page by page.
+
+        Yields:
+            Dicts with keys 'id', 'name', 'modifiedTime', and
+            'md5Checksum'/'size' for files with binary content.
+        """
+        query = f"mimeType='application/pdf' and '{self.folder_id}' in parents"
+        page_token = None
+        while True:
+            kwargs = {'q': query, 'fields': 'nextPageToken,files(id,name,modifiedTime,md5Checksum,size)'}
+            if page_token:
+                kwargs['pageToken'] = page_token
+            response = self.service.files().list(**kwargs).execute()
+            yield from response.get('files', [])
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
 
     def list_new_pdfs(self) -> List[Dict]:
         """
         List PDF files in the monitored Drive folder.
 
         Returns:
-            A list of dicts with keys 'id', 'name', 'modifiedTime'.
+            A list of dicts with keys 'id', 'name', 'modifiedTime', and
+            'md5Checksum'/'size' for files with binary content.
         """
-        query = f"mimeType='application/pdf' and '{self.folder_id}' in parents"
-        response = (
-            self.service.files()
-                .list(q=query, fields='files(id,name,modifiedTime)')
-                .execute()
-        )
-        return response.get('files', [])
+        return list(self.iter_new_pdfs())
 
     def download_file(self, file_id: str) -> bytes:
         """
-        Download the PDF file as raw bytes.
+        Download the PDF file as raw bytes. Safe to call from many threads;
+        at most max_concurrency downloads run at once.
 
         Args:
             file_id: ID of the file to download.
@@ -61,5 +141,48 @@ class DriveWatcher:
         Returns:
             Raw bytes of the PDF.
         """
-        media = self.service.files().get_media(fileId=file_id)
-        return media.execute()
+        with self._pool.client() as service:
+            media = service.files().get_media(fileId=file_id)
+            return media.execute()
+
+    def download_many(self, file_ids: Iterable[str]) -> Iterator[Tuple[str, bytes]]:
+        """
+        Download files concurrently (max_concurrency at a time).
+
+        Yields:
+            (file_id, bytes) in input order.
+        """
+        ids = list(file_ids)
+        with ThreadPoolExecutor(self.max_concurrency) as pool:
+            for file_id, data in zip(ids, pool.map(self.download_file, ids)):
+                yield file_id, data
+
+    def get_metadata(self, file_ids: Iterable[str], fields: str = DEFAULT_METADATA_FIELDS) -> Dict[str, Dict]:
+        """
+        Look up metadata (parents, checksums, permissions, ...) for many files
+        with batched requests of up to 100 calls each.
+
+        Args:
+            file_ids: Drive file IDs.
+            fields: Drive fields selector for each file.
+
+        Returns:
+            Dict of file ID to metadata; files whose lookup failed are
+            logged and left out.
+        """
+        ids = list(dict.fromkeys(file_ids))
+        results: Dict[str, Dict] = {}
+
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                logging.warning(f"Drive metadata lookup failed for {request_id}: {exception}")
+            else:
+                results[request_id] = response
+
+        for i in range(0, len(ids), BATCH_LIMIT):
+            with self._pool.client() as service:
+                batch = service.new_batch_http_request(callback=on_response)
+                for file_id in ids[i:i + BATCH_LIMIT]:
+                    batch.add(service.files().get(fileId=file_id, fields=fields), request_id=file_id)
+                batch.execute()
+        return results
@@ -0,0 +1,212 @@
+# modules/embeddings.py
+"""
+Embedding providers for the Indexer, with batched requests and a
+persistent cache keyed by model name and text hash.
+
+Providers:
+    - 'hashing' (default): hashed character trigrams, local and offline.
+    - 'local': a sentence-transformers model run in-process.
+    - 'openai': the OpenAI embeddings endpoint, batched to its limits.
+"""
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from modules.search import HashingEmbedder
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+# OpenAI embeddings limits: inputs per request and tokens per request
+OPENAI_MAX_INPUTS = 2048
+OPENAI_MAX_TOKENS = 300_000
+
+
+def _approx_tokens(text: str) -> int:
+    # Conservative estimate (~3 characters per token) to stay under limits
+    return len(text) // 3 + 1
+
+
+class OpenAIEmbedder:
+    def __init__(self, model: str, batch_size: int = OPENAI_MAX_INPUTS, max_batch_tokens: int = OPENAI_MAX_TOKENS):
+        self.model = model
+        self.batch_size = min(batch_size, OPENAI_MAX_INPUTS)
+        self.max_batch_tokens = min(max_batch_tokens, OPENAI_MAX_TOKENS)
+        self.requests = 0
+
+    def batches(self, texts: Sequence[str]) -> List[List[str]]:
+        """
+        Split texts into requests within the input-count and token limits.
+        """
+        batches: List[List[str]] = []
+        current: List[str] = []
+        tokens = 0
+        for text in texts:
+            n = _approx_tokens(text)
+            if current and (len(current) >= self.batch_size or tokens + n > self.max_batch_tokens):
+                batches.append(current)
+                current, tokens = [], 0
+            current.append(text)
+            tokens += n
+        if current:
+            batches.append(current)
+        return batches
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        # Imported lazily so offline providers never touch the OpenAI client
+        from langfuse.openai import openai
+
+        vectors = []
+        for batch in self.batches(texts):
+            resp = openai.embeddings.create(model=self.model, input=batch)
+            self.requests += 1
+            vectors.extend(item.embedding for item in sorted(resp.data, key=lambda d: d.index))
+        return _normalized(np.asarray(vectors, dtype=np.float32))
+
+
+class LocalEmbedder:
+    def __init__(self, model: str, batch_size: int = 64):
+        if SentenceTransformer is None:
+            raise ValueError("The 'local' embedding provider requires the 'sentence-transformers' package.")
+        self.model = model
+        self.batch_size = batch_size
+        self._model = SentenceTransformer(model)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self._model.encode(list(texts), batch_size=self.batch_size, convert_to_numpy=True)
+        return _normalized(np.asarray(vectors, dtype=np.float32))
+
+
+class EmbeddingCache:
+    """
+    Embeddings keyed by (model, sha256 of text), in SQLite or in memory.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._memory: Dict[tuple, bytes] = {}
+        self._conn = None
+        self._lock = threading.Lock()
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT, text_hash TEXT, vector BLOB, PRIMARY KEY (model, text_hash))"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get_many(self, model: str, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            if self._conn is None:
+                found = {h: self._memory[(model, h)] for h in hashes if (model, h) in self._memory}
+            else:
+                unique = list(dict.fromkeys(hashes))
+                # Stay under SQLite's bound-parameter limit
+                for i in range(0, len(unique), 500):
+                    chunk = unique[i:i + 500]
+                    rows = self._conn.execute(
+                        f"SELECT text_hash, vector FROM embeddings WHERE model = ? "
+                        f"AND text_hash IN ({', '.join('?' for _ in chunk)})",
+                        [model, *chunk],
+                    )
+                    found.update(rows)
+        return {h: np.frombuffer(blob, dtype=np.float32) for h, blob in found.items()}
+
+    def put_many(self, model: str, items: Dict[str, np.ndarray]) -> None:
+        rows = [(model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items.items()]
+        with self._lock:
+            if self._conn is None:
+                self._memory.update({(m, h): blob for m, h, blob in rows})
+                return
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class CachedEmbedder:
+    """
+    Embed texts through a provider, reusing cached vectors and sending
+    only the misses (deduplicated) in batched requests. Without a cache
+    every text goes straight to the provider.
+    """
+    def __init__(self, provider, cache: Optional[EmbeddingCache], model_name: str):
+        self.provider = provider
+        self.cache = cache
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.cache is None:
+            return self.provider.embed(texts)
+        hashes = [EmbeddingCache.key(t) for t in texts]
+        vectors = self.cache.get_many(self.model_name, hashes)
+        missing = {h: t for h, t in zip(hashes, texts) if h not in vectors}
+        self.hits += len(texts) - sum(1 for h in hashes if h in missing)
+        self.misses += len(missing)
+        if missing:
+            computed = self.provider.embed(list(missing.values()))
+            fresh = dict(zip(missing.keys(), computed))
+            self.cache.put_many(self.model_name, fresh)
+            vectors.update(fresh)
+        return np.vstack([vectors[h] for h in hashes])
+
+    def close(self) -> None:
+        if self.cache is not None:
+            self.cache.close()
+
+
+def build_embedder(config: Dict, cache_path: Optional[str] = None) -> CachedEmbedder:
+    """
+    Create the configured embedding provider wrapped in the cache.
+
+    Args:
+        config: Dict containing:
+            - provider: 'hashing' (default), 'local' or 'openai'.
+            - model: Model name for 'local'/'openai'
+              (defaults 'all-MiniLM-L6-v2' / 'text-embedding-3-small').
+            - batch_size: Texts per request.
+            - max_batch_tokens: Token budget per request ('openai').
+            - dim: Vector size for 'hashing' (default 512).
+        cache_path: SQLite file for the persistent cache (in memory if None).
+            The 'hashing' provider is cheaper to recompute than to cache.
+    """
+    provider = config.get('provider', 'hashing')
+    if provider == 'openai':
+        model = config.get('model', 'text-embedding-3-small')
+        embedder = OpenAIEmbedder(
+            model,
+            batch_size=int(config.get('batch_size', OPENAI_MAX_INPUTS)),
+            max_batch_tokens=int(config.get('max_batch_tokens', OPENAI_MAX_TOKENS)),
+        )
+    elif provider == 'local':
+        model = config.get('model', 'all-MiniLM-L6-v2')
+        embedder = LocalEmbedder(model, batch_size=int(config.get('batch_size', 64)))
+    elif provider == 'hashing':
+        dim = int(config.get('dim', 512))
+        return CachedEmbedder(HashingEmbedder(dim), None, f"hashing:{dim}")
+    else:
+        raise ValueError(f"Unknown embedding provider: {provider!r}")
+    return CachedEmbedder(embedder, EmbeddingCache(cache_path), f"{provider}:{model}")
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
@@ -2,86 +2,319 @@
 """
 Extract structured fields via regex and (optional) LLM fallback.
 """
-import re
 import json
-from typing import Dict, List
+import logging
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 # Drop-in replacement for OpenAI SDK to auto-log all calls to Langfuse
 from langfuse.openai import openai
 
+from modules import patterns, profiler
+from modules.llm_budget import (
+    BudgetExceeded, LLMBudget, cached_tokens_from_response, count_message_tokens, count_tokens, usage_from_response,
+)
+from modules.prompts import CACHE_MIN_TOKENS, PromptBuilder
+from modules.records import RecordSchema
+from modules.validator import invalid_fields
+
 class Extractor:
-    def __init__(self, lenders_config: List[Dict], llm_config: Dict):
+    def __init__(self, lenders_config: List[Dict], llm_config: Dict, regex_config: Optional[Dict] = None):
         """
         Initialize the extractor with lender regex patterns and LLM settings.
 
         Args:
             lenders_config: List of lenders, each with 'name' and 'regex_patterns'.
             llm_config: Configuration for LLM fallback (model, API key, etc.).
+            regex_config: Optional dict containing:
+                - timeout_s: Per-search time limit (default 1.0); a search
+                  that runs out counts as no match.
+                - lint: Reject catastrophically backtracking patterns at
+                  startup (default True); see modules.patterns for the
+                  lint_* tuning keys.
+
+        Raises:
+            PatternLintError if linting rejects a lender pattern.
         """
         self.lenders_config = lenders_config
         self.llm_config = llm_config
+        # Every field this extractor can produce (see modules.records)
+        self.schema = RecordSchema.from_lenders(lenders_config)
+        regex_config = regex_config or {}
+        self.regex_timeout = regex_config.get('timeout_s', patterns.DEFAULT_TIMEOUT_S)
+        if regex_config.get('lint', True):
+            patterns.check_lenders(lenders_config, regex_config)
+        self.regex_timeouts: Counter = Counter()
         openai.api_key = llm_config.get("api_key")
+        # Cheapest model first; later tiers only see fields still missing
+        self._tiers = self._build_tiers()
+        self.tier_usage: Counter = Counter()
+        # Token/cost accounting and limits (llm.budget)
+        self.budget = LLMBudget(llm_config.get('budget') or {})
+        # Cache-friendly prompt layout (llm.prompt)
+        self.prompts = PromptBuilder(lenders_config, llm_config.get('prompt'))
+        self._check_prompt_cache()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # The API key is module-level client state, which does not travel
+        # with an extractor pickled to a worker process
+        openai.api_key = self.llm_config.get("api_key")
+
+    def _check_prompt_cache(self) -> None:
+        """
+        Warn at startup about lenders whose stable prompt prefix (response
+        schema plus leading messages) is too short for the provider to
+        cache, so none of their calls would get a cache hit.
+        """
+        if self.prompts.layout != 'cached' or not self._tiers:
+            return
+        model = self._tiers[0]['model']
+        schema_tokens = 0
+        if self._tiers[0]['response_format'] == 'json_schema':
+            schema_tokens = count_tokens(json.dumps(self.build_schema(self.prompts.fields)), model)
+        short = []
+        for lender in self.lenders_config:
+            name = lender.get('name')
+            tokens = schema_tokens + count_message_tokens(self.prompts.prefix(name), model)
+            if tokens < CACHE_MIN_TOKENS:
+                short.append(f"{name} ({tokens})")
+        if short:
+            logging.warning(
+                f"Prompt prefix shorter than the {CACHE_MIN_TOKENS} tokens OpenAI caches for lender(s) "
+                f"{', '.join(short)}; add few-shot examples (lender 'examples' or llm.prompt.examples) "
+                f"to make it cacheable"
+            )
 
-    def extract_with_regex(self, text: str) -> Dict[str, str]:
+    def extract_with_regex(
+        self, text: str, only: Optional[Set[str]] = None, hits: Optional[Counter] = None,
+    ) -> Dict[str, str]:
         """
         Apply regex patterns for each lender to extract known fields.
 
+        Args:
+            text: Statement text to search.
+            only: Optional set of field names to restrict the search to.
+            hits: Optional Counter that receives the number of fields each
+                lender's patterns matched (see _lender_from_hits).
+
         Returns a dict mapping field names to string values.
         """
         results: Dict[str, str] = {}
-        for lender in self.lenders_config:
-            patterns = lender.get('regex_patterns', {})
-            for field, pattern in patterns.items():
-                match = re.search(pattern, text)
-                if match:
-                    try:
-                        results[field] = match.group('value')
-                    except IndexError:
-                        results[field] = match.group(1)
+        with profiler.stage('regex'):
+            for lender in self.lenders_config:
+                lender_patterns = lender.get('regex_patterns', {})
+                for field, pattern in lender_patterns.items():
+                    if only is not None and field not in only:
+                        continue
+                    match = self._search(field, pattern, text)
+                    if match:
+                        if hits is not None:
+                            hits[lender.get('name')] += 1
+                        try:
+                            results[field] = match.group('value')
+                        except IndexError:
+                            results[field] = match.group(1)
         return results
 
-    def _needs_llm(self, regex_res: Dict[str, str]) -> bool:
+    def _search(self, field: str, pattern: str, text: str):
         """
-        Determine whether LLM fallback is needed (missing any mandatory field).
+        Time-limited search; a timeout is logged and treated as no match.
+        """
+        try:
+            return patterns.search(pattern, text, self.regex_timeout)
+        except TimeoutError:
+            self.regex_timeouts[field] += 1
+            logging.warning(f"Regex for {field} timed out after {self.regex_timeout}s on {len(text)} chars")
+            return None
+
+    def score_text(self, text: str) -> Tuple[Optional[str], float]:
+        """
+        Identify the lender whose patterns match best and its regex hit rate.
+
+        Used by PDFParser.extract_best to judge a text backend's output.
+
+        Returns:
+            (lender name, fraction of that lender's fields matched); the
+            name is None if no lender has any patterns.
+        """
+        best: Tuple[Optional[str], float] = (None, 0.0)
+        with profiler.stage('regex'):
+            for lender in self.lenders_config:
+                lender_patterns = lender.get('regex_patterns', {})
+                if not lender_patterns:
+                    continue
+                hits = sum(1 for field, pattern in lender_patterns.items() if self._search(field, pattern, text))
+                rate = hits / len(lender_patterns)
+                if best[0] is None or rate > best[1]:
+                    best = (lender.get('name'), rate)
+        return best
+
+    def _lender_from_hits(self, hits: Counter) -> Optional[str]:
+        """
+        Lender with the highest share of its fields matched, as score_text
+        would pick it, from the counts a regex pass already gathered.
+        """
+        best: Tuple[Optional[str], float] = (None, 0.0)
+        for lender in self.lenders_config:
+            lender_patterns = lender.get('regex_patterns', {})
+            if not lender_patterns:
+                continue
+            rate = hits[lender.get('name')] / len(lender_patterns)
+            if best[0] is None or rate > best[1]:
+                best = (lender.get('name'), rate)
+        return best[0]
+
+    def _mandatory_fields(self) -> Set[str]:
+        """
+        Collect the set of fields that any lender defines a pattern for.
         """
         mandatory_fields = set()
         for lender in self.lenders_config:
             mandatory_fields.update(lender.get('regex_patterns', {}).keys())
-        for field in mandatory_fields:
+        return mandatory_fields
+
+    def _missing(self, regex_res: Dict[str, str]) -> List[str]:
+        """
+        Lender fields the regex pass did not fill.
+        """
+        return [f for f in self._all_fields() if not regex_res.get(f)]
+
+    def _needs_llm(self, regex_res: Dict[str, str]) -> bool:
+        """
+        Determine whether LLM fallback is needed (missing any mandatory field).
+        """
+        for field in self._mandatory_fields():
             if not regex_res.get(field):
                 return True
         return False
 
-    def extract_with_llm(self, text: str) -> Dict[str, str]:
+    def extract_with_llm(self, text: str, fields: Optional[List[str]] = None, lender: Optional[str] = None) -> Dict[str, str]:
         """
-        Use an LLM to extract all fields according to the regex schema.
+        Use tiered LLM routing to extract fields according to the regex schema.
+
+        The first (fast, cheap) tier is asked for every requested field in
+        structured-output mode. Each following tier is only asked for the
+        fields that are still missing or fail StatementRecord validation.
+        Every call is checked against llm.budget first and its token usage
+        recorded. Prompts come from PromptBuilder: a stable per-lender
+        prefix, then the fields and statement text.
 
-        Sends a prompt to OpenAI ChatCompletion and parses the JSON response.
+        Args:
+            text: Statement text.
+            fields: Fields to extract (default: every lender field).
+            lender: Lender the usage is booked to.
+
+        Returns:
+            Dict of field name to value for the fields the LLM could fill.
+
+        Raises:
+            BudgetExceeded if a call would exceed a budget.
         """
-        # Build the JSON schema list of fields
-        fields = []
+        wanted = list(fields) if fields is not None else self._all_fields()
+        results: Dict[str, str] = {}
+        spent = 0
+        for tier in self._tiers:
+            remaining = [f for f in wanted if f not in results]
+            if not remaining:
+                break
+            values, tokens = self._call_tier(tier, text, remaining, lender, spent)
+            spent += tokens
+            bad = invalid_fields(values, remaining)
+            results.update({f: values[f] for f in remaining if f not in bad})
+            self.tier_usage[tier['model']] += 1
+        return results
+
+    def _all_fields(self) -> List[str]:
+        """
+        Every lender field, in config order without duplicates.
+        """
+        fields: List[str] = []
         for lender in self.lenders_config:
-            fields.extend(lender.get('regex_patterns', {}).keys())
-        # Create the prompt
-        prompt = (
-            "Extract the following fields from this mortgage statement as a JSON object: "
-            + ", ".join(fields)
-            + "\n\nText:\n" + text + "\n\nJSON:"
-        )
+            for field in lender.get('regex_patterns', {}).keys():
+                if field not in fields:
+                    fields.append(field)
+        return fields
+
+    def _build_tiers(self) -> List[Dict]:
+        """
+        Resolve llm.tiers (cheapest first) into per-call settings. Without
+        tiers the single configured model is used.
+        """
+        base = {
+            'temperature': self.llm_config.get('temperature', 0.0),
+            'max_tokens': self.llm_config.get('max_tokens', 512),
+            'response_format': self.llm_config.get('response_format', 'json_schema'),
+            # Per-request timeout; the HTTP call is abandoned when it expires
+            'timeout_s': self.llm_config.get('timeout_s'),
+        }
+        tiers = self.llm_config.get('tiers') or [{'model': self.llm_config.get('model')}]
+        return [dict(base, **tier) for tier in tiers if tier.get('model')]
+
+    @staticmethod
+    def build_schema(fields: List[str]) -> Dict:
+        """
+        Strict JSON schema for the requested fields; null marks a field that
+        is not present in the statement.
+        """
+        return {
+            'type': 'object',
+            'properties': {f: {'type': ['string', 'null']} for f in fields},
+            'required': list(fields),
+            'additionalProperties': False,
+        }
+
+    def _call_tier(self, tier: Dict, text: str, fields: List[str], lender: Optional[str] = None, spent: int = 0) -> Tuple[Dict, int]:
+        """
+        Ask one model for `fields`.
+
+        Returns:
+            (values, tokens used); values is {} if the reply is not valid JSON.
+        """
+        request = self.prompts.build(text, fields, lender)
+        kwargs = {
+            'model': tier['model'],
+            'messages': request['messages'],
+            'temperature': tier['temperature'],
+            'max_tokens': tier['max_tokens'],
+        }
+        if 'prompt_cache_key' in request:
+            kwargs['extra_body'] = {'prompt_cache_key': request['prompt_cache_key']}
+        if tier['timeout_s']:
+            kwargs['timeout'] = float(tier['timeout_s'])
+        if tier['response_format'] == 'json_schema':
+            kwargs['response_format'] = {
+                'type': 'json_schema',
+                'json_schema': {
+                    'name': 'mortgage_statement',
+                    'strict': True,
+                    'schema': self.build_schema(request['schema_fields']),
+                },
+            }
+        elif tier['response_format'] == 'json_object':
+            kwargs['response_format'] = {'type': 'json_object'}
+        prompt_tokens = count_message_tokens(kwargs['messages'], tier['model'])
+        self.budget.check(lender, tier['model'], prompt_tokens, int(tier['max_tokens'] or 0), spent)
         # Call the OpenAI ChatCompletion API (drop-in auto-logged by Langfuse)
-               # For openai>=1.0.0 the ChatCompletion endpoint is under .chat.completions
-        resp = openai.chat.completions.create(
-            model=self.llm_config['model'],
-            messages=[{"role":"user", "content": prompt}],
-            temperature=self.llm_config.get("temperature", 0.0),
-            max_tokens=self.llm_config.get("max_tokens", 512),
-        )
+        started = time.perf_counter()
+        with profiler.stage('llm'):
+            resp = openai.chat.completions.create(**kwargs)
+        latency = time.perf_counter() - started
         content = resp.choices[0].message.content
-        # Parse and return the JSON
+        usage = usage_from_response(resp)
+        estimated = usage is None
+        if estimated:
+            usage = (prompt_tokens, count_tokens(content or '', tier['model']))
+        self.budget.record(
+            lender, tier['model'], *usage, estimated=estimated,
+            cached_tokens=cached_tokens_from_response(resp), latency_s=latency,
+        )
         try:
-            return json.loads(content)
-        except json.JSONDecodeError:
-            # If parsing fails, return empty dict or handle error
-            return {}
+            values = json.loads(content)
+        except (TypeError, json.JSONDecodeError):
+            # Unparseable reply: every field escalates to the next tier
+            return {}, sum(usage)
+        return (values if isinstance(values, dict) else {}), sum(usage)
 
     def merge_results(self, regex_res: Dict[str, str], llm_res: Dict[str, str]) -> Dict[str, str]:
         """
@@ -91,13 +324,84 @@ class Extractor:
         merged.update(regex_res)
         return merged
 
-    def extract(self, text: str) -> Dict[str, str]:
+    def extract(self, text: str, llm: bool = True) -> Dict[str, str]:
         """
         Full extraction pipeline: regex first, then LLM if needed.
+
+        Args:
+            text: Statement text.
+            llm: False to skip the LLM fallback (e.g. for a degraded,
+                truncated document that goes to review anyway).
         """
-        regex_res = self.extract_with_regex(text)
-        if self._needs_llm(regex_res):
-            llm_res = self.extract_with_llm(text)
+        hits: Counter = Counter()
+        regex_res = self.extract_with_regex(text, hits=hits)
+        if llm and self._needs_llm(regex_res):
+            llm_res = self._llm_fallback(text, regex_res, self._lender_from_hits(hits))
+        else:
+            llm_res = {}
+        return self.merge_results(regex_res, llm_res)
+
+    def _llm_fallback(self, text: str, regex_res: Dict[str, str], lender: Optional[str] = None) -> Dict:
+        """
+        LLM pass for the fields regex missed, within budget.
+
+        Over budget the document goes to review (no LLM call) or, with
+        on_exceeded 'defer', BudgetExceeded propagates so the caller can
+        leave it for a later run.
+
+        Args:
+            text: Statement text.
+            regex_res: Fields the regex pass found.
+            lender: Lender identified by the regex pass (picks the prompt
+                prefix); no further regex pass is run to find it.
+        """
+        try:
+            return self.extract_with_llm(text, fields=self._missing(regex_res), lender=lender)
+        except BudgetExceeded as e:
+            if self.budget.on_exceeded == 'defer':
+                raise
+            logging.warning(f"{e}; sending document to review")
+            return {'needs_review': True, 'budget_exceeded': e.scope}
+
+    def extract_pages(self, pages: Iterable[str]) -> Dict[str, str]:
+        """
+        Incremental extraction over a stream of page texts.
+
+        Patterns for still-missing fields are applied as each page arrives,
+        over the previous and current page so matches that straddle a page
+        break are still found. As soon as every mandatory field is present
+        the page stream is closed, which stops the parser early. The LLM
+        fallback only runs once the whole document has been read, and not
+        at all when the stream was cut short (its `degraded` attribute).
+
+        Args:
+            pages: Iterable of page texts, e.g. PDFParser.iter_pages().
+
+        Returns:
+            Merged extraction result, as from extract().
+        """
+        mandatory = self._mandatory_fields()
+        regex_res: Dict[str, str] = {}
+        hits: Counter = Counter()
+        texts: List[str] = []
+        page_iter = iter(pages)
+        try:
+            for page_text in page_iter:
+                texts.append(page_text)
+                missing = {f for f in mandatory if not regex_res.get(f)}
+                if missing:
+                    window = "\n".join(texts[-2:])
+                    found = self.extract_with_regex(window, only=missing, hits=hits)
+                    regex_res.update({k: v for k, v in found.items() if v})
+                if not self._needs_llm(regex_res):
+                    break
+        finally:
+            close = getattr(page_iter, 'close', None)
+            if close:
+                close()
+
+        if self._needs_llm(regex_res) and not getattr(pages, 'degraded', None):
+            llm_res = self._llm_fallback("\n".join(texts), regex_res, self._lender_from_hits(hits))
         else:
             llm_res = {}
-        return self.merge_results(regex_res, llm_res)
\ No newline at end of file
+        return self.merge_results(regex_res, llm_res)
@@ -0,0 +1,344 @@
+# modules/fanout_writer.py
+"""
+Deliver every record to several destinations at once through a local
+write-ahead log.
+
+append_record() only appends the record to the log (a JSON-lines file)
+and hands it to one delivery thread per sink, so a slow destination no
+longer adds to each file's processing time. Each sink retries on its own
+and acknowledges a record only once its destination has made it durable
+(a Writer checkpoint: committed, fsync'd, or spooled next to the
+Parquet part). After a crash, or a sink that gave up,
+the next FanoutWriter replays the log from that point. Delivery is
+at-least-once, so destinations should use upsert mode where duplicates
+matter.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from modules.writer import Writer
+
+_STOP = object()
+
+
+class _Sink:
+    """
+    One destination: a Writer driven by its own thread and queue.
+    """
+    def __init__(self, fanout: 'FanoutWriter', name: str, writer, acked: int):
+        self.fanout = fanout
+        self.name = name
+        self.writer = writer
+        self.acked = acked
+        self.delivered = 0
+        self.retries = 0
+        self.error: Optional[str] = None
+        self.queue: queue.Queue = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self, replay_to: int = 0) -> None:
+        """
+        Start delivering: first the logged records after `acked` up to
+        `replay_to` (streamed from the log), then whatever is queued.
+        """
+        self.error = None
+        self.thread = threading.Thread(target=self._run, args=(replay_to,), name=f"sink-{self.name}", daemon=True)
+        self.thread.start()
+
+    def _run(self, replay_to: int) -> None:
+        last = self.acked
+        backlog = self.fanout._iter_log(self.acked, replay_to) if replay_to > self.acked else None
+        # When the oldest unacknowledged delivery is due for a checkpoint
+        due = None
+        while True:
+            item = None
+            if backlog is not None:
+                item = next(backlog, None)
+                if item is None:
+                    backlog = None
+                else:
+                    item = item[:2]
+            if item is None:
+                timeout = None if due is None else max(0.0, due - time.monotonic())
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+            if item is _STOP:
+                if self.error is None and self._attempt(self.writer.close):
+                    self.fanout._ack(self, last)
+                return
+            if item is not None:
+                if self.error is not None:
+                    # Gave up: the rest stays in the log for the next run
+                    continue
+                seq, record = item
+                if not self._attempt(self.writer.append_record, record):
+                    continue
+                self.delivered += 1
+                last = seq
+                if due is None:
+                    due = time.monotonic() + self.fanout.flush_interval_s
+            # Acknowledge only what a checkpoint has made durable; a plain
+            # flush may leave records in an uncommitted transaction or an
+            # unfinished Parquet part file
+            if self.error is None and last > self.acked and (
+                last - self.acked >= self.fanout.flush_every or time.monotonic() >= due
+            ):
+                if self._attempt(self.writer.checkpoint):
+                    self.fanout._ack(self, last)
+            if self.error is not None or last <= self.acked:
+                due = None
+
+    def _attempt(self, fn, *args) -> bool:
+        """
+        Call fn with exponential backoff; after the last attempt the sink
+        stops delivering for this run.
+        """
+        delay = self.fanout.backoff_s
+        for attempt in range(1, self.fanout.attempts + 1):
+            try:
+                fn(*args)
+                return True
+            except Exception as e:
+                if attempt == self.fanout.attempts:
+                    self.error = f"{type(e).__name__}: {e}"
+                    logging.error(f"Sink {self.name} failed after {attempt} attempt(s), "
+                                  f"leaving records from #{self.acked + 1} in the log: {self.error}")
+                    return False
+                self.retries += 1
+                logging.warning(f"Sink {self.name} attempt {attempt} failed, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.fanout.max_backoff_s)
+        return False
+
+
+class FanoutWriter:
+    def __init__(self, config: Dict):
+        """
+        Initialize the log and one Writer per sink, then replay any records
+        a sink has not acknowledged.
+
+        Config structure ('output' section):
+        {
+            'type': 'fanout',
+            'fanout': {
+                'wal_path': './output_wal.jsonl',
+                # Names or dicts; dict keys override the shared output
+                # config for that sink (e.g. its own 'airtable' section)
+                'sinks': ['sheets', 'sqlite', {'name': 'team', 'type': 'airtable'}],
+                'retry': {'attempts': 5, 'backoff_s': 1.0, 'max_backoff_s': 60},
+                # Each sink checkpoints (and acknowledges) after this many
+                # delivered records or this many seconds, whichever is first
+                'flush_every': 500,
+                'flush_interval_s': 5.0,
+                # fsync the log on every append instead of at flush()
+                'fsync_each': False
+            },
+            # Shared settings used by every sink: 'sheets', 'airtable',
+            # 'sqlite', 'upsert', 'throttle', ...
+        }
+        """
+        fanout_cfg = config.get('fanout', {}) or {}
+        sinks = fanout_cfg.get('sinks') or []
+        if not sinks:
+            raise ValueError("Fanout output config must list at least one sink.")
+        self.wal_path = fanout_cfg.get('wal_path') or './output_wal.jsonl'
+        self.state_path = self.wal_path + '.state.json'
+        retry_cfg = fanout_cfg.get('retry', {}) or {}
+        self.attempts = max(1, int(retry_cfg.get('attempts', 5)))
+        self.backoff_s = float(retry_cfg.get('backoff_s', 1.0))
+        self.max_backoff_s = float(retry_cfg.get('max_backoff_s', 60.0))
+        self.flush_every = max(1, int(fanout_cfg.get('flush_every', 500) or 500))
+        self.flush_interval_s = float(fanout_cfg.get('flush_interval_s', 5.0))
+        self.fsync_each = bool(fanout_cfg.get('fsync_each', False))
+        self._lock = threading.Lock()
+
+        state = self._load_state()
+        # One streamed pass for the sequence range; records are read again
+        # (streamed) by each sink that needs them replayed
+        first, last = None, 0
+        for seq, _, _ in self._iter_log():
+            first = seq if first is None else min(first, seq)
+            last = max(last, seq)
+        self._next_seq = max(state.get('next_seq', 1), last + 1)
+        # Lowest sequence number that may still be in the log file
+        self._log_start = self._next_seq if first is None else first
+        self._sinks: List[_Sink] = []
+        for sink_cfg in sinks:
+            name, writer_cfg = _sink_config(config, sink_cfg)
+            if any(s.name == name for s in self._sinks):
+                raise ValueError(f"Duplicate fanout sink name: {name!r}")
+            acked = int(state.get('acked', {}).get(name, self._next_seq - 1 if first is None else 0))
+            self._sinks.append(_Sink(self, name, Writer(writer_cfg), acked))
+        self._wal = None
+        self._start()
+
+    def _start(self) -> None:
+        self._wal = open(self.wal_path, 'a', encoding='utf-8')
+        replay_to = self._next_seq - 1
+        for sink in self._sinks:
+            if sink.acked < replay_to:
+                logging.info(f"Replaying logged records #{sink.acked + 1}-#{replay_to} to sink {sink.name}")
+            sink.start(replay_to)
+
+    def append_record(self, record: Dict) -> None:
+        """
+        Log a record and queue it for every sink.
+        """
+        with self._lock:
+            if self._wal is None:
+                # Reused after close(): pick up whatever is still unacknowledged
+                self._start()
+            seq = self._next_seq
+            self._next_seq += 1
+            self._wal.write(json.dumps({'seq': seq, 'record': record}, default=str) + "\n")
+            if self.fsync_each:
+                self._sync_log()
+        for sink in self._sinks:
+            sink.queue.put((seq, record))
+
+    def flush(self) -> None:
+        """
+        Make every appended record durable in the log. Delivery continues in
+        the background; a record in the log is never lost.
+        """
+        with self._lock:
+            if self._wal is not None:
+                self._sync_log()
+
+    def checkpoint(self) -> None:
+        """
+        Durable checkpoint for the caller: once a record is in the fsync'd
+        log it is delivered (now or by a later run's replay) even if a sink
+        has not yet checkpointed it. Records every sink has acknowledged
+        are dropped from the log here, so it only holds the unacknowledged
+        tail.
+        """
+        with self._lock:
+            if self._wal is not None:
+                self._sync_log()
+                self._compact_log()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait for every sink to deliver what it was given, close the sinks,
+        and empty the log once all of them have acknowledged it.
+        """
+        if self._wal is None:
+            return
+        for sink in self._sinks:
+            sink.queue.put(_STOP)
+        for sink in self._sinks:
+            sink.thread.join(timeout)
+        with self._lock:
+            self._sync_log()
+            self._save_state()
+            # Empties the log once every sink has acknowledged all of it
+            self._compact_log()
+            self._wal.close()
+            self._wal = None
+
+    def status(self) -> Dict[str, Dict]:
+        """
+        Per-sink delivery counters; `behind` is the number of logged
+        records the sink has not acknowledged.
+        """
+        last = self._next_seq - 1
+        return {
+            s.name: {
+                'delivered': s.delivered,
+                'acked': s.acked,
+                'behind': last - s.acked,
+                'retries': s.retries,
+                'error': s.error,
+            }
+            for s in self._sinks
+        }
+
+    def _ack(self, sink: _Sink, seq: int) -> None:
+        with self._lock:
+            if seq > sink.acked:
+                sink.acked = seq
+                self._save_state()
+
+    def _sync_log(self) -> None:
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+
+    def _load_state(self) -> Dict:
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            # Unreadable state: replay the whole log (at-least-once)
+            logging.warning(f"Unreadable fanout state {self.state_path}; replaying the whole log")
+            return {}
+
+    def _save_state(self) -> None:
+        state = {'next_seq': self._next_seq, 'acked': {s.name: s.acked for s in self._sinks}}
+        tmp = self.state_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+
+    def _compact_log(self) -> None:
+        """
+        Rewrite the log without the records every sink has acknowledged
+        (call holding the lock, with the log synced). Sinks streaming a
+        replay keep reading the file they opened.
+        """
+        floor = min(s.acked for s in self._sinks)
+        if floor < self._log_start:
+            return
+        tmp = self.wal_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for _, _, line in self._iter_log(floor):
+                f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self._wal.close()
+        os.replace(tmp, self.wal_path)
+        self._wal = open(self.wal_path, 'a', encoding='utf-8')
+        self._log_start = floor + 1
+
+    def _iter_log(self, after: int = 0, upto: Optional[int] = None) -> Iterator[Tuple[int, Dict, str]]:
+        """
+        Stream (seq, record, line) for logged records with after < seq <= upto.
+        """
+        if not os.path.exists(self.wal_path):
+            return
+        with open(self.wal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn last line from a crash mid-write
+                    continue
+                seq = int(entry['seq'])
+                if seq > after and (upto is None or seq <= upto):
+                    yield seq, entry['record'], line if line.endswith("\n") else line + "\n"
+
+
+def _sink_config(output_cfg: Dict, sink) -> tuple:
+    """
+    (name, Writer config) for a sink: the shared output config with the
+    sink's type and overrides. Upsert index caches get one file per sink.
+    """
+    sink = {'type': sink} if isinstance(sink, str) else dict(sink)
+    name = sink.pop('name', None) or sink['type']
+    cfg = {k: v for k, v in output_cfg.items() if k != 'fanout'}
+    cfg.update(sink)
+    upsert = dict(cfg.get('upsert') or {})
+    if upsert.get('index_path') and 'upsert' not in sink:
+        root, ext = os.path.splitext(upsert['index_path'])
+        upsert['index_path'] = f"{root}.{name}{ext}"
+    cfg['upsert'] = upsert
+    return name, cfg
@@ -1,9 +1,17 @@
 # modules/indexer.py
 """
-Index processed mortgage records for semantic search using LlamaIndex.
+Index processed mortgage records for semantic search using LlamaIndex, with
+a retrieval-only hybrid (BM25 + vector) search path for fast lookups.
 """
+import json
+import os
+import threading
 from typing import Dict, List, Optional
 
+from modules.embeddings import build_embedder
+from modules.records import RecordBatch, RecordSchema
+from modules.search import BM25Index, LRUCache, VectorStore, field_match_bonus, fuse
+
 try:
     from llama_index import GPTSimpleVectorIndex
 except ImportError:
@@ -19,14 +27,36 @@ except ImportError:
         Document = None
 
 class Indexer:
-    def __init__(self, persist_path: Optional[str] = None):
+    def __init__(
+        self,
+        persist_path: Optional[str] = None,
+        search_config: Optional[Dict] = None,
+        schema: Optional[RecordSchema] = None,
+    ):
         """
         Initialize the vector index, optionally loading or saving to disk.
 
         Args:
             persist_path: Path to save/load the index (optional).
+            search_config: Optional dict for the hybrid search() path:
+                - records_path: JSON-lines file of indexed records (default
+                  next to persist_path; in-memory only without either).
+                - top_k: Default number of results (default 10).
+                - candidates: Hits taken from each retriever before fusion
+                  (default 50).
+                - bm25_weight / vector_weight: Fusion weights (default 1.0).
+                - cache_size: LRU result cache entries (default 256).
+                - exclude_fields: Fields not searched (default ['LinkToStatement']).
+                - embeddings: Embedding provider settings (see
+                  embeddings.build_embedder), plus 'cache_path' (default
+                  next to persist_path) and 'index_batch_size' (records
+                  embedded per batch, default 256).
+            schema: Field schema for the in-memory record store (default:
+                the StatementRecord fields).
         """
         self.persist_path = persist_path
+        self.schema = schema or RecordSchema.from_lenders([])
+        self._init_search(search_config or {})
         # Load existing index or create new
         if persist_path and GPTSimpleVectorIndex:
             try:
@@ -44,6 +74,7 @@ class Indexer:
         Args:
             record: Dictionary of field names to values.
         """
+        self._queue_searchable(record)
         if not self.index or not Document:
             return  # Indexing not available
         # Combine record into a single text blob
@@ -58,6 +89,9 @@ class Indexer:
         """
         Query the vector index and return matching records.
 
+        This goes through LlamaIndex response synthesis (an LLM call); use
+        search() for plain lookups.
+
         Args:
             q: Search query string.
 
@@ -78,3 +112,130 @@ class Indexer:
             if info:
                 results.append(info)
         return results
+
+    def _init_search(self, config: Dict) -> None:
+        self.top_k = int(config.get('top_k', 10))
+        self.candidates = int(config.get('candidates', 50))
+        self.bm25_weight = float(config.get('bm25_weight', 1.0))
+        self.vector_weight = float(config.get('vector_weight', 1.0))
+        self.exclude_fields = set(config.get('exclude_fields', ['LinkToStatement']))
+        self.records_path = config.get('records_path')
+        if not self.records_path and self.persist_path:
+            self.records_path = os.path.splitext(self.persist_path)[0] + '_records.jsonl'
+        embed_cfg = config.get('embeddings', {}) or {}
+        cache_path = embed_cfg.get('cache_path')
+        if not cache_path and self.persist_path:
+            cache_path = os.path.splitext(self.persist_path)[0] + '_embeddings.sqlite'
+        self.embedder = build_embedder(embed_cfg, cache_path)
+        # Records are embedded in batches of this size (and before any search)
+        self.embed_batch_size = int(embed_cfg.get('index_batch_size', 256))
+        self._cache = LRUCache(int(config.get('cache_size', 256)))
+        self._lock = threading.Lock()
+
+        records = []
+        if self.records_path and os.path.exists(self.records_path):
+            with open(self.records_path, 'r', encoding='utf-8') as f:
+                records = [json.loads(line) for line in f if line.strip()]
+        self._build(records)
+
+    def _build(self, records: List[Dict]) -> None:
+        # Column storage: far smaller than a dict per record at backfill scale
+        self._records = RecordBatch(self.schema)
+        self._bm25 = BM25Index()
+        self._vectors = VectorStore()
+        self._pending: List[Dict] = []
+        for i in range(0, len(records), self.embed_batch_size):
+            self._add_searchable(records[i:i + self.embed_batch_size], persist=False)
+
+    def _searchable_fields(self, record: Dict) -> Dict[str, str]:
+        return {
+            k: str(v) for k, v in record.items()
+            if k not in self.exclude_fields and v is not None and v != ''
+        }
+
+    def _add_searchable(self, records: List[Dict], persist: bool) -> None:
+        if not records:
+            return
+        fields = [self._searchable_fields(r) for r in records]
+        vectors = self.embedder.embed([" ".join(f.values()) for f in fields])
+        for record, record_fields, vector in zip(records, fields, vectors):
+            doc_id = len(self._records)
+            self._records.append(record)
+            self._bm25.add(doc_id, record_fields)
+            self._vectors.add(vector)
+        # Any cached result may now be incomplete
+        self._cache.clear()
+        if persist and self.records_path:
+            with open(self.records_path, 'a', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, default=str) + "\n")
+
+    def _queue_searchable(self, record: Dict) -> None:
+        with self._lock:
+            self._pending.append(dict(record))
+            if len(self._pending) >= self.embed_batch_size:
+                self._flush_pending()
+
+    def _flush_pending(self) -> None:
+        pending, self._pending = self._pending, []
+        self._add_searchable(pending, persist=True)
+
+    def flush(self) -> None:
+        """
+        Embed and persist records queued by add_record().
+        """
+        with self._lock:
+            self._flush_pending()
+
+    def reindex(self) -> None:
+        """
+        Rebuild the search index from the stored records, e.g. after a
+        field or embedding model change. Unchanged texts come from the
+        embedding cache.
+        """
+        with self._lock:
+            self._flush_pending()
+            self._build(list(self._records))
+
+    def close(self) -> None:
+        """
+        Flush queued records and close the embedding cache.
+        """
+        self.flush()
+        self.embedder.close()
+
+    def search(self, q: str, top_k: Optional[int] = None, field: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Retrieval-only hybrid search, with no LLM call.
+
+        BM25 keyword hits over the record fields and vector-similarity hits
+        are merged by reciprocal rank fusion, then reranked so records with
+        a field equal to the query (e.g. a loan number or an address) come
+        first. Results are cached until new records are indexed.
+
+        Args:
+            q: Search query string.
+            top_k: Maximum number of results (default from config).
+            field: Only return records whose `field` matches the query.
+
+        Returns:
+            List of record dicts, best match first.
+        """
+        top_k = top_k or self.top_k
+        with self._lock:
+            self._flush_pending()
+            hits = self._cache.get((q, top_k, field), lambda: self._search(q, top_k, field))
+            return [self._records.row(i) for i in hits]
+
+    def _search(self, q: str, top_k: int, field: Optional[str]) -> List[int]:
+        keyword = self._bm25.search(q, self.candidates)
+        vector = self._vectors.search(self.embedder.embed([q])[0], self.candidates)
+        fused = fuse([(self.bm25_weight, keyword), (self.vector_weight, vector)])
+        scored = []
+        for doc_id, score in fused.items():
+            bonus = field_match_bonus(q, self._searchable_fields(self._records[doc_id]), field)
+            if field and not bonus:
+                continue
+            scored.append((bonus + score, doc_id))
+        scored.sort(key=lambda e: (-e[0], e[1]))
+        return [doc_id for _, doc_id in scored[:top_k]]
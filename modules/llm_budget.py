@@ -0,0 +1,334 @@
+# modules/llm_budget.py
+"""
+Token and cost accounting for the LLM fallback, with budgets.
+
+Prompt tokens are counted with tiktoken before each call and checked
+against the configured limits; the usage reported in each response is
+then recorded per run, per lender and per day, along with the prompt
+tokens served from the provider's prefix cache and the request latency.
+Usage lives in SQLite so
+parse workers running in child processes add to the same totals.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+ON_EXCEEDED = ('review', 'defer')
+# Chat format overhead per message and per reply
+_TOKENS_PER_MESSAGE = 4
+_TOKENS_PER_REPLY = 3
+
+_encodings: Dict[str, object] = {}
+_encodings_lock = threading.Lock()
+
+
+def _encoding(model: str):
+    """
+    tiktoken encoding for a model, or None if tiktoken (or its BPE file)
+    is unavailable; the BPE file is downloaded on first use.
+    """
+    if tiktoken is None:
+        return None
+    with _encodings_lock:
+        if model not in _encodings:
+            try:
+                try:
+                    _encodings[model] = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    _encodings[model] = tiktoken.get_encoding('o200k_base')
+            except Exception as e:
+                logging.warning(f"tiktoken unavailable for {model} ({e}); estimating tokens from length")
+                _encodings[model] = None
+        return _encodings[model]
+
+
+def count_tokens(text: str, model: str) -> int:
+    """
+    Tokens in `text` for `model` (about 4 characters per token without tiktoken).
+    """
+    enc = _encoding(model)
+    if enc is None:
+        return len(text) // 4 + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[Dict], model: str) -> int:
+    """
+    Prompt tokens for a chat request.
+    """
+    total = _TOKENS_PER_REPLY
+    for message in messages:
+        total += _TOKENS_PER_MESSAGE + count_tokens(str(message.get('content') or ''), model)
+    return total
+
+
+class BudgetExceeded(Exception):
+    """
+    An LLM call would take a budget over its limit.
+    """
+    def __init__(self, scope: str, limit: float, projected: float):
+        # Positional args so the exception pickles across worker processes
+        super().__init__(scope, limit, projected)
+        self.scope = scope
+        self.limit = limit
+        self.projected = projected
+
+    def __str__(self) -> str:
+        return f"LLM budget exceeded: {self.scope} (limit {self.limit:g}, would reach {self.projected:g})"
+
+
+class LLMBudget:
+    def __init__(self, config: Dict):
+        """
+        Initialize usage tracking and limits.
+
+        Args:
+            config: Dict containing (all optional):
+                - persist_path: SQLite file for usage (in memory if unset;
+                  set it when parsing runs in child processes).
+                - tokens_per_document, tokens_per_run, tokens_per_day,
+                  cost_per_run, cost_per_day: Limits; unset means unlimited.
+                - lenders: {lender name: {tokens_per_day, cost_per_day}}.
+                - prices: {model: {prompt, completion, cached_prompt}} in USD
+                  per 1M tokens; cached_prompt (prompt tokens served from
+                  the provider's prefix cache) defaults to the prompt price.
+                - on_exceeded: 'review' (default) sends the document to
+                  review without calling the LLM; 'defer' leaves it
+                  unprocessed for a later run.
+        """
+        self.config = config
+        self.persist_path = config.get('persist_path')
+        self.on_exceeded = config.get('on_exceeded', 'review')
+        if self.on_exceeded not in ON_EXCEEDED:
+            raise ValueError(f"Unknown llm.budget.on_exceeded: {self.on_exceeded!r} (choose from {', '.join(ON_EXCEEDED)})")
+        self.prices = config.get('prices') or {}
+        self.lender_limits = config.get('lenders') or {}
+        self.run_id = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.update(_conn=None, _pid=None, _lock=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        # One connection per process: a connection must not cross a fork
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.persist_path or ':memory:', check_same_thread=False, timeout=30)
+            self._pid = os.getpid()
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_usage ("
+                "ts REAL, day TEXT, run_id TEXT, lender TEXT, model TEXT, "
+                "prompt_tokens INTEGER, completion_tokens INTEGER, cost_usd REAL, estimated INTEGER, "
+                "cached_tokens INTEGER DEFAULT 0, latency_s REAL)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(llm_usage)")}
+            # Ledgers written before cache accounting
+            if 'cached_tokens' not in columns:
+                self._conn.execute("ALTER TABLE llm_usage ADD COLUMN cached_tokens INTEGER DEFAULT 0")
+            if 'latency_s' not in columns:
+                self._conn.execute("ALTER TABLE llm_usage ADD COLUMN latency_s REAL")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_usage_day ON llm_usage (day, lender)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_usage_run ON llm_usage (run_id)")
+            self._conn.commit()
+        return self._conn
+
+    def new_run(self) -> None:
+        """
+        Start a new per-run total.
+        """
+        self.run_id = uuid.uuid4().hex
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+        price = self.prices.get(model) or {}
+        prompt_price = float(price.get('prompt', 0))
+        cached_price = float(price.get('cached_prompt', prompt_price))
+        return (
+            (prompt_tokens - cached_tokens) * prompt_price
+            + cached_tokens * cached_price
+            + completion_tokens * float(price.get('completion', 0))
+        ) / 1e6
+
+    def check(self, lender: Optional[str], model: str, prompt_tokens: int, max_completion: int, document_tokens: int = 0) -> None:
+        """
+        Check that a call of up to prompt_tokens + max_completion tokens fits
+        every budget. Only the totals a configured limit needs are summed
+        (each an indexed lookup), so without limits no query runs.
+
+        Args:
+            document_tokens: Tokens already spent on this document.
+
+        Raises:
+            BudgetExceeded naming the first budget that would be exceeded.
+        """
+        tokens = prompt_tokens + max_completion
+        cost = self.cost(model, prompt_tokens, max_completion)
+        limit = self.config.get('tokens_per_document')
+        if limit is not None and document_tokens + tokens > limit:
+            raise BudgetExceeded('tokens_per_document', limit, document_tokens + tokens)
+        # (scope prefix, limits, period, totals filter)
+        scopes = [
+            ('', self.config, 'run', {'run_id': self.run_id}),
+            ('', self.config, 'day', {'day': _today()}),
+            (f"lenders.{lender}.", self.lender_limits.get(lender) or {}, 'day', {'day': _today(), 'lender': lender}),
+        ]
+        for prefix, limits, period, where in scopes:
+            token_limit, cost_limit = limits.get(f"tokens_per_{period}"), limits.get(f"cost_per_{period}")
+            if token_limit is None and cost_limit is None:
+                continue
+            used = self.totals(**where)
+            for scope, projected, limit in (
+                (f"{prefix}tokens_per_{period}", used['tokens'] + tokens, token_limit),
+                (f"{prefix}cost_per_{period}", used['cost_usd'] + cost, cost_limit),
+            ):
+                if limit is not None and projected > float(limit):
+                    raise BudgetExceeded(scope, float(limit), projected)
+
+    def record(
+        self,
+        lender: Optional[str],
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        estimated: bool = False,
+        cached_tokens: int = 0,
+        latency_s: Optional[float] = None,
+    ) -> float:
+        """
+        Record one call's usage.
+
+        Args:
+            cached_tokens: Prompt tokens the provider served from its prefix cache.
+            latency_s: Request time, for comparing cached and uncached calls.
+
+        Returns:
+            Its cost in USD (0 for models without a configured price).
+        """
+        cost = self.cost(model, prompt_tokens, completion_tokens, cached_tokens)
+        with self._lock:
+            conn = self._db()
+            with conn:
+                conn.execute(
+                    "INSERT INTO llm_usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (time.time(), _today(), self.run_id, lender or '', model,
+                     prompt_tokens, completion_tokens, cost, int(estimated), cached_tokens, latency_s),
+                )
+        return cost
+
+    def totals(self, run_id: Optional[str] = None, day: Optional[str] = None, lender: Optional[str] = None) -> Dict:
+        """
+        Summed usage, optionally filtered by run, day and lender.
+        """
+        where, params = [], []
+        for column, value in (('run_id', run_id), ('day', day), ('lender', lender)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        sql = "SELECT COUNT(*), SUM(prompt_tokens), SUM(completion_tokens), SUM(cost_usd), SUM(cached_tokens) FROM llm_usage"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self._lock:
+            row = self._db().execute(sql, params).fetchone()
+        return _summary(*row)
+
+    def report(self) -> Dict:
+        """
+        Usage for this run and today, overall and per lender.
+        """
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT lender, COUNT(*), SUM(prompt_tokens), SUM(completion_tokens), SUM(cost_usd), SUM(cached_tokens) "
+                "FROM llm_usage WHERE day = ? GROUP BY lender",
+                (_today(),),
+            ).fetchall()
+        return {
+            'run': self.totals(run_id=self.run_id),
+            'today': self.totals(day=_today()),
+            'lenders_today': {lender or None: _summary(*rest) for lender, *rest in rows},
+            'prompt_cache': self.cache_report(),
+        }
+
+    def cache_report(self, run_id: Optional[str] = None) -> Dict:
+        """
+        Prefix-cache effect for a run (default: the current one): the share
+        of prompt tokens served from cache, and mean request latency of
+        calls with and without a cache hit.
+        """
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT cached_tokens > 0, COUNT(*), SUM(prompt_tokens), SUM(cached_tokens), AVG(latency_s) "
+                "FROM llm_usage WHERE run_id = ? AND estimated = 0 GROUP BY cached_tokens > 0",
+                (run_id or self.run_id,),
+            ).fetchall()
+        by_hit = {bool(hit): (calls, prompt or 0, cached or 0, latency) for hit, calls, prompt, cached, latency in rows}
+        prompt = sum(r[1] for r in by_hit.values())
+        cached = sum(r[2] for r in by_hit.values())
+
+        def latency(hit: bool) -> Optional[float]:
+            value = by_hit.get(hit, (0, 0, 0, None))[3]
+            return None if value is None else round(value, 3)
+
+        return {
+            'calls': sum(r[0] for r in by_hit.values()),
+            'cached_calls': by_hit.get(True, (0,))[0],
+            'cached_tokens': int(cached),
+            'cached_share': round(cached / prompt, 4) if prompt else 0.0,
+            'latency_s_cached': latency(True),
+            'latency_s_uncached': latency(False),
+        }
+
+
+def _summary(calls, prompt, completion, cost, cached=0) -> Dict:
+    prompt, completion = int(prompt or 0), int(completion or 0)
+    return {
+        'calls': int(calls or 0),
+        'prompt_tokens': prompt,
+        'completion_tokens': completion,
+        'tokens': prompt + completion,
+        'cached_tokens': int(cached or 0),
+        'cost_usd': round(float(cost or 0.0), 6),
+    }
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def usage_from_response(resp) -> Optional[Tuple[int, int]]:
+    """
+    (prompt_tokens, completion_tokens) reported by an OpenAI response, if any.
+    """
+    usage = getattr(resp, 'usage', None)
+    if usage is None:
+        return None
+    prompt = getattr(usage, 'prompt_tokens', None)
+    completion = getattr(usage, 'completion_tokens', None)
+    if prompt is None or completion is None:
+        return None
+    return int(prompt), int(completion)
+
+
+def cached_tokens_from_response(resp) -> int:
+    """
+    Prompt tokens an OpenAI response reports as served from the prefix cache.
+    """
+    details = getattr(getattr(resp, 'usage', None), 'prompt_tokens_details', None)
+    if isinstance(details, dict):
+        return int(details.get('cached_tokens') or 0)
+    return int(getattr(details, 'cached_tokens', 0) or 0)
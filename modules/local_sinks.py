@@ -0,0 +1,306 @@
+# modules/local_sinks.py
+"""
+High-volume local output backends for Writer: streaming CSV, SQLite (WAL)
+and Parquet. Columns follow the configured headers and are typed from
+StatementRecord (dates, floats, text).
+"""
+import csv
+import json
+import os
+import sqlite3
+import time
+from datetime import date
+from typing import Dict, List, Optional
+
+from modules.models import field_type
+from modules.utils import parse_date, parse_currency
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+def column_types(headers: List[str]) -> Dict[str, type]:
+    """
+    Map each header to date, float or str using StatementRecord's annotations.
+    """
+    return {col: field_type(col) for col in headers}
+
+
+def coerce(value, typ: type):
+    """
+    Convert a raw record value to its column type; None if empty or unparseable.
+    """
+    if value is None or value == '':
+        return None
+    try:
+        if typ is float:
+            return parse_currency(value)
+        if typ is date:
+            return parse_date(value)
+    except (ValueError, OverflowError):
+        return None
+    return str(value)
+
+
+class CSVSink:
+    def __init__(self, config: Dict, headers: List[str]):
+        """
+        Stream rows to a CSV file, writing the header row for new files.
+
+        Args:
+            config: Dict containing 'path' and optional 'batch_size'
+                (rows buffered between file flushes, default 1000).
+            headers: Column order.
+        """
+        self.path = config['path']
+        self.headers = headers
+        self.batch_size = int(config.get('batch_size', 1000) or 1000)
+        self._types = column_types(headers)
+        self._file = None
+        self._buffered = 0
+
+    def _open(self) -> None:
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, 'a', newline='', encoding='utf-8')
+        self._csv = csv.writer(self._file)
+        if new_file:
+            self._csv.writerow(self.headers)
+
+    def write(self, record: Dict) -> None:
+        if self._file is None:
+            self._open()
+        row = []
+        for col in self.headers:
+            value = coerce(record.get(col), self._types[col])
+            row.append('' if value is None else (value.isoformat() if isinstance(value, date) else value))
+        self._csv.writerow(row)
+        self._buffered += 1
+        if self._buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+        self._buffered = 0
+
+    def checkpoint(self) -> None:
+        """
+        Make every written row durable on disk.
+        """
+        self.flush()
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SQLiteSink:
+    _SQL_TYPES = {float: 'REAL', date: 'TEXT', str: 'TEXT'}
+
+    def __init__(self, config: Dict, headers: List[str], key: Optional[List[str]] = None):
+        """
+        Write rows to a SQLite table in WAL mode with batched transactions.
+
+        Args:
+            config: Dict containing 'path', optional 'table' (default
+                'statements') and 'batch_size' (rows per transaction, default 500).
+            headers: Column order.
+            key: Optional natural key; rows with an existing key are updated.
+        """
+        self.path = config['path']
+        self.table = config.get('table', 'statements')
+        self.headers = headers
+        self.batch_size = int(config.get('batch_size', 500) or 500)
+        self._types = column_types(headers)
+        self._rows: List[tuple] = []
+        self._key = key
+        self._conn = None
+
+        placeholders = ", ".join("?" for _ in headers)
+        names = ", ".join(f'"{c}"' for c in headers)
+        self._insert = f'INSERT INTO "{self.table}" ({names}) VALUES ({placeholders})'
+        if key:
+            key_cols = ", ".join(f'"{c}"' for c in key)
+            updates = ", ".join(f'"{c}" = excluded."{c}"' for c in headers if c not in key)
+            self._insert += f" ON CONFLICT ({key_cols}) DO " + (f"UPDATE SET {updates}" if updates else "NOTHING")
+
+    def _connect(self) -> None:
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # FULL: with NORMAL, WAL mode can lose the last commits on power loss
+        self._conn.execute("PRAGMA synchronous=FULL")
+        columns = ", ".join(f'"{c}" {self._SQL_TYPES[self._types[c]]}' for c in self.headers)
+        self._conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.table}" ({columns})')
+        if self._key:
+            key_cols = ", ".join(f'"{c}"' for c in self._key)
+            self._conn.execute(
+                f'CREATE UNIQUE INDEX IF NOT EXISTS "{self.table}_key" ON "{self.table}" ({key_cols})'
+            )
+        self._conn.commit()
+
+    def write(self, record: Dict) -> None:
+        row = []
+        for col in self.headers:
+            value = coerce(record.get(col), self._types[col])
+            row.append(value.isoformat() if isinstance(value, date) else value)
+        self._rows.append(tuple(row))
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._rows:
+            return
+        if self._conn is None:
+            self._connect()
+        with self._conn:
+            self._conn.executemany(self._insert, self._rows)
+        self._rows = []
+
+    def checkpoint(self) -> None:
+        """
+        Commit every written row (however short of batch_size the batch is).
+        """
+        self.flush()
+
+    def close(self) -> None:
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class ParquetSink:
+    def __init__(self, config: Dict, headers: List[str]):
+        """
+        Write rows to Parquet, one row group per batch.
+
+        Part files in the 'path' directory are written under a hidden name
+        and renamed once finished (every `row_groups_per_file` row groups
+        and at close), so the directory can always be read as a single
+        dataset. A Parquet file is only readable once closed, so
+        checkpoint() does not finish the part: it appends the rows written
+        since the last checkpoint to a spool file (`_pending.jsonl`, also
+        ignored by dataset readers) and fsyncs it. The spool is dropped
+        when a part is finished; after a crash, its rows are written to a
+        part file by the next ParquetSink on the directory.
+
+        Args:
+            config: Dict containing 'path' (directory) and optional
+                'row_group_size' (default 10000) and 'row_groups_per_file'
+                (default 10).
+            headers: Column order.
+        """
+        if pa is None:
+            raise ValueError("Parquet output requires the 'pyarrow' package.")
+        self.path = config['path']
+        self.headers = headers
+        self.row_group_size = int(config.get('row_group_size', 10000) or 10000)
+        self.row_groups_per_file = int(config.get('row_groups_per_file', 10) or 10)
+        self._types = column_types(headers)
+        arrow_types = {float: pa.float64(), date: pa.date32(), str: pa.string()}
+        self._schema = pa.schema([(c, arrow_types[self._types[c]]) for c in headers])
+        self._columns: Dict[str, list] = {c: [] for c in headers}
+        self._buffered = 0
+        self._writer = None
+        self._part = None
+        self._row_groups = 0
+        # Rows in the current part (or buffer) not yet in the spool
+        self._unspooled: List[Dict] = []
+        self._spool_path = os.path.join(self.path, '_pending.jsonl')
+        os.makedirs(self.path, exist_ok=True)
+        self._recover()
+
+    def _recover(self) -> None:
+        """
+        Finish the rows a crashed run checkpointed but never got into a
+        finished part, and drop its unfinished (unreadable) part files.
+        """
+        for name in os.listdir(self.path):
+            if name.startswith('.part-'):
+                os.remove(os.path.join(self.path, name))
+        if not os.path.exists(self._spool_path):
+            return
+        with open(self._spool_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn last line: never checkpointed
+                    break
+                for col in self.headers:
+                    self._columns[col].append(coerce(row.get(col), self._types[col]))
+                self._buffered += 1
+        self._finish_part()
+
+    def write(self, record: Dict) -> None:
+        row = {col: coerce(record.get(col), self._types[col]) for col in self.headers}
+        for col in self.headers:
+            self._columns[col].append(row[col])
+        self._unspooled.append(row)
+        self._buffered += 1
+        if self._buffered >= self.row_group_size:
+            self.flush()
+            if self._row_groups >= self.row_groups_per_file:
+                self._finish_part()
+
+    def flush(self) -> None:
+        """
+        Write buffered rows as a row group of the current part (readable
+        once the part is finished; see checkpoint()).
+        """
+        if not self._buffered:
+            return
+        if self._writer is None:
+            name = f"part-{time.time_ns()}.parquet"
+            self._part = name
+            self._writer = pq.ParquetWriter(os.path.join(self.path, '.' + name), self._schema)
+        table = pa.Table.from_pydict(self._columns, schema=self._schema)
+        self._writer.write_table(table, row_group_size=self.row_group_size)
+        self._row_groups += 1
+        self._columns = {c: [] for c in self.headers}
+        self._buffered = 0
+
+    def checkpoint(self) -> None:
+        """
+        Make every written row survive a crash by spooling the rows written
+        since the last checkpoint, without finishing the current part.
+        """
+        if not self._unspooled:
+            return
+        with open(self._spool_path, 'a', encoding='utf-8') as f:
+            for row in self._unspooled:
+                f.write(json.dumps(row, default=date.isoformat) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._unspooled = []
+
+    def _finish_part(self) -> None:
+        """
+        Close the current part under its final name, then drop the spool
+        whose rows it now holds.
+        """
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            hidden = os.path.join(self.path, '.' + self._part)
+            fd = os.open(hidden, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            os.replace(hidden, os.path.join(self.path, self._part))
+            self._row_groups = 0
+        if os.path.exists(self._spool_path):
+            os.remove(self._spool_path)
+        self._unspooled = []
+
+    def close(self) -> None:
+        self._finish_part()
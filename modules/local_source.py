@@ -0,0 +1,168 @@
+# modules/local_source.py
+"""
+Read PDF statements from a local directory tree or a zip/tar archive, with the
+same interface as DriveWatcher, for bulk backfills.
+"""
+import fnmatch
+import io
+import os
+import tarfile
+import threading
+import zipfile
+from datetime import datetime, timezone
+from typing import BinaryIO, Dict, Iterator, List
+
+# Separates the archive path from the member name in file IDs
+ARCHIVE_SEP = "::"
+
+
+class LocalSource:
+    def __init__(self, config: Dict):
+        """
+        Initialize the source.
+
+        Args:
+            config: Dict containing:
+                - path: Directory, .zip or .tar[.gz|.bz2|.xz] archive to read.
+                - pattern: Optional filename glob (default '*.pdf', case-insensitive).
+        """
+        self.path = config.get('path')
+        if not self.path or not os.path.exists(self.path):
+            raise ValueError(f"LocalSource path does not exist: {self.path!r}")
+        self.pattern = (config.get('pattern') or '*.pdf').lower()
+        self._lock = threading.Lock()
+        self._archive = None
+        if os.path.isdir(self.path):
+            self._kind = 'dir'
+        elif zipfile.is_zipfile(self.path):
+            self._kind = 'zip'
+        elif tarfile.is_tarfile(self.path):
+            self._kind = 'tar'
+        else:
+            raise ValueError(f"LocalSource path is not a directory or zip/tar archive: {self.path}")
+
+    def _matches(self, name: str) -> bool:
+        return fnmatch.fnmatch(os.path.basename(name).lower(), self.pattern)
+
+    def iter_new_pdfs(self) -> Iterator[Dict]:
+        """
+        Lazily enumerate matching files.
+
+        Yields:
+            Dicts with keys 'id', 'name', 'modifiedTime', 'size' and
+            'webViewLink', like DriveWatcher listings.
+        """
+        if self._kind == 'dir':
+            yield from self._iter_dir()
+        elif self._kind == 'zip':
+            yield from self._iter_zip()
+        else:
+            yield from self._iter_tar()
+
+    def list_new_pdfs(self) -> List[Dict]:
+        """
+        List matching files (see iter_new_pdfs).
+        """
+        return list(self.iter_new_pdfs())
+
+    def _iter_dir(self) -> Iterator[Dict]:
+        root = os.path.abspath(self.path)
+        for dirpath, dirnames, filenames in os.walk(root):
+            # Deterministic order keeps backfills resumable and reproducible
+            dirnames.sort()
+            for fname in sorted(filenames):
+                if not self._matches(fname):
+                    continue
+                full = os.path.join(dirpath, fname)
+                st = os.stat(full)
+                yield {
+                    'id': os.path.relpath(full, root),
+                    'name': fname,
+                    'modifiedTime': _iso(st.st_mtime),
+                    'size': str(st.st_size),
+                    'webViewLink': f"file://{full}",
+                }
+
+    def _iter_zip(self) -> Iterator[Dict]:
+        for info in self._open_archive().infolist():
+            if info.is_dir() or not self._matches(info.filename):
+                continue
+            yield self._member_meta(info.filename, info.file_size, datetime(*info.date_time).timestamp())
+
+    def _iter_tar(self) -> Iterator[Dict]:
+        # A separate handle so enumeration does not contend with downloads
+        with tarfile.open(self.path, 'r:*') as tar:
+            for member in tar:
+                if member.isfile() and self._matches(member.name):
+                    yield self._member_meta(member.name, member.size, member.mtime)
+
+    def _member_meta(self, name: str, size: int, mtime: float) -> Dict:
+        archive = os.path.abspath(self.path)
+        return {
+            'id': f"{os.path.basename(self.path)}{ARCHIVE_SEP}{name}",
+            'name': os.path.basename(name),
+            'modifiedTime': _iso(mtime),
+            'size': str(size),
+            'webViewLink': f"file://{archive}#{name}",
+        }
+
+    def _open_archive(self):
+        with self._lock:
+            if self._archive is None:
+                if self._kind == 'zip':
+                    self._archive = zipfile.ZipFile(self.path)
+                else:
+                    self._archive = tarfile.open(self.path, 'r:*')
+            return self._archive
+
+    def open_file(self, file_id: str) -> BinaryIO:
+        """
+        Open a file for streaming reads.
+
+        Args:
+            file_id: ID from iter_new_pdfs().
+
+        Returns:
+            A binary file object; the caller closes it.
+        """
+        if self._kind == 'dir':
+            full = os.path.join(os.path.abspath(self.path), file_id)
+            return open(full, 'rb')
+        member = file_id.split(ARCHIVE_SEP, 1)[1]
+        archive = self._open_archive()
+        if self._kind == 'zip':
+            # ZipFile serializes access to the underlying file itself
+            return archive.open(member)
+        with self._lock:
+            fobj = archive.extractfile(member)
+            if fobj is None:
+                raise FileNotFoundError(member)
+            # TarFile is not thread-safe: read the member under the lock
+            return io.BytesIO(fobj.read())
+
+    def download_file(self, file_id: str) -> bytes:
+        """
+        Read the file as raw bytes.
+
+        Args:
+            file_id: ID from iter_new_pdfs().
+
+        Returns:
+            Raw bytes of the PDF.
+        """
+        with self.open_file(file_id) as f:
+            return f.read()
+
+    def close(self) -> None:
+        """
+        Close the archive handle, if one is open.
+        """
+        with self._lock:
+            if self._archive is not None:
+                self._archive.close()
+                self._archive = None
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
@@ -1,11 +1,14 @@
 # modules/models.py
 from pydantic import BaseModel, field_validator
 from datetime import date
-import re
+from typing import Optional
+
+from modules.utils import parse_date, parse_currency
 
 class StatementRecord(BaseModel):
     StatementFileName: str
     StatementDate: date
+    MostRecentPaymentDate: Optional[date] = None
     MostRecentPaymentAmount: float
     AmountPrincipal: float
     AmountInterest: float
@@ -16,14 +19,15 @@ class StatementRecord(BaseModel):
     LinkToStatement: str
     PropertyAddress: str
 
-    @field_validator("StatementDate", mode="before")
+    @field_validator("StatementDate", "MostRecentPaymentDate", mode="before")
     @classmethod
     def parse_date(cls, v):
         """
         Parse date strings like "MM/DD/YYYY" or ISO into datetime.date.
         """
-        from dateutil import parser
-        return parser.parse(v).date()
+        if v is None or v == "":
+            return None
+        return parse_date(v)
 
     @field_validator(
         "MostRecentPaymentAmount",
@@ -41,5 +45,19 @@ class StatementRecord(BaseModel):
         Remove non-numeric characters (including $, commas, %)
         and convert to float.
         """
-        s = re.sub(r"[^0-9.]", "", str(v))
-        return float(s)
+        return parse_currency(v)
+
+
+def field_type(name: str) -> type:
+    """
+    Scalar type of a StatementRecord field: date, float or str (the
+    default, also for fields the model does not define).
+    """
+    info = StatementRecord.model_fields.get(name)
+    annotation = getattr(info, 'annotation', str)
+    if annotation in (float, date):
+        return annotation
+    if date in getattr(annotation, '__args__', ()):
+        # Optional[date]
+        return date
+    return str
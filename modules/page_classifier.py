@@ -0,0 +1,260 @@
+# modules/page_classifier.py
+"""
+Classify PDF pages as text, scanned or empty from the raw PDF objects,
+before any text extraction runs.
+
+Layout-aware extraction (pdfplumber) is the most expensive step of
+parsing, and on a scanned page it is wasted: there is no text to find.
+This classifier only reads each page's resources and tokenizes its
+decompressed content stream. It counts the characters shown by text
+operators, sums the area covered by painted images (tracking the
+transformation matrix), and notes whether any font is present. A page
+with almost no characters that is mostly covered by images, or has
+images but no font, is routed to OCR. A page is only skipped as empty
+when it has neither images nor anything that could draw text. A scan
+with an invisible OCR text layer has characters and so stays on the
+text path.
+"""
+import io
+import logging
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    from pypdf import PdfReader
+    from pypdf.generic import ArrayObject
+except ImportError:
+    PdfReader = None
+
+TEXT = 'text'
+OCR = 'ocr'
+EMPTY = 'empty'
+
+# Form XObjects nested deeper than this are not inspected
+_MAX_FORM_DEPTH = 4
+
+_TOKEN_RE = re.compile(
+    rb"\("                            # literal string start (see _literal_end)
+    rb"|<[0-9A-Fa-f\s]*>"             # hex string
+    rb"|/[^\s/\[\]()<>{}%]*"          # name
+    rb"|[-+]?(?:\d+\.?\d*|\.\d+)"     # number
+    rb"|%[^\r\n]*"                    # comment
+    rb"|<<|>>|\[|\]"
+    rb"|[A-Za-z'\"*]+",               # operator
+    re.S,
+)
+_INLINE_IMAGE_END_RE = re.compile(rb"\sEI(?=[\s/\[(<]|$)")
+_ESCAPE_RE = re.compile(rb"\\(?:[0-7]{1,3}|.)", re.S)
+_TEXT_OPS = {b"Tj", b"TJ", b"'", b'"'}
+
+Matrix = Tuple[float, float, float, float, float, float]
+_IDENTITY: Matrix = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+
+class PageClassifier:
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        Initialize the thresholds.
+
+        Args:
+            config: Optional dict ('parser.page_routing' section) containing:
+                - min_chars: Characters shown by text operators at or above
+                  which a page is text (default 20).
+                - min_image_coverage: Share of the page painted by images at
+                  or above which a page without enough text is scanned
+                  (default 0.5).
+        """
+        config = config or {}
+        self.min_chars = int(config.get('min_chars', 20))
+        self.min_image_coverage = float(config.get('min_image_coverage', 0.5))
+
+    @staticmethod
+    def available() -> bool:
+        return PdfReader is not None
+
+    def classify(self, pdf_bytes: bytes) -> List[Dict]:
+        """
+        Classify every page.
+
+        Returns:
+            One dict per page with 'kind' ('text', 'ocr' or 'empty'),
+            'chars', 'image_coverage' (0-1) and 'fonts' (bool).
+
+        Raises:
+            Whatever pypdf raises for a PDF it cannot read.
+        """
+        return list(self.iter_classify(pdf_bytes))
+
+    def iter_classify(self, pdf_bytes: bytes) -> Iterator[Dict]:
+        """
+        Classify pages one at a time as they are consumed, so a reader that
+        stops early (page or memory caps) never inspects the rest.
+
+        Raises:
+            Whatever pypdf raises for a PDF it cannot open (here, not when
+            iterating; a page that fails to classify raises from next()).
+        """
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        return (self.classify_page(page) for page in reader.pages)
+
+    def classify_page(self, page) -> Dict:
+        """
+        Classify one pypdf page.
+        """
+        box = page.mediabox
+        page_area = abs(float(box.width) * float(box.height)) or 1.0
+        stats = {'chars': 0, 'text_ops': 0, 'image_area': 0.0, 'fonts': False}
+        _scan(_page_content(page), _resources(page), _IDENTITY, stats, 0)
+        coverage = min(1.0, stats['image_area'] / page_area)
+        if stats['chars'] >= self.min_chars:
+            kind = TEXT
+        elif coverage >= self.min_image_coverage or (coverage > 0 and not stats['fonts']):
+            kind = OCR
+        elif stats['chars'] or stats['fonts'] or stats['text_ops']:
+            # Anything that may draw text goes to the text backend; only a
+            # page with nothing to read is skipped
+            kind = TEXT
+        else:
+            kind = EMPTY
+        return {'kind': kind, 'chars': stats['chars'], 'image_coverage': round(coverage, 3), 'fonts': stats['fonts']}
+
+
+def _resources(obj) -> Dict:
+    resources = obj.get('/Resources')
+    return resources.get_object() if resources is not None else {}
+
+
+def _page_content(page) -> bytes:
+    contents = page.get('/Contents')
+    if contents is None:
+        return b""
+    contents = contents.get_object()
+    streams = contents if isinstance(contents, ArrayObject) else [contents]
+    data = []
+    for stream in streams:
+        try:
+            data.append(stream.get_object().get_data())
+        except Exception as e:
+            logging.debug(f"Unreadable content stream: {e}")
+    return b"\n".join(data)
+
+
+def _scan(content: bytes, resources: Dict, ctm: Matrix, stats: Dict, depth: int) -> None:
+    """
+    Walk a content stream, adding shown characters and painted image area
+    to `stats`.
+    """
+    fonts = resources.get('/Font')
+    if fonts is not None and len(fonts.get_object()):
+        stats['fonts'] = True
+    xobjects = resources.get('/XObject')
+    xobjects = xobjects.get_object() if xobjects is not None else {}
+
+    stack: List[Matrix] = []
+    operands: List[bytes] = []
+    pending_chars = 0
+    pos = 0
+    while True:
+        match = _TOKEN_RE.search(content, pos)
+        if match is None:
+            break
+        token = match.group(0)
+        pos = match.end()
+        first = token[:1]
+        if first == b"(":
+            end = _literal_end(content, pos)
+            pending_chars += len(_ESCAPE_RE.sub(b"x", content[pos:end - 1]))
+            pos = end
+        elif first == b"<" and token != b"<<":
+            pending_chars += len(re.sub(rb"\s", b"", token[1:-1])) // 2
+        elif first == b"%":
+            continue
+        elif first.isalpha() or token in (b"'", b'"'):
+            if token in _TEXT_OPS:
+                stats['chars'] += pending_chars
+                stats['text_ops'] += 1
+            elif token == b"Tf":
+                stats['fonts'] = True
+            elif token == b"q":
+                stack.append(ctm)
+            elif token == b"Q":
+                if stack:
+                    ctm = stack.pop()
+            elif token == b"cm" and len(operands) >= 6:
+                ctm = _multiply(_numbers(operands[-6:]), ctm)
+            elif token == b"Do" and operands:
+                _paint(operands[-1].decode('latin-1'), xobjects, resources, ctm, stats, depth)
+            elif token == b"BI":
+                # Inline image: skip its binary data, count its area
+                end = _INLINE_IMAGE_END_RE.search(content, pos)
+                pos = end.end() if end else len(content)
+                stats['image_area'] += _area(ctm)
+            operands = []
+            pending_chars = 0
+        elif token not in (b"[", b"]"):
+            operands.append(token)
+
+
+def _literal_end(content: bytes, pos: int) -> int:
+    """
+    Offset just past the literal string whose opening "(" ends at `pos`.
+    Literal strings may contain balanced unescaped parentheses.
+    """
+    depth = 1
+    n = len(content)
+    while pos < n:
+        ch = content[pos]
+        if ch == 0x5C:  # backslash escapes the next byte
+            pos += 2
+            continue
+        pos += 1
+        if ch == 0x28:
+            depth += 1
+        elif ch == 0x29:
+            depth -= 1
+            if depth == 0:
+                return pos
+    return n
+
+
+def _paint(name: str, xobjects: Dict, resources: Dict, ctm: Matrix, stats: Dict, depth: int) -> None:
+    xobject = xobjects.get(name)
+    if xobject is None:
+        return
+    xobject = xobject.get_object()
+    subtype = xobject.get('/Subtype')
+    if subtype == '/Image':
+        # Images are drawn into the unit square
+        stats['image_area'] += _area(ctm)
+    elif subtype == '/Form' and depth < _MAX_FORM_DEPTH:
+        matrix = xobject.get('/Matrix')
+        form_ctm = _multiply(tuple(float(v) for v in matrix), ctm) if matrix is not None else ctm
+        form_resources = _resources(xobject) or resources
+        try:
+            data = xobject.get_data()
+        except Exception as e:
+            logging.debug(f"Unreadable form XObject {name}: {e}")
+            return
+        _scan(data, form_resources, form_ctm, stats, depth + 1)
+
+
+def _numbers(tokens: List[bytes]) -> Matrix:
+    try:
+        return tuple(float(t) for t in tokens)
+    except ValueError:
+        return _IDENTITY
+
+
+def _multiply(m: Matrix, n: Matrix) -> Matrix:
+    a, b, c, d, e, f = m
+    a2, b2, c2, d2, e2, f2 = n
+    return (
+        a * a2 + b * c2, a * b2 + b * d2,
+        c * a2 + d * c2, c * b2 + d * d2,
+        e * a2 + f * c2 + e2, e * b2 + f * d2 + f2,
+    )
+
+
+def _area(ctm: Matrix) -> float:
+    a, b, c, d, _, _ = ctm
+    return abs(a * d - b * c)
@@ -0,0 +1,190 @@
+# modules/patterns.py
+"""
+Compile, run and lint the user-supplied lender regexes.
+
+Patterns are compiled with the `regex` package, whose searches accept a
+timeout, so one pathological pattern cannot freeze a worker on a large
+OCR dump. At config time every pattern is also benchmarked against a
+stress corpus; a pattern whose run time grows super-linearly with the
+input (or that hits the timeout outright) is rejected before any file
+is processed.
+"""
+import re
+import sys
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import regex
+
+# Per-search timeout used when extracting
+DEFAULT_TIMEOUT_S = 1.0
+
+# Linter defaults: the input grows by `growth`, so linear patterns slow down
+# about `growth` times and quadratic ones about growth**2 times.
+LINT_SIZE = 4000
+LINT_GROWTH = 4
+LINT_MAX_RATIO = 8.0
+# Below this run time on the large input a pattern is never rejected
+LINT_MIN_SECONDS = 0.005
+LINT_TIMEOUT_S = 0.5
+
+_FILLERS = (' ', 'a', '1', ':', ': ', '$', '. ', 'a1 ', '\t')
+_LITERAL_RE = re.compile(r"[A-Za-z][A-Za-z0-9 &'-]{2,}")
+
+
+class PatternLintError(ValueError):
+    """
+    One or more lender patterns failed to compile or backtrack catastrophically.
+    """
+    def __init__(self, problems: List[str]):
+        super().__init__("Rejected lender patterns:\n  " + "\n  ".join(problems))
+        self.problems = problems
+
+
+@lru_cache(maxsize=1024)
+def compile_pattern(pattern: str):
+    """
+    Compiled `regex` pattern (cached; raises regex.error if invalid).
+    """
+    return regex.compile(pattern)
+
+
+def search(pattern: str, text: str, timeout: Optional[float] = DEFAULT_TIMEOUT_S):
+    """
+    Search with a time limit.
+
+    Raises:
+        TimeoutError if the search runs longer than `timeout` seconds.
+    """
+    return compile_pattern(pattern).search(text, timeout=timeout)
+
+
+def stress_corpus(pattern: str, size: int) -> List[str]:
+    """
+    Inputs of about `size` characters that tend to trigger backtracking:
+    long runs of filler without a newline, the pattern's own literal
+    labels repeated, and each label followed by one long run of filler.
+    """
+    literals = sorted({m.group(0).strip() for m in _LITERAL_RE.finditer(pattern) if m.group(0).strip()})
+    corpus = [_repeat(filler, size) for filler in _FILLERS]
+    for literal in literals:
+        for unit in (literal + ' ', literal + ': ', literal + ' a1'):
+            corpus.append(_repeat(unit, size))
+        for filler in _FILLERS:
+            corpus.append(literal + ': ' + _repeat(filler, size - len(literal) - 2))
+    return corpus
+
+
+def _repeat(unit: str, size: int) -> str:
+    return (unit * (size // len(unit) + 1))[:size]
+
+
+def _time_search(compiled, text: str, timeout: float, repeats: int = 3) -> float:
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        compiled.search(text, timeout=timeout)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_pattern(
+    pattern: str,
+    size: int = LINT_SIZE,
+    growth: int = LINT_GROWTH,
+    timeout: float = LINT_TIMEOUT_S,
+) -> Dict:
+    """
+    Time a pattern on each stress input at `size` and `size * growth`
+    characters.
+
+    Returns:
+        Dict with the worst input's 'ratio' (large/small run time),
+        'seconds' (large input), 'timed_out' and 'input' (a preview).
+    """
+    compiled = compile_pattern(pattern)
+    worst = {'pattern': pattern, 'ratio': 0.0, 'seconds': 0.0, 'timed_out': False, 'input': ''}
+    small_inputs = stress_corpus(pattern, size)
+    large_inputs = stress_corpus(pattern, size * growth)
+    for small, large in zip(small_inputs, large_inputs):
+        try:
+            t_small = _time_search(compiled, small, timeout)
+            t_large = _time_search(compiled, large, timeout)
+        except TimeoutError:
+            return dict(worst, timed_out=True, seconds=timeout, input=small[:40])
+        ratio = t_large / max(t_small, 1e-6)
+        if t_large >= LINT_MIN_SECONDS and ratio > worst['ratio']:
+            worst.update(ratio=ratio, seconds=t_large, input=large[:40])
+    return worst
+
+
+def lint_pattern(pattern: str, max_ratio: float = LINT_MAX_RATIO, **benchmark_kwargs) -> Optional[str]:
+    """
+    Problem description for a pattern, or None if it is acceptable.
+    """
+    try:
+        compile_pattern(pattern)
+    except regex.error as e:
+        return f"does not compile: {e}"
+    result = benchmark_pattern(pattern, **benchmark_kwargs)
+    if result['timed_out']:
+        return f"timed out on {result['input']!r}..."
+    if result['ratio'] > max_ratio:
+        return (
+            f"super-linear: {result['ratio']:.0f}x slower on a "
+            f"{benchmark_kwargs.get('growth', LINT_GROWTH)}x longer input ({result['input']!r}...)"
+        )
+    return None
+
+
+def lint_lenders(lenders_config: List[Dict], config: Optional[Dict] = None) -> List[str]:
+    """
+    Lint every lender pattern.
+
+    Args:
+        lenders_config: List of lenders with 'name' and 'regex_patterns'.
+        config: Optional dict with lint_size, lint_growth, lint_max_ratio
+            and lint_timeout_s overrides.
+
+    Returns:
+        "lender.field: problem" strings; empty if every pattern passed.
+    """
+    config = config or {}
+    kwargs = {
+        'max_ratio': float(config.get('lint_max_ratio', LINT_MAX_RATIO)),
+        'size': int(config.get('lint_size', LINT_SIZE)),
+        'growth': int(config.get('lint_growth', LINT_GROWTH)),
+        'timeout': float(config.get('lint_timeout_s', LINT_TIMEOUT_S)),
+    }
+    problems = []
+    for lender in lenders_config:
+        for field, pattern in (lender.get('regex_patterns') or {}).items():
+            problem = lint_pattern(pattern, **kwargs)
+            if problem:
+                problems.append(f"{lender.get('name')}.{field}: {problem}")
+    return problems
+
+
+def check_lenders(lenders_config: List[Dict], config: Optional[Dict] = None) -> None:
+    """
+    Raises:
+        PatternLintError listing every rejected pattern.
+    """
+    problems = lint_lenders(lenders_config, config)
+    if problems:
+        raise PatternLintError(problems)
+
+
+if __name__ == '__main__':
+    import yaml
+
+    path = sys.argv[1] if len(sys.argv) > 1 else 'config.yaml'
+    with open(path) as f:
+        cfg = yaml.safe_load(f)
+    found = lint_lenders(cfg.get('lenders', []), cfg.get('regex'))
+    for line in found:
+        print(line)
+    print(f"{len(found)} rejected pattern(s)")
+    sys.exit(1 if found else 0)
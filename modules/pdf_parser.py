@@ -1,43 +1,302 @@
 # modules/pdf_parser.py
 """
-Extract text from PDFs using pdfplumber with an OCR fallback via Tesseract.
+Extract text from PDFs with a pluggable text backend (pdfplumber by default)
+and an OCR fallback via Tesseract.
+
+Each page is classified from the raw PDF objects just before the text
+backend reaches it (see modules.page_classifier): scanned pages go
+straight to OCR, blank pages are skipped, and only text pages are
+extracted.
 """
-import io
-import pdfplumber
+import gc
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+from modules import page_classifier, profiler
+from modules.page_classifier import PageClassifier
+from modules.text_backends import PDFIUM_LOCK, available_backends, default_auto_order, get_backend
 
 class PDFParser:
-    def __init__(self, ocr_config: dict):
+    def __init__(self, ocr_config: dict, parser_config: Optional[dict] = None):
         """
         Initialize the parser.
 
         Args:
             ocr_config: dict of OCR settings (e.g., language, tesseract_cmd).
+            parser_config: Optional dict containing:
+                - backend: Text backend ('pdfplumber' (default), 'pypdfium2',
+                  'pypdf', 'pdfminer') or 'auto'.
+                - auto_order: Backends tried in auto mode, fastest first
+                  (default: fastest installed, then fastest layout-aware).
+                - min_hit_rate: Regex hit rate below which auto mode moves
+                  on to the next backend (default 0.9).
+                - lender_backends: Map of lender name to backend, overriding
+                  the choice for that lender's statements.
+                - max_pages: Pages read per document before it is handled
+                  in degraded mode (default 0, unlimited).
+                - max_memory_mb: Process memory growth allowed while reading
+                  one document before degraded mode (default 0, unlimited).
+                  Growth is measured on the whole process's RSS, so it only
+                  bounds one document when that process parses one document
+                  at a time (see ProcessingChain).
+                - page_routing: Per-page routing settings (see
+                  PageClassifier); 'enabled' (default True) sends scanned
+                  pages to OCR and skips blank ones without text extraction.
         """
         self.ocr_config = ocr_config
+        parser_config = parser_config or {}
+        self.backend = parser_config.get('backend', 'pdfplumber')
+        if self.backend == 'auto':
+            order = parser_config.get('auto_order') or default_auto_order()
+            self.auto_order = [name for name in order if name in available_backends()]
+            if not self.auto_order:
+                raise ValueError(f"No installed backend in parser.auto_order: {order}")
+        else:
+            get_backend(self.backend)
+            self.auto_order = [self.backend]
+        self.min_hit_rate = float(parser_config.get('min_hit_rate', 0.9))
+        self.lender_backends = dict(parser_config.get('lender_backends') or {})
+        for name in self.lender_backends.values():
+            get_backend(name)
+        # Documents finally read by each backend
+        self.backend_usage: Counter = Counter()
+        self.max_pages = int(parser_config.get('max_pages', 0) or 0)
+        self.max_memory = int(float(parser_config.get('max_memory_mb', 0) or 0) * 1024 * 1024)
+        routing_cfg = parser_config.get('page_routing', {}) or {}
+        if routing_cfg.get('enabled', True) and PageClassifier.available():
+            self.classifier: Optional[PageClassifier] = PageClassifier(routing_cfg)
+        else:
+            self.classifier = None
+        # Pages routed to each path ('text', 'ocr', 'empty')
+        self.page_routes: Counter = Counter()
+        # Per thread: page routes and OCR text of the document being read,
+        # shared by the backends read_best tries on it; dropped once the
+        # call (or the iter_pages stream) is done
+        self._memo = threading.local()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_memo']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._memo = threading.local()
+
+    @property
+    def memory_bounded(self) -> bool:
+        """
+        True when a page or memory cap is configured; callers should then
+        stream pages (iter_pages) so degraded documents can be flagged.
+        """
+        return bool(self.max_pages or self.max_memory)
 
-    def extract_text(self, pdf_bytes: bytes) -> str:
+    @property
+    def adaptive(self) -> bool:
         """
-        Extract text from a PDF. Use pdfplumber first; if no text found, use OCR.
+        True when the backend is picked per document (see extract_best).
+        """
+        return self.backend == 'auto' or bool(self.lender_backends)
+
+    def extract_text(self, pdf_bytes: bytes, backend: Optional[str] = None) -> str:
+        """
+        Extract text from a PDF with the configured backend; if no text found, use OCR.
 
         Args:
             pdf_bytes: Raw bytes of the PDF file.
+            backend: Optional backend name overriding the configured one.
+
+        Returns:
+            Extracted text as a single string.
+        """
+        name = backend or self.auto_order[0]
+        try:
+            combined, degraded = self._read(name, pdf_bytes)
+        finally:
+            self._forget()
+        self.backend_usage[name] += 1
+        return combined if degraded else self._with_ocr_fallback(combined, pdf_bytes)
+
+    def extract_best(self, pdf_bytes: bytes, score: Callable[[str], Tuple[Optional[str], float]]) -> str:
+        """
+        Extract text, choosing the backend from the regex hit rate (see
+        read_best).
 
         Returns:
             Extracted text as a single string.
         """
-        # Open the PDF from bytes
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            # Collect text from each page
-            texts = []
-            for page in pdf.pages:
-                page_text = page.extract_text() or ""
-                texts.append(page_text)
-            combined = "\n".join(texts)
+        return self.read_best(pdf_bytes, score)[0]
+
+    def read_best(
+        self, pdf_bytes: bytes, score: Callable[[str], Tuple[Optional[str], float]],
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Extract text, choosing the backend from the regex hit rate.
+
+        Backends are tried fastest first and the next one is only used when
+        `score` reports a hit rate below min_hit_rate; the best-scoring text
+        wins. If the statement's lender has a backend in lender_backends,
+        that backend's text is used instead. Every read is held to
+        max_pages/max_memory_mb; once one is cut short no further backend
+        is tried, since it would be cut short as well.
+
+        Args:
+            pdf_bytes: Raw bytes of the PDF file.
+            score: Callable returning (lender name, regex hit rate) for a
+                text, e.g. Extractor.score_text.
+
+        Returns:
+            (text, degraded reason or None); no OCR fallback runs for a
+            degraded document.
+        """
+        best = None
+        try:
+            for name in self.auto_order:
+                text, degraded = self._read(name, pdf_bytes)
+                lender, rate = score(text)
+                preferred = None if degraded else self.lender_backends.get(lender)
+                if preferred and preferred != name:
+                    text, degraded = self._read(preferred, pdf_bytes)
+                    best = (score(text)[1], preferred, text, degraded)
+                    break
+                if best is None or rate > best[0]:
+                    best = (rate, name, text, degraded)
+                if rate >= self.min_hit_rate or preferred or degraded:
+                    break
+        finally:
+            self._forget()
+        _, name, text, degraded = best
+        self.backend_usage[name] += 1
+        if degraded:
+            return text, degraded
+        return self._with_ocr_fallback(text, pdf_bytes), None
+
+    def iter_pages(self, pdf_bytes: bytes, backend: Optional[str] = None) -> "PageStream":
+        """
+        Stream text page by page instead of joining the whole document.
+
+        Each page's cached layout objects are released as soon as its text
+        has been extracted. Closing the stream early stops parsing and
+        closes the PDF. If no page yields any text, the OCR output is
+        yielded as a single final chunk.
+
+        Past max_pages pages, or once the process has grown by more than
+        max_memory_mb while reading the document, the stream stops early
+        and its `degraded` attribute gives the reason.
+
+        Args:
+            pdf_bytes: Raw bytes of the PDF file.
+            backend: Optional backend name overriding the configured one.
+
+        Returns:
+            A PageStream yielding the text of each page (empty string for
+            pages without text).
+        """
+        name = backend or self.auto_order[0]
+        self.backend_usage[name] += 1
+        return self._stream(name, pdf_bytes, ocr=True, on_close=self._forget)
+
+    def _stream(
+        self, name: str, pdf_bytes: bytes, ocr: bool = False, on_close: Optional[Callable[[], None]] = None,
+    ) -> "PageStream":
+        fallback = (lambda: self._ocr_extract(pdf_bytes)) if ocr else None
+        routes = self._route(pdf_bytes)
+        if routes is None:
+            # Pages past the cap are only counted, never extracted
+            pages = get_backend(name).iter_pages(pdf_bytes, range(self.max_pages) if self.max_pages else None)
+        else:
+            pages = self._routed_pages(name, pdf_bytes, routes)
+        return PageStream(
+            pages,
+            max_pages=self.max_pages,
+            max_memory=self.max_memory,
+            fallback=fallback,
+            on_close=on_close,
+        )
+
+    def _route(self, pdf_bytes: bytes) -> Optional["_PageRoutes"]:
+        """
+        Lazily classified page kinds for a document, or None to extract
+        every page as text (routing disabled, or a PDF pypdf cannot open).
+        """
+        if self.classifier is None:
+            return None
+        memo = self._memo
+        if getattr(memo, 'pdf_bytes', None) is not pdf_bytes:
+            memo.pdf_bytes = pdf_bytes
+            try:
+                with profiler.stage('classify'):
+                    memo.routes = _PageRoutes(self.classifier.iter_classify(pdf_bytes), self.page_routes, self.max_pages)
+            except Exception as e:
+                logging.debug(f"Page classification failed, extracting every page as text: {e}")
+                memo.routes = None
+        return memo.routes
+
+    def _forget(self) -> None:
+        """
+        Drop this thread's memo (the PDF bytes, page routes and OCR text).
+        """
+        self._memo.__dict__.clear()
+
+    def _routed_pages(self, name: str, pdf_bytes: bytes, routes: "_PageRoutes") -> Iterator[str]:
+        """
+        Page texts with the backend run on text pages only; scanned pages
+        are OCRed one by one and blank pages yield "". The backend asks
+        `routes` about each page as it reaches it, which classifies it.
+        """
+        texts = get_backend(name).iter_pages(pdf_bytes, routes)
+        try:
+            for i, text in enumerate(texts):
+                if routes.limit and i >= routes.limit:
+                    # Over the page cap: not classified, extracted or OCRed
+                    yield ""
+                elif routes.kind(i) == page_classifier.OCR:
+                    if i not in routes.ocr_texts:
+                        profiler.count('ocr_pages')
+                        routes.ocr_texts[i] = self._ocr_page(pdf_bytes, i)
+                    text = routes.ocr_texts[i]
+                yield text
+        finally:
+            texts.close()
+
+    def _read(self, name: str, pdf_bytes: bytes) -> Tuple[str, Optional[str]]:
+        """
+        Join the page texts produced by one backend (within the caps).
 
+        Returns:
+            (text, degraded reason or None)
+        """
+        stream = self._stream(name, pdf_bytes)
+        try:
+            return "\n".join(stream), stream.degraded
+        finally:
+            stream.close()
+
+    def _with_ocr_fallback(self, text: str, pdf_bytes: bytes) -> str:
         # If extracted text is empty or whitespace-only, fallback to OCR
-        if not combined.strip():
-            return self._ocr_extract(pdf_bytes)
-        return combined
+        if not text.strip():
+            with profiler.stage('ocr'):
+                return self._ocr_extract(pdf_bytes)
+        return text
 
     def _ocr_extract(self, pdf_bytes: bytes) -> str:
         """
@@ -51,3 +310,180 @@ class PDFParser:
         """
         # TODO: implement OCR extraction: convert PDF pages to images and run pytesseract
         return ""  # placeholder implementation
+
+    def _ocr_page(self, pdf_bytes: bytes, index: int) -> str:
+        """
+        OCR one page: render it with PDFium and run Tesseract on the image.
+
+        Args:
+            pdf_bytes: Raw bytes of the PDF.
+            index: Zero-based page number.
+
+        Returns:
+            OCR text, or "" if PDFium, pytesseract or Tesseract is missing.
+        """
+        if pdfium is None or pytesseract is None:
+            logging.warning("OCR needs pypdfium2 and pytesseract; scanned page %d left empty", index + 1)
+            return ""
+        if self.ocr_config.get('tesseract_cmd'):
+            pytesseract.pytesseract.tesseract_cmd = self.ocr_config['tesseract_cmd']
+        # Tesseract runs outside the lock; only the rendering is PDFium
+        with PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(pdf_bytes)
+            try:
+                page = pdf[index]
+                try:
+                    bitmap = page.render(scale=float(self.ocr_config.get('dpi', 300)) / 72)
+                    # Copied so the PDFium bitmap can be freed under the lock
+                    image = bitmap.to_pil().copy()
+                    bitmap.close()
+                finally:
+                    page.close()
+            finally:
+                pdf.close()
+        try:
+            return pytesseract.image_to_string(image, lang=self.ocr_config.get('lang', 'eng'))
+        except Exception as e:
+            logging.warning("OCR failed on page %d: %s", index + 1, e)
+            return ""
+
+
+class _PageRoutes:
+    """
+    Page kinds of one document, classified in page order on first use.
+    Backends test `i in routes` to decide whether to extract page i, so a
+    stream cut short by the caps never classifies the pages after it, and
+    pages at or past `limit` (max_pages) are never extracted.
+    """
+    def __init__(self, pages: Iterator[Dict], counts: Counter, limit: int = 0):
+        self._pages: Optional[Iterator[Dict]] = pages
+        self._counts = counts
+        self.limit = limit
+        self.kinds: List[str] = []
+        self.ocr_texts: Dict[int, str] = {}
+
+    def kind(self, i: int) -> str:
+        while len(self.kinds) <= i and self._pages is not None:
+            try:
+                with profiler.stage('classify'):
+                    page = next(self._pages)
+            except StopIteration:
+                self._pages = None
+                break
+            except Exception as e:
+                logging.debug(f"Page classification failed, extracting the rest as text: {e}")
+                self._pages = None
+                break
+            self.kinds.append(page['kind'])
+            self._counts[page['kind']] += 1
+        return self.kinds[i] if i < len(self.kinds) else page_classifier.TEXT
+
+    def __contains__(self, i: int) -> bool:
+        if self.limit and i >= self.limit:
+            return False
+        return self.kind(i) == page_classifier.TEXT
+
+
+class PageStream:
+    """
+    Iterator over page texts that enforces per-document page and memory caps.
+
+    Instead of failing, a document over a cap is cut short: the pages read
+    so far are kept and `degraded` holds the reason. No OCR fallback runs
+    for degraded documents.
+    """
+    def __init__(
+        self,
+        pages: Iterator[str],
+        max_pages: int = 0,
+        max_memory: int = 0,
+        fallback: Optional[Callable[[], str]] = None,
+        on_close: Optional[Callable[[], None]] = None,
+    ):
+        self._pages = pages
+        self.max_pages = max_pages
+        self.max_memory = max_memory
+        self._fallback = fallback
+        self._on_close = on_close
+        self._baseline = _rss_bytes() if max_memory else 0
+        self._found_text = False
+        self._done = False
+        self.pages_read = 0
+        self.degraded: Optional[str] = None
+
+    def __iter__(self) -> "PageStream":
+        return self
+
+    def __next__(self) -> str:
+        if self._done:
+            raise StopIteration
+        over_cap = bool(self.max_pages) and self.pages_read >= self.max_pages
+        try:
+            with profiler.stage('pdf_pages'):
+                # Past the cap the page source yields "" without extracting
+                # (or OCRing) anything: this only tells whether there is
+                # another page
+                page_text = next(self._pages)
+        except StopIteration:
+            self.close()
+            return self._run_fallback()
+        except MemoryError:
+            self._degrade("ran out of memory")
+            raise StopIteration
+        if over_cap:
+            self._degrade(f"has more than {self.max_pages} page(s)")
+            raise StopIteration
+        self.pages_read += 1
+        profiler.count('pages')
+        if page_text.strip():
+            self._found_text = True
+        if self.max_memory and self._grown() > self.max_memory:
+            gc.collect()
+            grown = self._grown()
+            if grown > self.max_memory:
+                # Keep this page, stop before the next one
+                self._degrade(f"memory grew by {grown // (1024 * 1024)} MB")
+        return page_text
+
+    def _run_fallback(self) -> str:
+        fallback, self._fallback = self._fallback, None
+        if fallback and not self._found_text:
+            with profiler.stage('ocr'):
+                text = fallback()
+            if text:
+                return text
+        raise StopIteration
+
+    def _grown(self) -> int:
+        return _rss_bytes() - self._baseline
+
+    def _degrade(self, reason: str) -> None:
+        self.degraded = f"document {reason}; read {self.pages_read} page(s)"
+        logging.warning("Degraded PDF parse: %s", self.degraded)
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stop parsing and release the PDF.
+        """
+        self._done = True
+        self._pages.close()
+        on_close, self._on_close = self._on_close, None
+        if on_close:
+            on_close()
+
+
+def _rss_bytes() -> int:
+    """
+    Resident set size of this process (peak RSS where current is unavailable).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+        return peak if sys.platform == 'darwin' else peak * 1024
+    return 0
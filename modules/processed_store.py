@@ -3,29 +3,64 @@
 Track which Drive file IDs have been processed to avoid reprocessing.
 """
 import json
+import logging
 import os
-from typing import Optional, Set
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
 
 class ProcessedStore:
-    def __init__(self, store_path: Optional[str] = None):
+    def __init__(self, store_path: Optional[str] = None, autoflush: bool = True):
         """
         Initialize the processed-store, loading existing state or creating a new one.
 
+        The store also keeps an index of content checksums (Drive md5Checksum)
+        so re-uploads of an already processed statement can be linked to the
+        earlier result without downloading them, and counts failures per
+        file so files that keep failing can be quarantined.
+
         Args:
             store_path: Path to JSON file where processed IDs are saved.
+            autoflush: Save after every change. With False, changes stay in
+                memory until flush(), which callers marking many files (the
+                processing chain, at its checkpoints) call once per batch:
+                each save rewrites the whole file.
         """
         self.store_path = store_path or "processed.json"
+        self.autoflush = autoflush
+        self._dirty = False
+        self._processed: Set[str] = set()
+        self._checksums: Dict[str, str] = {}
+        self._duplicates: Dict[str, str] = {}
+        self._failures: Dict[str, Dict] = {}
+        self._quarantined: Dict[str, Dict] = {}
         # Load existing IDs or start empty
         if os.path.exists(self.store_path):
             try:
                 with open(self.store_path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
-                self._processed: Set[str] = set(data)
-            except Exception:
-                # Corrupted or unreadable file, start fresh
+                if isinstance(data, list):
+                    # Legacy format: plain list of processed IDs
+                    self._processed = set(data)
+                else:
+                    self._processed = set(data.get('processed', []))
+                    self._checksums = dict(data.get('checksums', {}))
+                    self._duplicates = dict(data.get('duplicates', {}))
+                    self._failures = dict(data.get('failures', {}))
+                    self._quarantined = dict(data.get('quarantined', {}))
+            except Exception as e:
+                # Corrupted or unreadable file: keep it for inspection and
+                # start fresh
+                logging.error(f"Processed store {self.store_path} is unreadable ({e}); "
+                              f"moved to {self.store_path}.corrupt, starting empty")
+                try:
+                    os.replace(self.store_path, self.store_path + '.corrupt')
+                except OSError:
+                    pass
                 self._processed = set()
-        else:
-            self._processed = set()
+                self._checksums = {}
+                self._duplicates = {}
+                self._failures = {}
+                self._quarantined = {}
 
     def has_processed(self, file_id: str) -> bool:
         """
@@ -33,15 +68,123 @@ class ProcessedStore:
         """
         return file_id in self._processed
 
-    def mark_processed(self, file_id: str) -> None:
+    def mark_processed(self, file_id: str, checksum: Optional[str] = None) -> None:
+        """
+        Mark a file_id as processed and persist the store (see autoflush).
+
+        Args:
+            file_id: Drive file ID.
+            checksum: Optional content checksum to index for duplicate detection.
+        """
+        self._processed.add(file_id)
+        if checksum:
+            self._checksums.setdefault(checksum, file_id)
+        self._failures.pop(file_id, None)
+        self._persist()
+
+    def find_by_checksum(self, checksum: str) -> Optional[str]:
+        """
+        Return the ID of the processed file with this content checksum, if any.
+        """
+        return self._checksums.get(checksum)
+
+    def link_duplicate(self, file_id: str, original_id: str) -> None:
         """
-        Mark a file_id as processed and persist the store to disk.
+        Mark file_id processed as a duplicate of original_id and persist
+        (see autoflush).
         """
         self._processed.add(file_id)
-        # Persist updated list
+        self._duplicates[file_id] = original_id
+        self._persist()
+
+    def original_of(self, file_id: str) -> Optional[str]:
+        """
+        Return the file whose result a duplicate was linked to, if any.
+        """
+        return self._duplicates.get(file_id)
+
+    def record_failure(self, file_id: str, error: str, max_failures: int = 3) -> bool:
+        """
+        Count a failed attempt at a file and quarantine it after max_failures.
+
+        Args:
+            file_id: Drive file ID.
+            error: Description of the failure.
+            max_failures: Failures before the file is quarantined.
+
+        Returns:
+            True if the file is now quarantined.
+        """
+        entry = self._failures.setdefault(file_id, {'count': 0})
+        entry['count'] += 1
+        entry['last_error'] = error[:500]
+        quarantined = entry['count'] >= max_failures
+        if quarantined:
+            self._failures.pop(file_id)
+            self._quarantined[file_id] = {
+                'failures': entry['count'],
+                'last_error': entry['last_error'],
+                'quarantined_at': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            }
+        self._persist()
+        return quarantined
+
+    def failure_count(self, file_id: str) -> int:
+        """
+        Failed attempts recorded for a file that is not (yet) quarantined.
+        """
+        return self._failures.get(file_id, {}).get('count', 0)
+
+    def is_quarantined(self, file_id: str) -> bool:
+        """
+        Check if a file was quarantined after repeated failures.
+        """
+        return file_id in self._quarantined
+
+    def quarantined(self) -> Dict[str, Dict]:
+        """
+        Quarantined files with their failure count, last error and time.
+        """
+        return dict(self._quarantined)
+
+    def release(self, file_id: str) -> None:
+        """
+        Take a file out of quarantine so it is retried on the next run.
+        """
+        self._quarantined.pop(file_id, None)
+        self._failures.pop(file_id, None)
+        self._persist()
+
+    def flush(self) -> None:
+        """
+        Save changes made since the last save to disk.
+        """
+        if self._dirty:
+            self._save()
+
+    def _persist(self) -> None:
+        self._dirty = True
+        if self.autoflush:
+            self._save()
+
+    def _save(self) -> None:
+        data = {
+            'processed': list(self._processed),
+            'checksums': self._checksums,
+            'duplicates': self._duplicates,
+            'failures': self._failures,
+            'quarantined': self._quarantined,
+        }
+        # Written aside and swapped in, so a crash mid-write leaves the
+        # previous file intact rather than a torn one
+        tmp = self.store_path + '.tmp'
         try:
-            with open(self.store_path, 'w', encoding='utf-8') as f:
-                json.dump(list(self._processed), f)
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.store_path)
+            self._dirty = False
         except Exception:
             # In case of write errors, ignore but keep in-memory
-            pass
\ No newline at end of file
+            pass
@@ -2,14 +2,28 @@
 """
 Orchestrates the pipeline: DriveWatcher → PDFParser → Extractor → Writer → Indexer → Notifier
 """
-from typing import Dict
+import logging
+import multiprocessing
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from modules.drive_watcher import DriveWatcher
+from modules.local_source import LocalSource
 from modules.pdf_parser import PDFParser
 from modules.extractor import Extractor
 from modules.writer import Writer
+from modules.fanout_writer import FanoutWriter
 from modules.indexer import Indexer
 from modules.notifier import Notifier
 from modules.processed_store import ProcessedStore
+from modules.validator import RecordValidator
+from modules.throttle import throttle_metrics
+from modules import cassette, profiler
+from modules.profiler import Profiler
+from modules.scheduler import Scheduler
+from modules.deadlines import Deadline, WorkerPool, call_with_timeout
+from modules.llm_budget import BudgetExceeded
 
 class ProcessingChain:
     """
@@ -17,20 +31,93 @@ class ProcessingChain:
     """
     def __init__(self, config: Dict):
         self.config = config
-        # Initialize components
-        self.watcher   = DriveWatcher(config.get('drive', {}))
-        self.parser    = PDFParser(config.get('ocr', {}))
-        self.extractor = Extractor(config.get('lenders', []), config.get('llm', {}))
-        self.writer    = Writer(config.get('output', {}))
+        # Initialize components: Drive by default, or a local directory/archive
+        source_cfg = config.get('source', {}) or {}
+        if source_cfg.get('type') == 'local':
+            self.watcher = LocalSource(source_cfg)
+        else:
+            self.watcher = DriveWatcher(config.get('drive', {}))
+        # Text backend, optionally picked per document/lender (parser.backend)
+        parser_cfg = config.get('parser', {}) or {}
+        self.parser    = PDFParser(config.get('ocr', {}), parser_cfg)
+        # Stream pages into the extractor and stop once all fields are found
+        self.streaming = bool(parser_cfg.get('streaming', False))
+        self.extractor = Extractor(config.get('lenders', []), config.get('llm', {}), config.get('regex', {}))
+        # One destination, or several fed through a write-ahead log (type: fanout)
+        output_cfg = config.get('output', {}) or {}
+        if output_cfg.get('type') == 'fanout':
+            self.writer = FanoutWriter(output_cfg)
+        else:
+            self.writer = Writer(output_cfg)
+        # Written files are marked processed only at a durable checkpoint of
+        # the destination, taken every checkpoint_every files or checkpoint_s
+        # seconds (whichever comes first) and at the end of the run
+        self.checkpoint_every = max(1, int(output_cfg.get('checkpoint_every', 500) or 1))
+        self.checkpoint_s = float(output_cfg.get('checkpoint_s', 60) or 0)
+        self._checkpointed_at = time.monotonic()
+        # Optional validation stage turning records into StatementRecord
+        validation_cfg = config.get('validation', {}) or {}
+        if validation_cfg.get('enabled'):
+            self.validator = RecordValidator(validation_cfg)
+        else:
+            self.validator = None
         # Semantic indexer
         index_cfg = config.get('index', {}) or {}
         persist_path = index_cfg.get('persist_path')
-        self.indexer  = Indexer(persist_path=persist_path)
+        self.indexer  = Indexer(
+            persist_path=persist_path,
+            search_config=index_cfg.get('search'),
+            schema=getattr(self.extractor, 'schema', None),
+        )
         # Notifier for review queue
         notifier_cfg = config.get('notifier')
 
         store_cfg = config.get('store', {}) or {}
-        self.store = ProcessedStore(store_path=store_cfg.get('persist_path'))
+        # Saved once per writer checkpoint rather than per file
+        self.store = ProcessedStore(store_path=store_cfg.get('persist_path'), autoflush=False)
+        self._in_flight: Dict[str, str] = {}
+        self._waiting: Dict[str, List[Dict]] = {}
+        self._unflushed: List[Dict] = []
+
+        # Parallel fetch/parse/extract workers; 'process' runs parsing in
+        # worker processes so CPU-bound backfills use every core
+        processing_cfg = config.get('processing', {}) or {}
+        self.workers = max(1, int(processing_cfg.get('workers', 1) or 1))
+        self.executor = processing_cfg.get('executor', 'thread')
+        self._cpu_pool = None
+        # Time budgets (download_s, parse_s, file_s); with parse_s or file_s
+        # set, parsing runs on a pool of long-lived worker processes (one
+        # per worker) and a worker that runs over is killed and replaced
+        self._parse_pool = None
+        timeouts = processing_cfg.get('timeouts', {}) or {}
+        self.timeouts = {k: float(v) for k, v in timeouts.items() if v}
+        # parser.max_memory_mb measures process RSS, which only bounds one
+        # document when each process parses one document at a time
+        isolated = self.executor == 'process' or 'parse_s' in self.timeouts or 'file_s' in self.timeouts
+        if getattr(self.parser, 'max_memory', 0) and self.workers > 1 and not isolated:
+            raise ValueError(
+                "parser.max_memory_mb with processing.workers > 1 needs processing.executor: process "
+                "(or a parse_s/file_s timeout): threads share one process's memory"
+            )
+        # Workers keep LLM usage in the budget's SQLite file; an in-memory
+        # ledger would be a fresh, empty one in every worker process
+        pooled = 'parse_s' in self.timeouts or 'file_s' in self.timeouts or (
+            self.workers > 1 and self.executor == 'process')
+        budget = getattr(self.extractor, 'budget', None)
+        if pooled and budget is not None and not getattr(budget, 'persist_path', None):
+            raise ValueError(
+                "llm.budget.persist_path must be set when parsing runs in worker processes "
+                "(processing.timeouts parse_s/file_s or executor: process)"
+            )
+        # Failed attempts before a file is quarantined in the store
+        self.max_failures = int(processing_cfg.get('max_failures', 3) or 3)
+
+        # Processing order (fifo/newest/smallest/deadline/aging) and queue waits
+        self.scheduler = Scheduler(config.get('scheduling', {}) or {})
+
+        # Optional per-document profiling (stage timings + stack samples)
+        self.profiler = Profiler(config.get('profiling', {}) or {})
+        self._profiles: Dict[str, profiler.DocumentProfile] = {}
 
         try:
             if notifier_cfg:
@@ -44,29 +131,436 @@ class ProcessingChain:
         return self._call(inputs)
 
     def _call(self, inputs: Dict) -> Dict:
-        new_files = self.watcher.list_new_pdfs()
-        
-        for meta in new_files:
+        iter_files = getattr(self.watcher, 'iter_new_pdfs', None)
+        new_files = iter_files() if iter_files else self.watcher.list_new_pdfs()
+        counts = {'listed': 0, 'duplicates': 0, 'quarantined': 0, 'deferred': 0}
+        failures: List[Dict] = []
+        pending = []
+        self.scheduler.reset()
+        budget = getattr(self.extractor, 'budget', None)
+        if budget:
+            budget.new_run()
+        # checksum -> file ID for files handled earlier in this run
+        self._in_flight = {}
+        # file ID -> duplicates waiting for that file to be written
+        self._waiting = {}
+        self._checkpointed_at = time.monotonic()
+
+        # Workers start without this process's patches: install the active
+        # cassette in each of them so their LLM calls are recorded/replayed
+        tape = cassette.active()
+        init, init_args = (cassette.install_worker, (tape.config,)) if tape else (None, ())
+        if self.timeouts.get('parse_s') or self.timeouts.get('file_s'):
+            self._parse_pool = WorkerPool(self.workers, initializer=init, initargs=init_args)
+        elif self.workers > 1 and self.executor == 'process':
+            # Never fork this process: its threads may hold locks
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self._cpu_pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context(method),
+                initializer=init, initargs=init_args,
+            )
+        try:
+            queue = self.scheduler.order(self._candidates(new_files, counts))
+            for meta, record, error in self._extract_all(queue):
+                # One bad file is counted (and eventually quarantined), never fatal
+                if error:
+                    self._fail(meta, error, failures)
+                    continue
+                # Over the LLM budget: left unprocessed for a later run
+                if record.get('budget_deferred'):
+                    counts['deferred'] += 1
+                    logging.info(f"Deferred {meta.get('name', meta['id'])}: {record['budget_deferred']}")
+                    self._waiting.pop(meta['id'], None)
+                    self._profiles.pop(meta['id'], None)
+                    continue
+                # If missing mandatory fields, notify and skip
+                if record.get('needs_review'):
+                    self._notify(record)
+                    self._finish_profile(meta)
+                    if record.get('degraded'):
+                        # Cut short by the parser caps, it would be cut short
+                        # again: once in the review queue it is handled, and
+                        # marked processed with the next checkpoint
+                        self._unflushed.append(meta)
+                        self._commit(failures)
+                    continue
+                # Identify the source statement on every path: upsert is
+                # keyed on these fields
+                record.setdefault('StatementFileName', meta.get('name', ''))
+                record.setdefault('LinkToStatement', self._statement_link(meta))
+                if self.validator:
+                    pending.append((meta, record))
+                    if len(pending) >= self.validator.batch_size:
+                        self._flush_batch(pending, failures)
+                        pending = []
+                    continue
+                self._write(meta, record, failures)
+                self._commit(failures)
+        finally:
+            if self._cpu_pool:
+                self._cpu_pool.shutdown()
+                self._cpu_pool = None
+            if self._parse_pool:
+                self._parse_pool.shutdown()
+                self._parse_pool = None
+
+        if pending:
+            self._flush_batch(pending, failures)
+        self._commit(failures, force=True)
+        # Failures and duplicate links since the last checkpoint
+        self.store.flush()
+
+        close = getattr(self.writer, 'close', None)
+        if close:
+            close()
+        # Embed and persist records the indexer is still batching
+        flush_index = getattr(self.indexer, 'flush', None)
+        if flush_index:
+            flush_index()
+
+        throttles = throttle_metrics()
+        for metric in throttles:
+            logging.info(f"Throttle {metric['destination']}: rate={metric['rate']}/s "
+                         f"rate_limited={metric['rate_limited']} waited={metric['waited_s']}s")
+        queue_report = self.scheduler.report()
+        logging.info(f"Queue ({queue_report['policy']}): {queue_report['files']} file(s), "
+                     f"p50 wait={queue_report['p50_wait_s']}s p95 wait={queue_report['p95_wait_s']}s "
+                     f"max wait={queue_report['max_wait_s']}s")
+        result = {
+            'processed': counts['listed'],
+            'duplicates': counts['duplicates'],
+            'throttle': throttles,
+            'queue': queue_report,
+            'failed': failures,
+            'quarantined': sorted(self.store.quarantined()),
+            'deferred': counts['deferred'],
+        }
+        sink_status = getattr(self.writer, 'status', None)
+        if sink_status:
+            result['sinks'] = sink_status()
+            for name, sink in result['sinks'].items():
+                if sink['behind'] or sink['error']:
+                    logging.warning(f"Sink {name} is {sink['behind']} record(s) behind: {sink['error']}")
+        if budget:
+            result['llm_usage'] = budget.report()
+            run_usage = result['llm_usage']['run']
+            logging.info(f"LLM usage: {run_usage['calls']} call(s), {run_usage['tokens']} tokens, "
+                         f"${run_usage['cost_usd']:.4f}; deferred {counts['deferred']} file(s) over budget")
+            cache = result['llm_usage']['prompt_cache']
+            if cache['calls']:
+                logging.info(f"Prompt cache: {cache['cached_share']:.0%} of prompt tokens cached, "
+                             f"latency {cache['latency_s_cached']}s cached vs {cache['latency_s_uncached']}s uncached")
+        if counts['quarantined']:
+            logging.info(f"Skipped {counts['quarantined']} quarantined file(s)")
+        report_dir = self.profiler.write_report()
+        if report_dir:
+            logging.info(f"Profile of {self.profiler.documents} document(s) written to {report_dir}")
+            result['profile'] = report_dir
+        return result
+
+    def _candidates(self, files: Iterable[Dict], counts: Dict) -> Iterator[Dict]:
+        """
+        Filter a (possibly lazy) listing down to files that need processing.
+        """
+        for meta in files:
+            counts['listed'] += 1
             if self.store.has_processed(meta['id']):
                 continue
-            pdf_bytes = self.watcher.download_file(meta['id'])
-            text      = self.parser.extract_text(pdf_bytes)
-            record    = self.extractor.extract(text)
-            # If missing mandatory fields, notify and skip
-            if record.get('needs_review'):
-                if getattr(self, 'notifier', None):
-                    try:
-                        self.notifier.notify(record)
-                    except Exception:
-                        pass
+            if self.store.is_quarantined(meta['id']):
+                counts['quarantined'] += 1
+                continue
+            if self._link_duplicate(meta):
+                counts['duplicates'] += 1
                 continue
-            # Otherwise write to destination and index
-            self.writer.append_record(record)
+            yield meta
+
+    def _extract_all(self, metas: Iterable[Dict]) -> Iterator[Tuple[Dict, Optional[Dict], Optional[str]]]:
+        """
+        Fetch, parse and extract each file, yielding results in input order.
+
+        With more than one worker, files are processed on a thread pool with
+        a bounded look-ahead, so lazy listings are never fully materialized.
+
+        Yields:
+            (meta, record, None) on success, (meta, None, error) on failure.
+        """
+        if self.workers == 1:
+            for meta in metas:
+                yield (meta, *self._try_extract(meta))
+            return
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            window = deque()
+            for meta in metas:
+                window.append((meta, pool.submit(self._try_extract, meta)))
+                if len(window) >= self.workers * 2:
+                    done_meta, future = window.popleft()
+                    yield (done_meta, *future.result())
+            while window:
+                done_meta, future = window.popleft()
+                yield (done_meta, *future.result())
+
+    def _try_extract(self, meta: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+        try:
+            return self._extract_file(meta), None
+        except BudgetExceeded as e:
+            return {'budget_deferred': str(e)}, None
+        except Exception as e:
+            return None, f"{type(e).__name__}: {e}"
+
+    def _extract_file(self, meta: Dict) -> Dict:
+        """
+        Download one file and run it through the parser and extractor.
+        """
+        self.scheduler.started(meta)
+        deadline = Deadline(self.timeouts.get('file_s'))
+        with self.profiler.document(meta['id'], meta.get('name', '')) as prof:
+            with profiler.stage('download'):
+                pdf_bytes = call_with_timeout(
+                    'download', deadline.budget(self.timeouts.get('download_s')),
+                    self.watcher.download_file, meta['id'],
+                )
+            parse_timeout = deadline.budget(self.timeouts.get('parse_s'))
+            args = (self.parser, self.extractor, self.streaming, pdf_bytes)
+            if self._parse_pool or self._cpu_pool:
+                # Stage timings and usage counters are collected in the
+                # worker and sent back
+                if self._parse_pool:
+                    result = self._parse_pool.run('parse', parse_timeout, profiled_parse_and_extract, *args)
+                else:
+                    result = self._cpu_pool.submit(profiled_parse_and_extract, *args).result()
+                record, stages, counters, usage = result
+                if prof:
+                    prof.merge(stages, counters)
+                self._merge_usage(usage)
+            else:
+                record = parse_and_extract(*args)
+        if prof:
+            self._profiles[meta['id']] = prof
+        return record
+
+    def _merge_usage(self, usage: Dict[Tuple[str, str], Counter]) -> None:
+        """
+        Add usage counters a worker process gathered on its copy of the
+        parser and extractor to the ones in this process.
+        """
+        owners = {'parser': self.parser, 'extractor': self.extractor}
+        for (owner, name), delta in usage.items():
+            counter = getattr(owners[owner], name, None)
+            if isinstance(counter, Counter):
+                counter.update(delta)
+
+    def _fail(self, meta: Dict, error: str, failures: List[Dict]) -> None:
+        """
+        Count a failed file and quarantine it once it has failed
+        max_failures times. Copies waiting on it are left for the next run.
+        """
+        name = meta.get('name', meta['id'])
+        quarantined = self.store.record_failure(meta['id'], error, self.max_failures)
+        self._waiting.pop(meta['id'], None)
+        self._profiles.pop(meta['id'], None)
+        if quarantined:
+            count = self.store.quarantined()[meta['id']]['failures']
+            logging.error(f"Quarantined {name} after {count} failure(s): {error}")
+            self._notify({'StatementFileName': name, 'needs_review': True, 'quarantined': True, 'error': error})
+        else:
+            count = self.store.failure_count(meta['id'])
+            logging.warning(f"Failed to process {name} (attempt {count}/{self.max_failures}): {error}")
+        failures.append({
+            'id': meta['id'],
+            'name': name,
+            'error': error,
+            'failures': count,
+            'quarantined': quarantined,
+        })
+
+    def _finish_profile(self, meta: Dict) -> None:
+        self.profiler.finish(self._profiles.pop(meta['id'], None))
+
+    def _link_duplicate(self, meta: Dict) -> bool:
+        """
+        Skip the download of a file whose content is already known.
+
+        Files with a checksum already in the store are linked to the earlier
+        result straight away. Copies of a file seen earlier in this run are
+        linked once that file has been written.
+
+        Returns:
+            True if the file is a duplicate and must not be downloaded.
+        """
+        checksum = meta.get('md5Checksum')
+        if not checksum:
+            return False
+        original = self.store.find_by_checksum(checksum)
+        if original:
+            logging.info(f"Skipping {meta.get('name', meta['id'])}: same content as {original}")
+            self.store.link_duplicate(meta['id'], original)
+            return True
+        first = self._in_flight.setdefault(checksum, meta['id'])
+        if first != meta['id']:
+            self._waiting.setdefault(first, []).append(meta)
+            return True
+        return False
+
+    def _flush_batch(self, pending: List[Tuple[Dict, Dict]], failures: List[Dict]) -> None:
+        """
+        Validate a batch of records and write the typed ones.
+
+        Records failing validation are routed to the review queue and left
+        unmarked so they are picked up again on the next run.
+        """
+        valid, invalid = self.validator.validate_batch([rec for _, rec in pending])
+        for idx, statement in valid:
+            meta, _ = pending[idx]
+            self._write(meta, statement.model_dump(mode='json'), failures)
+        for idx, error in invalid:
+            meta, record = pending[idx]
+            logging.warning(f"Record for {meta.get('name', meta['id'])} failed validation: {error}")
+            self._notify(dict(record, needs_review=True, validation_error=error))
+            self._finish_profile(meta)
+        self._commit(failures)
+
+    def _write(self, meta: Dict, record: Dict, failures: List[Dict]) -> None:
+        """
+        Write a record to the destination and index it.
+
+        The file is marked processed by the next checkpoint (_commit()), once
+        the writer has made the record durable. A failed write counts as a
+        failure of that file, not of the run.
+        """
+        with profiler.activate(self._profiles.get(meta['id'])):
+            try:
+                with profiler.stage('write'):
+                    self.writer.append_record(record)
+            except Exception as e:
+                self._fail(meta, f"write failed: {type(e).__name__}: {e}", failures)
+                return
             try:
-                self.indexer.add_record(record)
+                with profiler.stage('index'):
+                    self.indexer.add_record(record)
             except Exception:
                 pass
+        self._unflushed.append(meta)
+        self._finish_profile(meta)
+
+    def _commit(self, failures: List[Dict], force: bool = False) -> None:
+        """
+        Checkpoint the writer, then mark the written files (and degraded
+        files sent to review) processed.
+
+        Checkpoints are taken every checkpoint_every written files or
+        checkpoint_s seconds rather than per file: each one commits a SQLite
+        transaction or finishes a Parquet part file. A crash before the next
+        checkpoint leaves the files since the last one unmarked, so they are
+        written again on the next run. If the checkpoint fails, every file
+        it covered is counted as failed and left unmarked.
+
+        Args:
+            failures: Run failure list the failed files are added to.
+            force: Checkpoint regardless of the cadence (end of run).
+        """
+        if not self._unflushed:
+            return
+        due = (
+            len(self._unflushed) >= self.checkpoint_every
+            or (self.checkpoint_s and time.monotonic() - self._checkpointed_at >= self.checkpoint_s)
+        )
+        if not (force or due):
+            return
+        checkpoint = getattr(self.writer, 'checkpoint', None) or getattr(self.writer, 'flush', None)
+        self._checkpointed_at = time.monotonic()
+        if checkpoint:
+            try:
+                checkpoint()
+            except Exception as e:
+                error = f"write failed: {type(e).__name__}: {e}"
+                for meta in self._unflushed:
+                    self._fail(meta, error, failures)
+                self._unflushed = []
+                return
+        for meta in self._unflushed:
+            self.store.mark_processed(meta['id'], checksum=meta.get('md5Checksum'))
+            for dup in self._waiting.pop(meta['id'], []):
+                logging.info(f"Linking {dup.get('name', dup['id'])} to {meta['id']} (same content)")
+                self.store.link_duplicate(dup['id'], meta['id'])
+        self._unflushed = []
+        self.store.flush()
+
+    def _notify(self, record: Dict) -> None:
+        """
+        Send a record to the review queue, ignoring notifier failures.
+        """
+        if getattr(self, 'notifier', None):
+            try:
+                self.notifier.notify(record)
+            except Exception:
+                pass
+
+    @staticmethod
+    def _statement_link(meta: Dict) -> str:
+        """
+        Link to the source statement, defaulting to the Drive viewer URL.
+        """
+        return meta.get('webViewLink') or f"https://drive.google.com/file/d/{meta['id']}/view"
+
+
+def parse_and_extract(parser, extractor, streaming: bool, pdf_bytes: bytes) -> Dict:
+    """
+    Parse PDF bytes and extract a record. Module-level so it can run in a
+    worker process.
+    """
+    # A document cut short by the page/memory caps goes to review without
+    # an LLM call on its partial text
+    if getattr(parser, 'adaptive', False):
+        # Backend choice needs the whole text to score, so no early stop
+        text, degraded = parser.read_best(pdf_bytes, extractor.score_text)
+        record = extractor.extract(text, llm=not degraded)
+    elif streaming or getattr(parser, 'memory_bounded', False):
+        # Caps need the page stream so an over-cap document can be flagged
+        pages = parser.iter_pages(pdf_bytes)
+        record = extractor.extract_pages(pages)
+        degraded = getattr(pages, 'degraded', None)
+    else:
+        return extractor.extract(parser.extract_text(pdf_bytes))
+    if degraded:
+        record.update(needs_review=True, degraded=degraded)
+    return record
+
+
+def profiled_parse_and_extract(parser, extractor, streaming: bool, pdf_bytes: bytes) -> Tuple:
+    """
+    parse_and_extract under a fresh DocumentProfile, for worker processes.
+
+    Counters the parser and extractor keep (backend, tier and page-route
+    usage, regex timeouts) are updated on the worker's copies, so their
+    increments are returned for the caller to merge.
+
+    Returns:
+        (record, stage timings, profile counters, usage counter increments)
+    """
+    before = _usage(parser, extractor)
+    prof = profiler.DocumentProfile('worker')
+    with profiler.activate(prof):
+        record = parse_and_extract(parser, extractor, streaming, pdf_bytes)
+    after = _usage(parser, extractor)
+    usage = {key: after[key] - before.get(key, Counter()) for key in after}
+    return record, prof.stages, prof.counters, {key: delta for key, delta in usage.items() if delta}
+
+
+# Usage counters on the parser and extractor, as (owner, attribute)
+_USAGE_COUNTERS = (
+    ('parser', 'backend_usage'),
+    ('parser', 'page_routes'),
+    ('extractor', 'tier_usage'),
+    ('extractor', 'regex_timeouts'),
+)
 
-            self.store.mark_processed(meta['id'])
 
-        return {'processed': len(new_files)}
+def _usage(parser, extractor) -> Dict[Tuple[str, str], Counter]:
+    owners = {'parser': parser, 'extractor': extractor}
+    snapshot = {}
+    for owner, name in _USAGE_COUNTERS:
+        counter = getattr(owners[owner], name, None)
+        if isinstance(counter, Counter):
+            snapshot[(owner, name)] = Counter(counter)
+    return snapshot
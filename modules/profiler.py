@@ -0,0 +1,277 @@
+# modules/profiler.py
+"""
+Low-overhead profiling of document processing.
+
+A sampled fraction of documents is timed per stage (download, pdfplumber
+pages, regex, LLM wait, write) and, while they are processed, their threads'
+stacks are sampled into collapsed-stack counts ready for flamegraph.pl or
+speedscope. Modules mark stages with `stage(name)`, which is a no-op for
+documents that are not being profiled.
+
+When parsing runs in worker processes (processing.timeouts parse_s/file_s or
+executor: process) only the stage timings and counters come back from the
+worker: the stack sampler sees this process's thread waiting on the worker,
+and cProfile mode sees the same wait, so flamegraphs cover download, write
+and index but not parsing or extraction.
+"""
+import cProfile
+import heapq
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, List, Optional
+
+_local = threading.local()
+
+
+class DocumentProfile:
+    """
+    Per-document stage timings and counters.
+    """
+    def __init__(self, file_id: str, name: str = ""):
+        self.file_id = file_id
+        self.name = name
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.total = 0.0
+        self.closed = False
+
+    def add(self, stage_name: str, seconds: float) -> None:
+        self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+        if self.closed:
+            # Stage ran after the document block, e.g. a batched write
+            self.total += seconds
+
+    def count(self, counter: str, n: int = 1) -> None:
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def merge(self, stages: Dict[str, float], counters: Dict[str, int]) -> None:
+        for k, v in stages.items():
+            self.add(k, v)
+        for k, v in counters.items():
+            self.count(k, v)
+
+    def as_dict(self) -> Dict:
+        return {
+            'file_id': self.file_id,
+            'name': self.name,
+            'total_s': round(self.total, 4),
+            'stages_s': {k: round(v, 4) for k, v in sorted(self.stages.items(), key=lambda kv: -kv[1])},
+            'counters': dict(self.counters),
+        }
+
+
+def current() -> Optional[DocumentProfile]:
+    """
+    The profile active on this thread, if any.
+    """
+    return getattr(_local, 'profile', None)
+
+
+@contextmanager
+def activate(profile: Optional[DocumentProfile]) -> Iterator[Optional[DocumentProfile]]:
+    """
+    Make `profile` the active profile for stage() calls on this thread.
+    """
+    previous = current()
+    _local.profile = profile
+    try:
+        yield profile
+    finally:
+        _local.profile = previous
+
+
+@contextmanager
+def _timed(profile: DocumentProfile, stage_name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(stage_name, time.perf_counter() - start)
+
+
+def stage(stage_name: str):
+    """
+    Time a block under `stage_name` for the active document, if profiled.
+    """
+    profile = current()
+    if profile is None:
+        return nullcontext()
+    return _timed(profile, stage_name)
+
+
+def count(counter: str, n: int = 1) -> None:
+    """
+    Increment a counter (e.g. pages parsed) for the active document, if profiled.
+    """
+    profile = current()
+    if profile is not None:
+        profile.count(counter, n)
+
+
+class _StackSampler:
+    """
+    Background thread sampling the stacks of registered threads.
+    """
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._threads: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, thread_id: int) -> None:
+        with self._lock:
+            self._threads[thread_id] = self._threads.get(thread_id, 0) + 1
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+
+    def unregister(self, thread_id: int) -> None:
+        with self._lock:
+            remaining = self._threads.get(thread_id, 0) - 1
+            if remaining > 0:
+                self._threads[thread_id] = remaining
+            else:
+                self._threads.pop(thread_id, None)
+
+    def stop(self) -> None:
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                targets = list(self._threads)
+            if not targets:
+                continue
+            frames = sys._current_frames()
+            for tid in targets:
+                frame = frames.get(tid)
+                if frame is not None:
+                    self.stacks[_collapse(frame)] += 1
+
+
+def _collapse(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class Profiler:
+    def __init__(self, config: Dict):
+        """
+        Initialize the profiler.
+
+        Args:
+            config: Dict containing:
+                - enabled: Turn profiling on (default False).
+                - sample_rate: Fraction of documents to profile (default 1.0).
+                - mode: 'sample' (stack sampling, default) or 'cprofile'.
+                - interval_ms: Stack sampling interval (default 5).
+                - top_n: Number of slowest documents to report (default 20).
+                - output_dir: Where reports are written (default './profile').
+        """
+        self.enabled = bool(config.get('enabled', False))
+        self.sample_rate = float(config.get('sample_rate', 1.0))
+        self.mode = config.get('mode', 'sample')
+        self.top_n = int(config.get('top_n', 20))
+        self.output_dir = config.get('output_dir') or './profile'
+        self._sampler = _StackSampler(float(config.get('interval_ms', 5)) / 1000.0)
+        self._cprofile = cProfile.Profile() if self.mode == 'cprofile' else None
+        self._cprofile_lock = threading.Lock()
+        self._slowest: List = []
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.documents = 0
+
+    @contextmanager
+    def document(self, file_id: str, name: str = "") -> Iterator[Optional[DocumentProfile]]:
+        """
+        Profile one document's processing on the current thread.
+
+        Yields the DocumentProfile, or None if this document was not sampled.
+        Stages timed later under activate(profile) still count towards it;
+        call finish() once the document is fully handled.
+        """
+        if not self.enabled or random.random() >= self.sample_rate:
+            yield None
+            return
+        profile = DocumentProfile(file_id, name)
+        tid = threading.get_ident()
+        use_cprofile = self._cprofile is not None and self._cprofile_lock.acquire(blocking=False)
+        if use_cprofile:
+            self._cprofile.enable()
+        else:
+            self._sampler.register(tid)
+        start = time.perf_counter()
+        try:
+            with activate(profile):
+                yield profile
+        finally:
+            profile.total = time.perf_counter() - start
+            profile.closed = True
+            if use_cprofile:
+                self._cprofile.disable()
+                self._cprofile_lock.release()
+            else:
+                self._sampler.unregister(tid)
+
+    def finish(self, profile: Optional[DocumentProfile]) -> None:
+        """
+        Add a completed document to the slowest-documents report.
+        """
+        if profile is None:
+            return
+        with self._lock:
+            self.documents += 1
+            self._seq += 1
+            entry = (profile.total, self._seq, profile)
+            if len(self._slowest) < self.top_n:
+                heapq.heappush(self._slowest, entry)
+            elif entry[0] > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self) -> List[DocumentProfile]:
+        """
+        The N slowest profiled documents, slowest first.
+        """
+        with self._lock:
+            return [p for _, _, p in sorted(self._slowest, key=lambda e: -e[0])]
+
+    def write_report(self) -> Optional[str]:
+        """
+        Write collapsed stacks (or pstats), and the slowest-documents report.
+
+        Returns:
+            The report directory, or None if profiling is disabled.
+        """
+        if not self.enabled:
+            return None
+        self._sampler.stop()
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(os.path.join(self.output_dir, 'profile.pstats'))
+        with open(os.path.join(self.output_dir, 'stacks.collapsed'), 'w', encoding='utf-8') as f:
+            for stack, n in self._sampler.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        report = {
+            'documents_profiled': self.documents,
+            'sample_rate': self.sample_rate,
+            'slowest': [p.as_dict() for p in self.slowest()],
+        }
+        with open(os.path.join(self.output_dir, 'slowest.json'), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        return self.output_dir
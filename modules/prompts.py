@@ -0,0 +1,135 @@
+# modules/prompts.py
+"""
+Build LLM extraction prompts laid out for provider-side prefix caching.
+
+OpenAI caches the longest previously seen prompt prefix (from 1024 tokens,
+in 128-token steps) and bills and serves it faster. The old prompt put the
+requested field list first and the statement in the middle of one
+message, so no two documents shared a prefix. Here everything stable
+comes first, in an order that never changes between documents:
+
+1. the response schema, covering every lender field (OpenAI places it
+   ahead of the messages);
+2. a per-lender system message with the instructions and field guide;
+3. that lender's few-shot examples as user/assistant turns;
+
+and only then the variable part: the fields still missing and the
+statement text. Documents of one lender therefore share everything up to
+the last message, and lenders share the schema and instructions.
+"""
+import json
+from datetime import date
+from typing import Dict, List, Optional
+
+from modules.models import field_type
+
+LAYOUTS = ('cached', 'inline')
+# Shortest prompt prefix OpenAI caches
+CACHE_MIN_TOKENS = 1024
+
+INSTRUCTIONS = (
+    "You extract fields from mortgage statements into a JSON object.\n"
+    "Rules:\n"
+    "- Copy each value exactly as printed in the statement; do not compute, "
+    "convert or reformat amounts, rates or dates.\n"
+    "- Amounts: the number with its currency sign, commas and decimals as printed.\n"
+    "- Dates: as printed (e.g. 01/15/2025).\n"
+    "- Interest rates: the number as printed, with or without the % sign.\n"
+    "- Addresses: the full property address on one line.\n"
+    "- Only fill the fields listed in the request; use null for every other "
+    "field and for any field the statement does not contain.\n"
+    "- Never guess. A value that is not in the text is null.\n"
+    "- Reply with the JSON object only."
+)
+
+_KIND_HINTS = {
+    date: "date",
+    float: "amount or number",
+    str: "text",
+}
+
+
+class PromptBuilder:
+    def __init__(self, lenders_config: List[Dict], config: Optional[Dict] = None):
+        """
+        Initialize the per-lender prompt prefixes.
+
+        Args:
+            lenders_config: List of lenders with 'name' and 'regex_patterns';
+                an optional 'examples' list ({'text': ..., 'output': {...}})
+                gives that lender's few-shot examples.
+            config: Optional dict ('llm.prompt' section) containing:
+                - layout: 'cached' (default) or 'inline' (the previous
+                  single-message prompt with a per-call schema).
+                - instructions: Replacement for the built-in instructions.
+                - examples: Few-shot examples used for every lender.
+                - cache_key: Send a per-lender prompt_cache_key so requests
+                  sharing a prefix are routed to the same cache (default False).
+        """
+        config = config or {}
+        self.layout = config.get('layout', 'cached')
+        if self.layout not in LAYOUTS:
+            raise ValueError(f"Unknown llm.prompt.layout: {self.layout!r} (choose from {', '.join(LAYOUTS)})")
+        self.instructions = config.get('instructions') or INSTRUCTIONS
+        self.cache_key = bool(config.get('cache_key', False))
+        self.fields: List[str] = []
+        for lender in lenders_config:
+            for field in (lender.get('regex_patterns') or {}).keys():
+                if field not in self.fields:
+                    self.fields.append(field)
+        shared_examples = config.get('examples') or []
+        self._lenders = {
+            lender.get('name'): list(lender.get('examples') or []) + list(shared_examples)
+            for lender in lenders_config
+        }
+        self._shared_examples = list(shared_examples)
+        self._prefixes: Dict[Optional[str], List[Dict]] = {}
+
+    def prefix(self, lender: Optional[str]) -> List[Dict]:
+        """
+        The stable leading messages for a lender (built once, then reused
+        verbatim so every request starts with identical tokens).
+        """
+        if lender not in self._prefixes:
+            guide = "\n".join(f"- {f}: {_KIND_HINTS[field_type(f)]}" for f in self.fields)
+            system = self.instructions + "\n\nFields:\n" + guide
+            if lender:
+                system += f"\n\nThese statements are issued by {lender}."
+            messages = [{"role": "system", "content": system}]
+            examples = self._lenders.get(lender, self._shared_examples)
+            for example in examples:
+                output = {f: (example.get('output') or {}).get(f) for f in self.fields}
+                messages.append({"role": "user", "content": self._request(self.fields, example.get('text', ''))})
+                messages.append({"role": "assistant", "content": json.dumps(output)})
+            self._prefixes[lender] = messages
+        return self._prefixes[lender]
+
+    def build(self, text: str, fields: List[str], lender: Optional[str] = None) -> Dict:
+        """
+        Request arguments for extracting `fields` from `text`.
+
+        Returns:
+            Dict with 'messages' and 'schema_fields' (the fields the response
+            schema must cover), plus 'prompt_cache_key' when enabled.
+        """
+        if self.layout == 'inline':
+            prompt = (
+                "Extract the following fields from this mortgage statement as a JSON object: "
+                + ", ".join(fields)
+                + ". Use null for fields that are not in the statement."
+                + "\n\nText:\n" + text + "\n\nJSON:"
+            )
+            return {'messages': [{"role": "user", "content": prompt}], 'schema_fields': list(fields)}
+        # Fields outside the lender schema (rare) widen it for this call only
+        schema_fields = self.fields + [f for f in fields if f not in self.fields]
+        request = {
+            'messages': self.prefix(lender) + [{"role": "user", "content": self._request(fields, text)}],
+            'schema_fields': schema_fields,
+        }
+        if self.cache_key:
+            request['prompt_cache_key'] = f"statement-extract:{lender or 'any'}"
+        return request
+
+    @staticmethod
+    def _request(fields: List[str], text: str) -> str:
+        return "Fields to fill: " + ", ".join(fields) + "\n\nStatement:\n" + text
@@ -0,0 +1,301 @@
+# modules/records.py
+"""
+Compact in-memory records with a fixed field schema.
+
+A plain dict per record costs a hash table plus a boxed object for every
+value; with millions of records held for batching, search and analytics
+that dominates memory. A RecordSchema lists the fields once (the
+StatementRecord fields plus every field a lender pattern extracts) and
+offers two compact representations:
+
+- schema.record_class(): a `__slots__` class, one instance per record,
+  for code that handles records one at a time.
+- RecordBatch: column storage for many records. Amounts are packed into
+  `array('d')`, dates into `array('l')` as day ordinals, and text columns
+  share one copy of each distinct string.
+
+Both convert back to dicts, StatementRecord objects and writer rows.
+Values that do not fit their column (raw extractor strings in a number
+column, None, keys outside the schema) are kept as-is on the side, so a
+round trip through either representation returns the original dict.
+"""
+import keyword
+import math
+from array import array
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from modules.models import StatementRecord, field_type
+
+_MISSING = object()
+# Date column codes: 0 = no value in the column, n > 0 = date.fromordinal(n),
+# n < 0 = the ISO string of date.fromordinal(-n) (JSON-mode records)
+_NO_DATE = 0
+
+
+class RecordSchema:
+    def __init__(self, fields: Iterable[str]):
+        """
+        Fixed, ordered field list with each field's scalar type.
+
+        Args:
+            fields: Field names; duplicates are dropped, first one wins.
+        """
+        self.fields: Tuple[str, ...] = tuple(dict.fromkeys(fields))
+        self.types: Dict[str, type] = {f: field_type(f) for f in self.fields}
+        # Fields that can be slots; others live in CompactRecord._extra
+        self.slots: Tuple[str, ...] = tuple(
+            f for f in self.fields
+            if f.isidentifier() and not keyword.iskeyword(f) and not hasattr(CompactRecord, f)
+        )
+        self._record_class = None
+
+    @classmethod
+    def from_lenders(cls, lenders_config: List[Dict]) -> 'RecordSchema':
+        """
+        Schema of the StatementRecord fields plus every lender pattern field.
+        """
+        fields = list(StatementRecord.model_fields)
+        for lender in lenders_config or []:
+            fields.extend((lender.get('regex_patterns') or {}).keys())
+        return cls(fields)
+
+    def record_class(self) -> type:
+        """
+        `__slots__` record class for this schema (built once).
+        """
+        if self._record_class is None:
+            self._record_class = type(
+                'CompactRecord', (CompactRecord,),
+                {'__slots__': self.slots, 'schema': self, '_slot_set': frozenset(self.slots)},
+            )
+        return self._record_class
+
+    def record(self, values: Dict) -> 'CompactRecord':
+        """
+        Compact copy of a record dict.
+        """
+        return self.record_class().from_dict(values)
+
+
+class CompactRecord:
+    """
+    One record as slots; keys outside the schema go to `_extra`. Supports
+    the read-only dict operations the pipeline uses (get, [], in, items).
+    """
+    __slots__ = ('_extra',)
+    schema: 'RecordSchema'
+    _slot_set: frozenset = frozenset()
+
+    @classmethod
+    def from_dict(cls, values: Dict) -> 'CompactRecord':
+        rec = cls()
+        extra = None
+        for key, value in values.items():
+            if key in cls._slot_set:
+                setattr(rec, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        rec._extra = extra
+        return rec
+
+    def items(self) -> Iterator[Tuple[str, object]]:
+        for field in self.schema.slots:
+            value = getattr(self, field, _MISSING)
+            if value is not _MISSING:
+                yield field, value
+        if self._extra:
+            yield from self._extra.items()
+
+    def keys(self) -> Iterator[str]:
+        return (k for k, _ in self.items())
+
+    def get(self, key: str, default=None):
+        if key in self._slot_set:
+            return getattr(self, key, default)
+        return (self._extra or {}).get(key, default)
+
+    def __getitem__(self, key: str):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (CompactRecord, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"CompactRecord({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict:
+        return dict(self.items())
+
+    def to_statement_record(self) -> StatementRecord:
+        return StatementRecord.model_validate(self.to_dict())
+
+    def to_row(self, headers: List[str]) -> List:
+        """
+        Writer row: values in header order, '' where missing.
+        """
+        return [self.get(col, '') for col in headers]
+
+
+class RecordBatch:
+    def __init__(self, schema: RecordSchema, records: Iterable[Dict] = ()):
+        """
+        Column storage for many records of one schema.
+
+        Args:
+            schema: Field schema; float and date fields get packed columns.
+            records: Initial records (dicts or CompactRecords).
+        """
+        self.schema = schema
+        self._columns: Dict[str, object] = {}
+        for field, typ in schema.types.items():
+            if typ is float:
+                self._columns[field] = array('d')
+            elif typ is date:
+                self._columns[field] = array('l')
+            else:
+                self._columns[field] = []
+        # (field, type, column) in schema order, for the per-record loops
+        self._layout = [(f, schema.types[f], self._columns[f]) for f in schema.fields]
+        # row -> {key: value} for values kept outside the columns
+        self._extra: Dict[int, Dict] = {}
+        # Each distinct key order is stored once; rows keep its number
+        self._orders: Dict[Tuple[str, ...], int] = {}
+        self._order_keys: List[Tuple[str, ...]] = []
+        self._row_order = array('I')
+        # Text column -> one copy of each distinct string, until the column
+        # turns out to be mostly unique (file names, links)
+        self._strings: Dict[str, Optional[Dict[str, str]]] = {
+            f: {} for f, typ in schema.types.items() if typ is str
+        }
+        self.extend(records)
+
+    def __len__(self) -> int:
+        return len(self._row_order)
+
+    def append(self, record: Dict) -> int:
+        """
+        Add a record.
+
+        Returns:
+            Its row number.
+        """
+        row = len(self._row_order)
+        extra = {}
+        for field, typ, column in self._layout:
+            value = record.get(field, _MISSING)
+            if typ is float:
+                packed = _pack_float(value)
+                column.append(math.nan if packed is None else packed)
+            elif typ is date:
+                packed = _pack_date(value)
+                column.append(_NO_DATE if packed is None else packed)
+            else:
+                packed = self._share(field, value) if type(value) is str else None
+                column.append(packed)
+            if packed is None and value is not _MISSING:
+                extra[field] = value
+        keys = tuple(record.keys())
+        for key in keys:
+            if key not in self.schema.types:
+                extra[key] = record[key]
+        if extra:
+            self._extra[row] = extra
+        order = self._orders.get(keys)
+        if order is None:
+            order = self._orders[keys] = len(self._order_keys)
+            self._order_keys.append(keys)
+        self._row_order.append(order)
+        return row
+
+    def _share(self, field: str, value: str) -> str:
+        seen = self._strings[field]
+        if seen is None:
+            return value
+        shared = seen.setdefault(value, value)
+        if len(seen) > 1024 and len(seen) * 2 > len(self._row_order):
+            # Mostly distinct values: the lookup table would cost more than it saves
+            self._strings[field] = None
+        return shared
+
+    def extend(self, records: Iterable[Dict]) -> None:
+        for record in records:
+            self.append(record)
+
+    def row(self, i: int) -> Dict:
+        """
+        Record i as a dict, with its original key order.
+        """
+        n = len(self._row_order)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(i)
+        extra = self._extra.get(i, {})
+        out = {}
+        for key in self._order_keys[self._row_order[i]]:
+            if key in extra:
+                out[key] = extra[key]
+                continue
+            typ = self.schema.types[key]
+            value = self._columns[key][i]
+            if typ is date:
+                value = date.fromordinal(value) if value > 0 else date.fromordinal(-value).isoformat()
+            out[key] = value
+        return out
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.row(j) for j in range(*i.indices(len(self)))]
+        return self.row(i)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def column(self, field: str):
+        """
+        Raw column for analytics: array('d') with NaN for missing amounts,
+        array('l') of date ordinals (negative for ISO strings, 0 missing),
+        or a list of strings. Values kept outside the column are absent.
+        """
+        return self._columns[field]
+
+    def to_statement_records(self) -> List[StatementRecord]:
+        return [StatementRecord.model_validate(r) for r in self]
+
+    def to_rows(self, headers: List[str]) -> List[List]:
+        """
+        Writer rows: values in header order, '' where missing.
+        """
+        return [[record.get(col, '') for col in headers] for record in self]
+
+
+def _pack_float(value) -> Optional[float]:
+    # Only floats: ints (and bools) would come back as floats, NaN as missing
+    if type(value) is float and not math.isnan(value):
+        return value
+    return None
+
+
+def _pack_date(value) -> Optional[int]:
+    if type(value) is date:
+        return value.toordinal()
+    if type(value) is str and len(value) == 10:
+        try:
+            parsed = date.fromisoformat(value)
+        except ValueError:
+            return None
+        if parsed.isoformat() == value:
+            return -parsed.toordinal()
+    return None
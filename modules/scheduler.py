@@ -0,0 +1,162 @@
+# modules/scheduler.py
+"""
+Order pending files before processing and track how long each one waits.
+
+Policies:
+    - fifo: listing order (default).
+    - newest: most recently modified first.
+    - smallest: smallest Drive `size` first, so one huge bundle does not
+      hold up many small statements.
+    - deadline: earliest SLA deadline first; a file's deadline is its
+      modifiedTime plus its tenant's SLA.
+    - aging: smallest first, but every minute a file has been waiting
+      counts as `aging_mb_per_minute` fewer megabytes, so large files are
+      not starved.
+"""
+import fnmatch
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+POLICIES = ('fifo', 'newest', 'smallest', 'deadline', 'aging')
+
+
+class Scheduler:
+    def __init__(self, config: Dict, clock: Callable[[], float] = time.time):
+        """
+        Initialize the scheduler.
+
+        Args:
+            config: Dict containing:
+                - policy: One of POLICIES (default 'fifo').
+                - window: Files buffered for reordering; 0 (default) reads
+                  the whole listing first. A window keeps huge listings lazy.
+                - default_sla_minutes: SLA for files matching no tenant
+                  (default 1440).
+                - tenants: List of {'name', 'pattern' (filename glob),
+                  'sla_minutes'} for the deadline policy.
+                - aging_mb_per_minute: Aging rate (default 1.0).
+        """
+        self.policy = config.get('policy', 'fifo')
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown scheduling policy: {self.policy!r} (choose from {', '.join(POLICIES)})")
+        self.window = int(config.get('window', 0) or 0)
+        self.default_sla = float(config.get('default_sla_minutes', 1440)) * 60
+        self.tenants = list(config.get('tenants') or [])
+        self.aging_rate = float(config.get('aging_mb_per_minute', 1.0))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._enqueued: Dict[str, float] = {}
+        self._waits: Dict[str, Dict] = {}
+
+    def order(self, files: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Yield files in policy order, noting when each was queued.
+        """
+        seq = itertools.count()
+        heap: List = []
+        for meta in files:
+            with self._lock:
+                self._enqueued[meta['id']] = self._clock()
+            if self.policy == 'fifo':
+                yield meta
+                continue
+            heapq.heappush(heap, (self.priority(meta), next(seq), meta))
+            if self.window and len(heap) >= self.window:
+                yield heapq.heappop(heap)[2]
+        while heap:
+            yield heapq.heappop(heap)[2]
+
+    def priority(self, meta: Dict) -> float:
+        """
+        Sort key for a file under the configured policy (lower runs first).
+        """
+        if self.policy == 'newest':
+            return -_timestamp(meta.get('modifiedTime'), 0.0)
+        if self.policy == 'smallest':
+            return _size(meta)
+        if self.policy == 'deadline':
+            return self.deadline(meta)
+        # aging: size in MB minus credit for time waited. Waiting is measured
+        # from modifiedTime, so the key does not change while queued.
+        arrived = _timestamp(meta.get('modifiedTime'), self._clock())
+        return _size(meta) / (1024 * 1024) + self.aging_rate * arrived / 60
+
+    def tenant(self, meta: Dict) -> Optional[Dict]:
+        name = meta.get('name', '')
+        for tenant in self.tenants:
+            if fnmatch.fnmatch(name, tenant.get('pattern', '')):
+                return tenant
+        return None
+
+    def deadline(self, meta: Dict) -> float:
+        tenant = self.tenant(meta)
+        sla = float(tenant['sla_minutes']) * 60 if tenant and 'sla_minutes' in tenant else self.default_sla
+        return _timestamp(meta.get('modifiedTime'), self._clock()) + sla
+
+    def started(self, meta: Dict) -> None:
+        """
+        Record that processing of a file has begun.
+        """
+        now = self._clock()
+        with self._lock:
+            queued = self._enqueued.pop(meta['id'], now)
+        entry = {
+            'name': meta.get('name', ''),
+            'wait_s': round(now - queued, 3),
+        }
+        if self.policy == 'deadline':
+            tenant = self.tenant(meta)
+            entry['tenant'] = tenant.get('name') if tenant else None
+            entry['missed_deadline'] = now > self.deadline(meta)
+        with self._lock:
+            self._waits[meta['id']] = entry
+
+    def report(self) -> Dict:
+        """
+        Per-file queue waits and their p50/p95/max, for this run.
+        """
+        with self._lock:
+            waits = dict(self._waits)
+        values = sorted(w['wait_s'] for w in waits.values())
+        summary = {
+            'policy': self.policy,
+            'files': len(values),
+            'p50_wait_s': _percentile(values, 0.50),
+            'p95_wait_s': _percentile(values, 0.95),
+            'max_wait_s': values[-1] if values else 0.0,
+            'waits': waits,
+        }
+        if self.policy == 'deadline':
+            summary['missed_deadlines'] = sum(1 for w in waits.values() if w.get('missed_deadline'))
+        return summary
+
+    def reset(self) -> None:
+        with self._lock:
+            self._enqueued.clear()
+            self._waits.clear()
+
+
+def _size(meta: Dict) -> float:
+    try:
+        return float(meta.get('size') or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _timestamp(value: Optional[str], default: float) -> float:
+    if not value:
+        return default
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return default
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
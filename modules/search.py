@@ -0,0 +1,185 @@
+# modules/search.py
+"""
+Retrieval-only building blocks for Indexer.search: a BM25 inverted index
+over record fields, a small in-memory vector store, hybrid rank fusion with
+a field-aware rerank, and an LRU result cache. No LLM is involved.
+"""
+import hashlib
+import math
+import re
+from collections import Counter, OrderedDict, defaultdict
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(value) -> str:
+    """
+    Lowercase and strip everything but letters and digits ("12-345" -> "12345").
+    """
+    return _NON_ALNUM_RE.sub("", str(value).lower())
+
+
+def tokenize(text) -> List[str]:
+    """
+    Lowercase alphanumeric tokens, plus the joined form of values that
+    contain punctuation so "12-345" also matches "12345".
+    """
+    text = str(text).lower()
+    tokens = _TOKEN_RE.findall(text)
+    joined = normalize(text)
+    if len(tokens) > 1 and len(joined) <= 32:
+        tokens.append(joined)
+    return tokens
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the string fields of each record.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._lengths: List[int] = []
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, doc_id: int, fields: Dict[str, str]) -> None:
+        counts: Counter = Counter()
+        for value in fields.values():
+            if value is not None and value != '':
+                counts.update(tokenize(value))
+        for token, tf in counts.items():
+            self._postings[token][doc_id] = tf
+        length = sum(counts.values())
+        if doc_id >= len(self._lengths):
+            self._lengths.extend([0] * (doc_id + 1 - len(self._lengths)))
+        self._lengths[doc_id] = length
+        self._total_length += length
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        n = len(self._lengths)
+        if not n:
+            return []
+        avg_length = self._total_length / n or 1.0
+        scores: Dict[int, float] = defaultdict(float)
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda kv: -kv[1])[:k]
+
+
+class HashingEmbedder:
+    """
+    Local, dependency-free embedding: hashed character trigrams.
+
+    Captures spelling-level similarity (typos, partial addresses) rather
+    than meaning, and needs no API call.
+    """
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            padded = f" {' '.join(tokenize(text))} "
+            for i in range(len(padded) - 2):
+                digest = hashlib.blake2b(padded[i:i + 3].encode('utf-8'), digest_size=4).digest()
+                out[row, int.from_bytes(digest, 'little') % self.dim] += 1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+class VectorStore:
+    """
+    Brute-force cosine similarity over normalized vectors.
+    """
+    def __init__(self):
+        self._rows: List[np.ndarray] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, vector: np.ndarray) -> None:
+        self._rows.append(np.asarray(vector, dtype=np.float32))
+        self._matrix = None
+
+    def search(self, vector: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if not self._rows:
+            return []
+        if self._matrix is None:
+            self._matrix = np.vstack(self._rows)
+        sims = self._matrix @ np.asarray(vector, dtype=np.float32)
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        return sorted(((int(i), float(sims[i])) for i in top), key=lambda kv: -kv[1])
+
+
+def fuse(rankings: Sequence[Tuple[float, List[Tuple[int, float]]]], k: int = 60) -> Dict[int, float]:
+    """
+    Weighted reciprocal rank fusion of several ranked (doc_id, score) lists.
+    """
+    fused: Dict[int, float] = defaultdict(float)
+    for weight, ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking):
+            fused[doc_id] += weight / (k + rank + 1)
+    return fused
+
+
+def field_match_bonus(query: str, record: Dict, field: Optional[str] = None) -> float:
+    """
+    Rerank signal: 1.0 if a field equals the query exactly (ignoring case and
+    punctuation), 0.5 if one field contains every query token.
+    """
+    wanted = normalize(query)
+    tokens = set(_TOKEN_RE.findall(query.lower()))
+    values = [record.get(field)] if field else list(record.values())
+    bonus = 0.0
+    for value in values:
+        if value is None or value == '':
+            continue
+        if wanted and normalize(value) == wanted:
+            return 1.0
+        if tokens and tokens <= set(_TOKEN_RE.findall(str(value).lower())):
+            bonus = 0.5
+    return bonus
+
+
+class LRUCache:
+    """
+    Small least-recently-used mapping with a size bound.
+    """
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, compute: Callable[[], object]):
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+        self.misses += 1
+        value = compute()
+        if self.maxsize > 0:
+            self._data[key] = value
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        self._data.clear()
@@ -0,0 +1,182 @@
+# modules/text_backends.py
+"""
+Interchangeable PDF text-extraction backends for PDFParser.
+
+Backends differ widely in speed and in how much layout they recover:
+pypdfium2 and pypdf read the content stream directly and are fast on
+simple statements; pdfminer and pdfplumber run a layout analysis that is
+slower but keeps columns and tables readable.
+
+PDFium (pypdfium2) is not thread-safe, so every call into it, from any
+document on any thread, is made holding PDFIUM_LOCK.
+"""
+import io
+import threading
+from typing import Dict, Iterator, List, Optional, Set
+
+import pdfplumber
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+try:
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+except ImportError:
+    PDFPage = None
+
+# Serializes PDFium calls (text extraction here, OCR rendering in
+# pdf_parser); held per call, never across a yield
+PDFIUM_LOCK = threading.RLock()
+
+
+class TextBackend:
+    """
+    Yields the text of each page of a PDF. With `pages`, only those page
+    indexes are extracted and every other page yields "".
+    """
+    name = ''
+    # Reconstructs reading order/columns from character positions
+    layout_aware = False
+
+    def available(self) -> bool:
+        return True
+
+    def iter_pages(self, pdf_bytes: bytes, pages: Optional[Set[int]] = None) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class PdfplumberBackend(TextBackend):
+    name = 'pdfplumber'
+    layout_aware = True
+
+    def iter_pages(self, pdf_bytes: bytes, pages: Optional[Set[int]] = None) -> Iterator[str]:
+        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+            for i, page in enumerate(pdf.pages):
+                if pages is not None and i not in pages:
+                    yield ""
+                    continue
+                page_text = page.extract_text() or ""
+                # Drop pdfplumber's cached chars/objects/textmap for the page
+                close = getattr(page, "close", None)
+                if close:
+                    close()
+                yield page_text
+
+
+class Pypdfium2Backend(TextBackend):
+    name = 'pypdfium2'
+
+    def available(self) -> bool:
+        return pdfium is not None
+
+    def iter_pages(self, pdf_bytes: bytes, pages: Optional[Set[int]] = None) -> Iterator[str]:
+        with PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(pdf_bytes)
+            count = len(pdf)
+        try:
+            for i in range(count):
+                if pages is not None and i not in pages:
+                    yield ""
+                    continue
+                with PDFIUM_LOCK:
+                    page = pdf[i]
+                    textpage = page.get_textpage()
+                    try:
+                        page_text = textpage.get_text_bounded()
+                    finally:
+                        textpage.close()
+                        page.close()
+                # PDFium reports line breaks as CRLF
+                yield page_text.replace("\r\n", "\n").replace("\r", "\n")
+        finally:
+            with PDFIUM_LOCK:
+                pdf.close()
+
+
+class PypdfBackend(TextBackend):
+    name = 'pypdf'
+
+    def available(self) -> bool:
+        return PdfReader is not None
+
+    def iter_pages(self, pdf_bytes: bytes, pages: Optional[Set[int]] = None) -> Iterator[str]:
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        for i, page in enumerate(reader.pages):
+            if pages is not None and i not in pages:
+                yield ""
+                continue
+            yield page.extract_text() or ""
+
+
+class PdfminerBackend(TextBackend):
+    name = 'pdfminer'
+    layout_aware = True
+
+    def available(self) -> bool:
+        return PDFPage is not None
+
+    def iter_pages(self, pdf_bytes: bytes, pages: Optional[Set[int]] = None) -> Iterator[str]:
+        manager = PDFResourceManager()
+        laparams = LAParams()
+        for i, page in enumerate(PDFPage.get_pages(io.BytesIO(pdf_bytes))):
+            if pages is not None and i not in pages:
+                yield ""
+                continue
+            out = io.StringIO()
+            device = TextConverter(manager, out, laparams=laparams)
+            try:
+                PDFPageInterpreter(manager, device).process_page(page)
+            finally:
+                device.close()
+            # TextConverter ends every page with a form feed
+            yield out.getvalue().rstrip("\f")
+
+
+# Fastest first
+BACKENDS: Dict[str, TextBackend] = {
+    b.name: b for b in (Pypdfium2Backend(), PypdfBackend(), PdfminerBackend(), PdfplumberBackend())
+}
+
+
+def get_backend(name: str) -> TextBackend:
+    """
+    Look up a backend by name.
+
+    Raises:
+        ValueError if the backend is unknown or its package is not installed.
+    """
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"Unknown PDF text backend: {name!r} (choose from {', '.join(BACKENDS)})")
+    if not backend.available():
+        raise ValueError(f"PDF text backend {name!r} requires a package that is not installed.")
+    return backend
+
+
+def available_backends() -> List[str]:
+    """
+    Names of installed backends, fastest first.
+    """
+    return [name for name, b in BACKENDS.items() if b.available()]
+
+
+def default_auto_order() -> List[str]:
+    """
+    Fastest installed backend, then the fastest layout-aware one.
+    """
+    names = available_backends()
+    layout = [n for n in names if BACKENDS[n].layout_aware]
+    order = names[:1]
+    if layout and layout[0] not in order:
+        order.append(layout[0])
+    return order
@@ -0,0 +1,239 @@
+# modules/throttle.py
+"""
+Quota-aware request throttling shared by all writers in a process.
+
+Each destination (a Sheets user, an Airtable base) gets one token bucket.
+The bucket's rate adapts to observed errors: it is halved on a 429/503
+response, honoring any Retry-After header, and grows back slowly on success.
+"""
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Default quotas per destination type: (requests per second, burst size).
+# A full bucket plus a window's refill can all be spent within one quota
+# window, so for per-minute quotas burst + rate * 60 must stay within it.
+DEFAULT_QUOTAS = {
+    # Sheets: 60 write requests per minute per user (6 + 0.9 * 60 = 60)
+    'sheets': (0.9, 6.0),
+    # Airtable: 5 requests per second per base
+    'airtable': (5.0, 5.0),
+}
+
+RATE_LIMIT_STATUSES = (429, 503)
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second up to `capacity`.
+    """
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        Take tokens if available.
+
+        Returns:
+            0.0 on success, otherwise the seconds to wait before retrying.
+        """
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    def drain(self) -> None:
+        """
+        Drop all stored tokens, e.g. after the server rejected a request.
+        """
+        self._refill()
+        self._tokens = 0.0
+
+
+class AdaptiveThrottler:
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: Optional[float] = None,
+        min_rate: Optional[float] = None,
+        max_retries: int = 5,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Initialize a throttler for one destination.
+
+        Args:
+            name: Destination key, e.g. 'airtable:<base_id>'.
+            rate: Maximum (and initial) requests per second.
+            burst: Bucket capacity (defaults to one second of requests).
+            min_rate: Floor for the adaptive rate (defaults to rate / 20).
+            max_retries: Retries of a rate-limited call before giving up.
+        """
+        self.name = name
+        self.max_rate = rate
+        self.min_rate = min_rate or rate / 20
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(rate, burst or max(rate, 1.0), clock)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._blocked_until = 0.0
+        self._requests = 0
+        self._rate_limited = 0
+        self._waited = 0.0
+
+    @property
+    def rate(self) -> float:
+        """
+        Current allowed requests per second.
+        """
+        return self._bucket.rate
+
+    def acquire(self) -> float:
+        """
+        Block until a request may be sent.
+
+        Returns:
+            Seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                delay = self._blocked_until - self._clock()
+                if delay <= 0:
+                    delay = self._bucket.try_acquire()
+                    if delay <= 0:
+                        self._requests += 1
+                        self._waited += waited
+                        return waited
+            self._sleep(delay)
+            waited += delay
+
+    def on_success(self) -> None:
+        """
+        Additive increase: recover 5% of the maximum rate per success.
+        """
+        with self._lock:
+            self._bucket.rate = min(self.max_rate, self._bucket.rate + self.max_rate * 0.05)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> None:
+        """
+        Multiplicative decrease, and pause until Retry-After has passed.
+        """
+        with self._lock:
+            self._rate_limited += 1
+            self._bucket.rate = max(self.min_rate, self._bucket.rate / 2)
+            self._bucket.drain()
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, self._clock() + retry_after)
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """
+        Run fn under the throttle, retrying when the destination rate-limits it.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                limited, retry_after = rate_limit_info(e)
+                if not limited or attempt == self.max_retries:
+                    raise
+                self.on_rate_limited(retry_after)
+                continue
+            self.on_success()
+            return result
+
+    def metrics(self) -> Dict:
+        """
+        Snapshot of the throttler state for logging/monitoring.
+        """
+        with self._lock:
+            return {
+                'destination': self.name,
+                'rate': round(self._bucket.rate, 4),
+                'max_rate': self.max_rate,
+                'requests': self._requests,
+                'rate_limited': self._rate_limited,
+                'waited_s': round(self._waited, 3),
+            }
+
+
+def rate_limit_info(exc: Exception) -> Tuple[bool, Optional[float]]:
+    """
+    Inspect an API exception for a rate-limit response.
+
+    Works with any exception exposing a requests-style `response`
+    (gspread.exceptions.APIError, requests.HTTPError).
+
+    Returns:
+        (is_rate_limited, retry_after_seconds)
+    """
+    response = getattr(exc, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status not in RATE_LIMIT_STATUSES:
+        return False, None
+    headers = getattr(response, 'headers', None) or {}
+    value = headers.get('Retry-After')
+    if value is None:
+        return True, None
+    try:
+        return True, max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        return True, max(0.0, when.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return True, None
+
+
+_REGISTRY: Dict[str, AdaptiveThrottler] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_throttler(kind: str, key: str, config: Optional[Dict] = None) -> AdaptiveThrottler:
+    """
+    Return the process-wide throttler for a destination, creating it once.
+
+    Args:
+        kind: Destination type ('sheets' or 'airtable').
+        key: Quota scope within that type (credentials file, base ID).
+        config: Optional overrides: 'rate' (req/s), 'burst', 'max_retries'.
+    """
+    config = config or {}
+    name = f"{kind}:{key}"
+    with _REGISTRY_LOCK:
+        throttler = _REGISTRY.get(name)
+        if throttler is None:
+            rate, burst = DEFAULT_QUOTAS.get(kind, (1.0, 1.0))
+            throttler = AdaptiveThrottler(
+                name,
+                rate=float(config.get('rate', rate)),
+                burst=float(config.get('burst', burst)),
+                max_retries=int(config.get('max_retries', 5)),
+            )
+            _REGISTRY[name] = throttler
+        return throttler
+
+
+def throttle_metrics() -> List[Dict]:
+    """
+    Metrics of every throttler created in this process.
+    """
+    with _REGISTRY_LOCK:
+        throttlers = list(_REGISTRY.values())
+    return [t.metrics() for t in throttlers]
@@ -4,9 +4,26 @@ Utility helpers for date/currency normalization and logging.
 """
 
 import logging
+from datetime import date, datetime
 from dateutil import parser as date_parser
 import re
 
+# Patterns are compiled once at import time; these helpers run per field
+# for every record in a batch.
+_NON_NUMERIC_RE = re.compile(r"[^\d\.]")
+_PLAIN_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+_US_DATE_RE = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})")
+_ISO_DATE_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+
+# Other layouts used by our lenders, tried with strptime before dateutil
+DATE_FORMATS = (
+    "%m-%d-%Y",
+    "%m/%d/%y",
+    "%B %d, %Y",
+    "%b %d, %Y",
+    "%d %B %Y",
+)
+
 def setup_logging(level: str = "INFO"):
     """
     Configure root logger formatting and level.
@@ -19,6 +36,41 @@ def setup_logging(level: str = "INFO"):
         format="%(asctime)s %(levelname)s %(message)s",
     )
 
+def parse_date(value) -> date:
+    """
+    Parse a date value into datetime.date.
+
+    MM/DD/YYYY and ISO strings are handled by precompiled patterns, other
+    known lender layouts by strptime; dateutil is only used as a last resort.
+
+    Args:
+        value: Raw date text, or a date/datetime instance.
+    Returns:
+        Parsed date.
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    s = str(value).strip()
+    try:
+        m = _US_DATE_RE.fullmatch(s)
+        if m:
+            return date(int(m.group(3)), int(m.group(1)), int(m.group(2)))
+        m = _ISO_DATE_RE.fullmatch(s)
+        if m:
+            return date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+    except ValueError:
+        # Out-of-range month/day; let dateutil apply its own heuristics
+        pass
+    else:
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(s, fmt).date()
+            except ValueError:
+                continue
+    return date_parser.parse(s).date()
+
 def normalize_date(date_str: str) -> str:
     """
     Parse and reformat a date string to ISO yyyy-mm-dd.
@@ -28,8 +80,7 @@ def normalize_date(date_str: str) -> str:
     Returns:
         ISO-formatted date string.
     """
-    dt = date_parser.parse(date_str)
-    return dt.date().isoformat()
+    return parse_date(date_str).isoformat()
 
 def parse_currency(curr_str: str) -> float:
     """
@@ -40,5 +91,9 @@ def parse_currency(curr_str: str) -> float:
     Returns:
         Numeric value.
     """
-    s = re.sub(r"[^\d\.]", "", str(curr_str))
+    if isinstance(curr_str, (int, float)) and not isinstance(curr_str, bool):
+        return float(curr_str)
+    s = str(curr_str)
+    if not _PLAIN_NUMBER_RE.fullmatch(s):
+        s = _NON_NUMERIC_RE.sub("", s)
     return float(s)
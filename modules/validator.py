@@ -0,0 +1,92 @@
+# modules/validator.py
+"""
+Validate merged extractor output into typed StatementRecord objects in batches.
+"""
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from pydantic import TypeAdapter, ValidationError
+
+from modules.models import StatementRecord, field_type
+from modules.utils import parse_date, parse_currency
+
+_BATCH_ADAPTER = TypeAdapter(List[StatementRecord])
+
+
+class RecordValidator:
+    def __init__(self, config: Dict):
+        """
+        Initialize the validation stage.
+
+        Args:
+            config: Dict containing:
+                - batch_size: Number of records validated per call (default 50).
+        """
+        self.batch_size = int(config.get('batch_size', 50) or 50)
+
+    def validate(self, record: Dict) -> StatementRecord:
+        """
+        Validate a single record.
+
+        Raises:
+            pydantic.ValidationError if the record cannot be coerced.
+        """
+        return StatementRecord.model_validate(record)
+
+    def validate_batch(
+        self, records: List[Dict]
+    ) -> Tuple[List[Tuple[int, StatementRecord]], List[Tuple[int, str]]]:
+        """
+        Validate a batch of records in a single pydantic call.
+
+        The whole list goes through one TypeAdapter call; if any record fails,
+        the failing indices are taken from the error locations and only the
+        remaining records are validated again.
+
+        Args:
+            records: List of merged extractor dicts.
+
+        Returns:
+            (valid, invalid) where valid is a list of (index, StatementRecord)
+            and invalid a list of (index, error message), both in input order.
+        """
+        try:
+            parsed = _BATCH_ADAPTER.validate_python(records)
+            return list(enumerate(parsed)), []
+        except ValidationError as e:
+            errors: Dict[int, List[str]] = {}
+            for err in e.errors():
+                idx, *field = err['loc']
+                where = ".".join(str(f) for f in field) or "record"
+                errors.setdefault(idx, []).append(f"{where}: {err['msg']}")
+
+        good = [i for i in range(len(records)) if i not in errors]
+        parsed = _BATCH_ADAPTER.validate_python([records[i] for i in good])
+        valid = list(zip(good, parsed))
+        invalid = [(i, "; ".join(msgs)) for i, msgs in sorted(errors.items())]
+        return valid, invalid
+
+
+def invalid_fields(values: Dict, fields: Optional[Iterable[str]] = None) -> Set[str]:
+    """
+    Return the fields whose values are missing or would fail StatementRecord
+    validation, checked field by field.
+
+    Args:
+        values: Field name -> raw value.
+        fields: Fields to check (default: every key in values).
+    """
+    bad: Set[str] = set()
+    for field in (values.keys() if fields is None else fields):
+        value = values.get(field)
+        if value is None or not str(value).strip():
+            bad.add(field)
+            continue
+        typ = field_type(field)
+        try:
+            if typ is float:
+                parse_currency(value)
+            elif typ is date:
+                parse_date(value)
+        except (ValueError, OverflowError, TypeError):
+            bad.add(field)
+    return bad
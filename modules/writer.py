@@ -1,11 +1,25 @@
 # modules/writer.py
 """
-Append extracted records to Google Sheets or Airtable based on configuration.
+Append extracted records to Google Sheets, Airtable or a local bulk store
+(CSV, SQLite, Parquet) based on configuration.
 """
-from typing import Dict
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Tuple
 import gspread
+from gspread.utils import rowcol_to_a1
 from airtable import Airtable
 
+from modules.throttle import get_throttler
+from modules.local_sinks import CSVSink, SQLiteSink, ParquetSink
+from modules.models import StatementRecord
+
+LOCAL_TYPES = ('csv', 'sqlite', 'parquet')
+
+_UPDATED_RANGE_RE = re.compile(r"![A-Z]+(\d+)")
+
 class Writer:
     def __init__(self, config: Dict):
         """
@@ -33,10 +47,48 @@ class Writer:
                 'api_key': '<API_KEY>'
             }
         }
+
+        Config structure for local bulk output ('csv', 'sqlite' or 'parquet'):
+        {
+            'type': 'sqlite',
+            'sqlite': {
+                # File path (a directory for parquet)
+                'path': './statements.db',
+                # Optional; defaults to the StatementRecord fields
+                'headers': ['col1', 'col2', ...],
+                # sqlite: 'table', 'batch_size'; csv: 'batch_size';
+                # parquet: 'row_group_size'
+            }
+        }
+
+        Optional upsert mode (sheets, airtable or sqlite):
+        {
+            'upsert': {
+                'enabled': True,
+                # Natural key: one or more record fields
+                'key': ['PropertyAddress', 'StatementDate'],
+                # Local cache of key -> row number / Airtable record ID
+                'index_path': './row_index.json',
+                # Pending writes flushed together
+                'batch_size': 50
+            }
+        }
+
+        Optional throttle overrides per destination type (defaults follow the
+        Sheets per-user and Airtable per-base quotas; for Sheets keep
+        burst + rate * 60 within the per-minute quota):
+        {
+            'throttle': {
+                'sheets': {'rate': 0.9, 'burst': 6},
+                'airtable': {'rate': 5.0, 'burst': 5}
+            }
+        }
         """
         self.config = config
         writer_type = config.get("type", "")
         writer_type = writer_type.split("#", 1)[0].strip()
+        throttle_cfg = config.get('throttle', {}) or {}
+        self._sink = None
 
         if writer_type == 'sheets':
             ss_cfg = config['sheets']
@@ -47,6 +99,10 @@ class Writer:
             else:
                 client = gspread.authorize(None)
 
+            # Sheets quotas are per user, i.e. per service account
+            self._throttle = get_throttler(
+                'sheets', ss_cfg.get('credentials_json') or 'default', throttle_cfg.get('sheets')
+            )
             ss = client.open_by_key(ss_cfg['spreadsheet_id'])
             self._worksheet = ss.worksheet('Sheet1')
             self._mode = 'sheets'
@@ -55,11 +111,11 @@ class Writer:
             self._headers = ss_cfg.get('headers', []) or []
             if self._headers:
                 try:
-                    first_row = self._worksheet.row_values(1)
+                    first_row = self._throttle.call(self._worksheet.row_values, 1)
                 except Exception:
                     first_row = []
                 if first_row != self._headers:
-                    self._worksheet.insert_row(self._headers, index=1)
+                    self._throttle.call(self._worksheet.insert_row, self._headers, index=1)
 
         elif writer_type == 'airtable':
             at_cfg = config['airtable']
@@ -69,28 +125,255 @@ class Writer:
             if not api_token:
                 raise ValueError("Airtable config must include 'api_key' or 'token'.")
             self._airtable = Airtable(base_id, table_name, api_token)
+            self._throttle = get_throttler('airtable', base_id, throttle_cfg.get('airtable'))
             self._mode = 'airtable'
 
+        elif writer_type in LOCAL_TYPES:
+            local_cfg = config.get(writer_type, {}) or {}
+            if not local_cfg.get('path'):
+                raise ValueError(f"{writer_type} output config must include 'path'.")
+            self._headers = local_cfg.get('headers') or list(StatementRecord.model_fields)
+            self._mode = writer_type
+            upsert_cfg = config.get('upsert', {}) or {}
+            if writer_type == 'sqlite':
+                key = upsert_cfg.get('key') if upsert_cfg.get('enabled') else None
+                key = [key] if isinstance(key, str) else key
+                self._sink = SQLiteSink(local_cfg, self._headers, key=key)
+            elif writer_type == 'csv':
+                self._sink = CSVSink(local_cfg, self._headers)
+            else:
+                self._sink = ParquetSink(local_cfg, self._headers)
+            if upsert_cfg.get('enabled') and writer_type != 'sqlite':
+                logging.warning(f"{writer_type} output is append-only; upsert is ignored")
+
         else:
             raise ValueError(f"Unknown writer type: {writer_type}")
 
+        if self._sink:
+            # Local backends handle keys themselves (sqlite) or are append-only
+            self._upsert_key = None
+        else:
+            self._init_upsert(config.get('upsert', {}) or {})
+
+    def _init_upsert(self, upsert_cfg: Dict) -> None:
+        """
+        Set up upsert state and load the local key index cache.
+        """
+        self._upsert_key: Optional[List[str]] = None
+        if not upsert_cfg.get('enabled'):
+            return
+        key = upsert_cfg.get('key') or []
+        self._upsert_key = [key] if isinstance(key, str) else list(key)
+        if not self._upsert_key:
+            raise ValueError("Upsert config must include a non-empty 'key'.")
+        if self._mode == 'sheets':
+            missing = [k for k in self._upsert_key if k not in self._headers]
+            if missing:
+                raise ValueError(f"Upsert key fields {missing} must be listed in sheets 'headers'.")
+        self._index_path = upsert_cfg.get('index_path')
+        self._batch_size = int(upsert_cfg.get('batch_size', 50) or 50)
+        self._index_synced = False
+        self._next_row = 1
+        self._pending: Dict[str, Dict] = {}
+        self._row_index: Dict[str, object] = {}
+        if self._index_path and os.path.exists(self._index_path):
+            try:
+                with open(self._index_path, 'r', encoding='utf-8') as f:
+                    self._row_index = json.load(f)
+            except Exception:
+                # Unreadable cache: rebuilt by the bulk sync
+                self._row_index = {}
+
     def append_record(self, record: Dict):
         """
         Append a single record to the configured destination.
 
+        In upsert mode the record is queued instead and written by flush(),
+        updating the existing row for its key if there is one.
+
         Args:
             record: Dict mapping field names to values.
         """
+        if self._sink:
+            self._sink.write(record)
+            return
+
+        if self._upsert_key:
+            self.upsert_record(record)
+            return
+
         if self._mode == 'sheets':
             if self._headers:
                 # Order values according to headers list
                 row = [record.get(col, '') for col in self._headers]
             else:
                 row = list(record.values())
-            self._worksheet.append_row(row)
+            self._throttle.call(self._worksheet.append_row, row)
 
         elif self._mode == 'airtable':
-            self._airtable.insert(record)
+            self._throttle.call(self._airtable.insert, record)
 
         else:
             raise RuntimeError(f"Unsupported write mode: {self._mode}")
+
+    def upsert_record(self, record: Dict) -> None:
+        """
+        Queue a record for insert-or-update by its natural key.
+
+        A later record with the same key replaces a pending one, so retries
+        within a batch collapse to a single write.
+
+        Args:
+            record: Dict mapping field names to values.
+        """
+        if not self._upsert_key:
+            raise RuntimeError("Upsert mode is not enabled for this writer.")
+        key = self._key_of(record)
+        if not key.replace("\x1f", ""):
+            raise ValueError(f"Record has no value for upsert key {self._upsert_key}")
+        self._pending[key] = record
+        if len(self._pending) >= self._batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write buffered rows.
+
+        Local backends write their buffered batch; in upsert mode, pending
+        updates go out as batched range writes and new keys as one bulk
+        append. No-op otherwise.
+        """
+        if self._sink:
+            self._sink.flush()
+            return
+        if not self._upsert_key or not self._pending:
+            return
+        if not self._index_synced:
+            self.sync_index()
+
+        updates: List[Tuple[str, Dict]] = []
+        inserts: List[Tuple[str, Dict]] = []
+        for key, record in self._pending.items():
+            (updates if key in self._row_index else inserts).append((key, record))
+
+        if self._mode == 'sheets':
+            self._flush_sheets(updates, inserts)
+        elif self._mode == 'airtable':
+            self._flush_airtable(updates, inserts)
+
+        self._pending = {}
+        self._save_index()
+
+    def checkpoint(self) -> None:
+        """
+        Make every appended record durable at the destination.
+
+        flush() only writes the current batch, which for local backends may
+        sit in an uncommitted transaction or an unfinished Parquet part
+        file. A checkpoint commits SQLite, fsyncs CSV and spools the new
+        Parquet rows to an fsync'd side file (the part itself is only
+        finished once full or at close); call it before marking files
+        processed, not after every record.
+        """
+        if self._sink:
+            self._sink.checkpoint()
+        else:
+            self.flush()
+
+    def close(self) -> None:
+        """
+        Flush and release the destination (finalizes Parquet files).
+        """
+        self.flush()
+        if self._sink:
+            self._sink.close()
+
+    def sync_index(self) -> None:
+        """
+        Rebuild the key index from the destination in one bulk read.
+
+        Called once per Writer (i.e. once per run) before the first flush.
+        If the destination cannot be read the locally cached index is used.
+        """
+        try:
+            if self._mode == 'sheets':
+                self._sync_sheets_index()
+            elif self._mode == 'airtable':
+                self._sync_airtable_index()
+        except Exception as e:
+            logging.warning(f"Upsert index sync failed, using local cache: {e}")
+            if self._mode == 'sheets':
+                rows = [r for r in self._row_index.values() if isinstance(r, int)]
+                self._next_row = max(rows, default=1) + 1
+        self._index_synced = True
+        self._save_index()
+
+    def _sync_sheets_index(self) -> None:
+        columns = [
+            self._throttle.call(self._worksheet.col_values, self._headers.index(k) + 1)
+            for k in self._upsert_key
+        ]
+        n_rows = max((len(c) for c in columns), default=0)
+        index: Dict[str, object] = {}
+        # Row 1 holds the headers
+        for row in range(2, n_rows + 1):
+            values = [c[row - 1] if row - 1 < len(c) else '' for c in columns]
+            if any(values):
+                index[self._join_key(values)] = row
+        self._row_index = index
+        self._next_row = max(n_rows, 1) + 1
+
+    def _sync_airtable_index(self) -> None:
+        index: Dict[str, object] = {}
+        for rec in self._throttle.call(self._airtable.get_all, fields=self._upsert_key):
+            fields = rec.get('fields', {})
+            index[self._join_key([fields.get(k, '') for k in self._upsert_key])] = rec['id']
+        self._row_index = index
+
+    def _flush_sheets(self, updates: List[Tuple[str, Dict]], inserts: List[Tuple[str, Dict]]) -> None:
+        width = len(self._headers)
+        if updates:
+            data = []
+            for key, record in updates:
+                row = self._row_index[key]
+                data.append({
+                    'range': f"{rowcol_to_a1(row, 1)}:{rowcol_to_a1(row, width)}",
+                    'values': [[record.get(col, '') for col in self._headers]],
+                })
+            self._throttle.call(self._worksheet.batch_update, data)
+        if inserts:
+            rows = [[record.get(col, '') for col in self._headers] for _, record in inserts]
+            response = self._throttle.call(self._worksheet.append_rows, rows)
+            start = self._next_row
+            updated = (response or {}).get('updates', {}).get('updatedRange', '')
+            match = _UPDATED_RANGE_RE.search(updated)
+            if match:
+                start = int(match.group(1))
+            for offset, (key, _) in enumerate(inserts):
+                self._row_index[key] = start + offset
+            self._next_row = start + len(inserts)
+
+    def _flush_airtable(self, updates: List[Tuple[str, Dict]], inserts: List[Tuple[str, Dict]]) -> None:
+        for key, record in updates:
+            self._throttle.call(self._airtable.update, self._row_index[key], record)
+        if inserts:
+            created = self._throttle.call(self._airtable.batch_insert, [record for _, record in inserts])
+            for (key, _), rec in zip(inserts, created or []):
+                self._row_index[key] = rec['id']
+
+    def _key_of(self, record: Dict) -> str:
+        return self._join_key([record.get(k, '') for k in self._upsert_key])
+
+    @staticmethod
+    def _join_key(values: List) -> str:
+        return "\x1f".join(str(v).strip() for v in values)
+
+    def _save_index(self) -> None:
+        if not self._index_path:
+            return
+        try:
+            with open(self._index_path, 'w', encoding='utf-8') as f:
+                json.dump(self._row_index, f)
+        except Exception:
+            # Cache only; the next sync rebuilds it
+            pass
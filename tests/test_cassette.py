@@ -0,0 +1,228 @@
+# tests/test_cassette.py
+import time
+from types import SimpleNamespace
+
+import gspread
+import pytest
+import requests
+
+import modules.drive_watcher as dw_mod
+import modules.extractor as ex_mod
+from modules.cassette import Cassette, CassetteMiss
+from modules.drive_watcher import DriveWatcher
+from modules.extractor import Extractor
+from modules.notifier import Notifier
+
+FILES = [
+    {"id": "1", "name": "a.pdf", "md5Checksum": "aa"},
+    {"id": "2", "name": "b.pdf", "md5Checksum": "bb"},
+]
+
+
+class DummyRequest:
+    def __init__(self, result=None, fail=False):
+        self.result = result
+        self.fail = fail
+    def execute(self):
+        time.sleep(0.01)
+        return self.result
+
+
+class DummyBatch:
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+    def execute(self):
+        for request_id, request in self.requests:
+            if request.fail:
+                self.callback(request_id, None, RuntimeError("404"))
+            else:
+                self.callback(request_id, request.result, None)
+
+
+class DummyDrive:
+    def files(self):
+        return self
+    def list(self, **kwargs):
+        return DummyRequest({"files": FILES})
+    def get_media(self, fileId):
+        return DummyRequest(f"%PDF {fileId}".encode())
+    def get(self, fileId, fields):
+        return DummyRequest({"id": fileId, "parents": ["p"]}, fail=fileId == "x")
+    def new_batch_http_request(self, callback):
+        return DummyBatch(callback)
+
+
+class DummyResponse:
+    # Shaped like an OpenAI SDK (pydantic) response
+    def __init__(self):
+        self.choices = [SimpleNamespace(message=SimpleNamespace(content='{"Foo": "bar"}'))]
+    def model_dump(self, mode="python"):
+        return {"choices": [{"message": {"content": '{"Foo": "bar"}'}}], "usage": {"prompt_tokens": 12}}
+
+
+class DummyWorksheet:
+    def append_rows(self, rows):
+        return {"updates": {"updatedRows": len(rows)}}
+
+
+class DummyClient:
+    def open_by_key(self, key):
+        return SimpleNamespace(worksheet=lambda name: DummyWorksheet())
+
+
+class DummyHTTPResponse:
+    status_code = 200
+    def raise_for_status(self):
+        return None
+
+
+def exercise(tmp_path):
+    """
+    The calls the pipeline makes against each service.
+    """
+    watcher = DriveWatcher({"credentials_json": "fake.json", "folder_id": "f"})
+    listing = watcher.list_new_pdfs()
+    data = watcher.download_file(listing[-1]["id"])
+    meta = watcher.get_metadata(["1", "x"])
+    extractor = Extractor([{"name": "l", "regex_patterns": {"Foo": r"Foo (?P<value>\w+)"}}], {"model": "m"})
+    llm = extractor.extract_with_llm("statement text")
+    sheet = gspread.authorize(None).open_by_key("sheet").worksheet("Sheet1")
+    appended = sheet.append_rows([["a", "b"]])
+    Notifier({"slack": {"webhook_url": "https://hooks.slack.com/services/T/B/secret"}}).notify({"Foo": None})
+    return listing, data, meta, llm, appended
+
+
+@pytest.fixture
+def live_services(monkeypatch):
+    monkeypatch.setattr(dw_mod, "build", lambda *a, **kw: DummyDrive())
+    create = lambda **kwargs: DummyResponse()
+    fake_openai = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)), api_key=None)
+    monkeypatch.setattr(ex_mod, "openai", fake_openai)
+    monkeypatch.setattr(gspread, "authorize", lambda creds: DummyClient())
+    monkeypatch.setattr(requests, "post", lambda url, json=None: DummyHTTPResponse())
+
+
+def go_offline(monkeypatch):
+    def no_network(*args, **kwargs):
+        raise AssertionError("network call during replay")
+    monkeypatch.setattr(dw_mod, "build", no_network)
+    monkeypatch.setattr(gspread, "authorize", no_network)
+    monkeypatch.setattr(requests, "post", no_network)
+    monkeypatch.setattr(ex_mod, "openai", SimpleNamespace(chat=None, api_key=None))
+
+
+def record(tmp_path, path):
+    tape = Cassette({"mode": "record", "path": str(path)}).install()
+    try:
+        return exercise(tmp_path)
+    finally:
+        tape.close()
+
+
+def test_replay_serves_recorded_calls_offline(tmp_path, live_services, monkeypatch):
+    path = tmp_path / "run.jsonl"
+    recorded = record(tmp_path, path)
+    assert "hooks.slack.com" not in path.read_text()
+
+    go_offline(monkeypatch)
+
+    tape = Cassette({"mode": "replay", "path": str(path), "latency_scale": 0}).install()
+    try:
+        replayed = exercise(tmp_path)
+    finally:
+        tape.close()
+
+    # SDK responses come back as attribute namespaces, not the SDK types
+    assert replayed[:2] == recorded[:2] and replayed[3:] == recorded[3:]
+    assert replayed[1] == b"%PDF 2"
+    assert replayed[2] == {"1": {"id": "1", "parents": ["p"]}}
+    assert replayed[3] == {"Foo": "bar"}
+    assert tape.misses == 0
+
+
+def test_replay_multiplies_drive_listing_and_scales_latency(tmp_path, live_services, monkeypatch):
+    path = tmp_path / "run.jsonl"
+    record(tmp_path, path)
+    go_offline(monkeypatch)
+
+    tape = Cassette({"mode": "replay", "path": str(path), "multiply": 3, "latency_scale": 0}).install()
+    try:
+        watcher = DriveWatcher({"credentials_json": "fake.json", "folder_id": "f"})
+        listing = watcher.list_new_pdfs()
+        data = watcher.download_file("2~r2")
+    finally:
+        tape.close()
+    assert [f["id"] for f in listing] == ["1", "1~r1", "1~r2", "2", "2~r1", "2~r2"]
+    assert len({f["md5Checksum"] for f in listing}) == 6
+    assert data == b"%PDF 2"
+
+    tape = Cassette({"mode": "replay", "path": str(path), "latency_scale": 5}).install()
+    try:
+        started = time.perf_counter()
+        DriveWatcher({"credentials_json": "fake.json", "folder_id": "f"}).download_file("1")
+        assert time.perf_counter() - started >= 0.05
+    finally:
+        tape.close()
+
+
+def test_strict_replay_rejects_unrecorded_calls(tmp_path, live_services, monkeypatch):
+    path = tmp_path / "run.jsonl"
+    record(tmp_path, path)
+    go_offline(monkeypatch)
+
+    tape = Cassette({"mode": "replay", "path": str(path), "latency_scale": 0}).install()
+    try:
+        # Same method, other arguments: reuses a recording of get_media
+        assert DriveWatcher({"credentials_json": "fake.json", "folder_id": "f"}).download_file("9").startswith(b"%PDF")
+    finally:
+        tape.close()
+    tape = Cassette({"mode": "replay", "path": str(path), "latency_scale": 0, "strict": True}).install()
+    try:
+        with pytest.raises(CassetteMiss):
+            DriveWatcher({"credentials_json": "fake.json", "folder_id": "f"}).download_file("9")
+    finally:
+        tape.close()
+
+
+class TextParser:
+    # Module-level so the parse pool's workers can unpickle it
+    def extract_text(self, pdf_bytes):
+        return "statement text"
+
+
+class ListWatcher:
+    def __init__(self, files):
+        self.files = files
+    def list_new_pdfs(self):
+        return self.files
+    def download_file(self, file_id):
+        return b"%PDF"
+
+
+def test_replay_reaches_parse_pool_workers(tmp_path, live_services, monkeypatch):
+    import modules.processing_chain as pc_mod
+    path = tmp_path / "run.jsonl"
+    record(tmp_path, path)
+    go_offline(monkeypatch)
+
+    records = []
+    monkeypatch.setattr(pc_mod, "DriveWatcher", lambda cfg: ListWatcher([{"id": "1", "name": "a.pdf"}]))
+    monkeypatch.setattr(pc_mod, "PDFParser", lambda cfg, parser_cfg=None: TextParser())
+    monkeypatch.setattr(pc_mod, "Writer", lambda cfg: SimpleNamespace(append_record=records.append))
+    tape = Cassette({"mode": "replay", "path": str(path), "latency_scale": 0}).install()
+    try:
+        chain = pc_mod.ProcessingChain({
+            "lenders": [{"name": "l", "regex_patterns": {"Foo": r"Foo (?P<value>\w+)"}}],
+            "llm": {"model": "m", "budget": {"persist_path": str(tmp_path / "usage.sqlite")}},
+            "store": {"persist_path": str(tmp_path / "processed.json")},
+            "processing": {"timeouts": {"parse_s": 60}},
+        })
+        result = chain({})
+    finally:
+        tape.close()
+    # The LLM fallback ran in a worker process, against the cassette
+    assert result["failed"] == []
+    assert records[0]["Foo"] == "bar"
@@ -0,0 +1,102 @@
+# tests/test_deadlines.py
+import os
+import time
+import pytest
+from modules.deadlines import Deadline, StageTimeout, WorkerPool, call_with_timeout
+
+
+def spin(seconds):
+    time.sleep(seconds)
+    return "done"
+
+
+def fail():
+    raise ValueError("malformed PDF")
+
+
+def die():
+    os._exit(3)
+
+
+def set_env(name, value):
+    os.environ[name] = value
+
+
+def get_env(name):
+    return os.environ.get(name)
+
+
+def test_worker_pool_returns_results_and_propagates_errors():
+    pool = WorkerPool(2)
+    try:
+        assert pool.run('parse', 5, spin, 0) == "done"
+        with pytest.raises(ValueError, match="malformed"):
+            pool.run('parse', 5, fail)
+    finally:
+        pool.shutdown()
+
+
+def test_worker_pool_reports_and_replaces_a_dead_worker():
+    pool = WorkerPool(1)
+    try:
+        with pytest.raises(RuntimeError, match="exited with code 3"):
+            pool.run('parse', 5, die)
+        assert pool.run('parse', 5, spin, 0) == "done"
+        assert pool.restarts == 1
+    finally:
+        pool.shutdown()
+
+
+def test_worker_pool_runs_initializer_in_each_worker():
+    pool = WorkerPool(1, initializer=set_env, initargs=('DEADLINES_TEST', 'patched'))
+    try:
+        assert pool.run('parse', 5, get_env, 'DEADLINES_TEST') == 'patched'
+        # A replacement worker is initialized too
+        with pytest.raises(StageTimeout):
+            pool.run('parse', 0.2, spin, 30)
+        assert pool.run('parse', 5, get_env, 'DEADLINES_TEST') == 'patched'
+    finally:
+        pool.shutdown()
+    assert 'DEADLINES_TEST' not in os.environ
+
+
+def test_worker_pool_reuses_workers_and_replaces_killed_ones():
+    pool = WorkerPool(1)
+    try:
+        first = pool.run('parse', 5, os.getpid)
+        assert first != os.getpid()
+        # The same long-lived worker serves the next call
+        assert pool.run('parse', 5, os.getpid) == first
+        with pytest.raises(ValueError, match="malformed"):
+            pool.run('parse', 5, fail)
+        assert pool.run('parse', 5, os.getpid) == first
+
+        start = time.monotonic()
+        with pytest.raises(StageTimeout):
+            pool.run('parse', 0.2, spin, 30)
+        assert time.monotonic() - start < 5
+        # The killed worker is replaced by a fresh one
+        assert pool.run('parse', 5, spin, 0) == "done"
+        assert pool.run('parse', 5, os.getpid) != first
+        assert pool.restarts == 1
+    finally:
+        pool.shutdown()
+
+
+def test_call_with_timeout():
+    assert call_with_timeout('download', 1, spin, 0) == "done"
+    with pytest.raises(StageTimeout):
+        call_with_timeout('download', 0.05, spin, 1)
+
+
+def test_deadline_caps_stage_budget():
+    now = [0.0]
+    deadline = Deadline(10, clock=lambda: now[0])
+    assert deadline.budget(30) == 10
+    now[0] = 8
+    assert deadline.budget(5) == 2
+    assert deadline.budget() == 2
+    now[0] = 11
+    with pytest.raises(StageTimeout):
+        deadline.budget(5)
+    assert Deadline(None).budget(None) is None
@@ -56,3 +56,109 @@ def test_download_file_returns_bytes():
     data = watcher.download_file("1")
     assert isinstance(data, (bytes, bytearray))
     assert data.startswith(b"%PDF-1.4")
+
+
+def test_concurrent_downloads_use_separate_clients_within_limit(monkeypatch):
+    import threading
+    import time
+    import modules.drive_watcher as dw_mod
+
+    state = {"active": 0, "peak": 0, "services": 0}
+    lock = threading.Lock()
+
+    class SlowMedia:
+        def __init__(self, service, file_id):
+            self.service = service
+            self.file_id = file_id
+        def execute(self):
+            # A service must never be used by two threads at once
+            assert not self.service.busy
+            self.service.busy = True
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.05)
+            with lock:
+                state["active"] -= 1
+            self.service.busy = False
+            return self.file_id.encode()
+
+    class SlowService(DummyFilesService):
+        def __init__(self):
+            super().__init__()
+            self.busy = False
+            state["services"] += 1
+        def get_media(self, fileId):
+            return SlowMedia(self, fileId)
+
+    monkeypatch.setattr(dw_mod, 'build', lambda *args, **kwargs: SlowService())
+    watcher = DriveWatcher({"credentials_json": "fake.json", "folder_id": "f", "max_concurrency": 3})
+
+    ids = [str(i) for i in range(9)]
+    started = time.perf_counter()
+    results = list(watcher.download_many(ids))
+    elapsed = time.perf_counter() - started
+
+    assert results == [(i, i.encode()) for i in ids]
+    assert state["peak"] == 3
+    # One client for listing plus at most one per concurrent download
+    assert state["services"] <= 1 + 3
+    # Three rounds of 0.05s instead of nine
+    assert elapsed < 0.05 * 9 * 0.8
+
+
+def test_get_metadata_batches_lookups(monkeypatch):
+    import modules.drive_watcher as dw_mod
+
+    batches = []
+
+    class DummyGet:
+        def __init__(self, file_id, fields):
+            self.file_id = file_id
+            self.fields = fields
+
+    class DummyBatch:
+        def __init__(self, callback):
+            self.callback = callback
+            self.requests = []
+        def add(self, request, request_id):
+            self.requests.append((request_id, request))
+        def execute(self):
+            batches.append(len(self.requests))
+            for request_id, request in self.requests:
+                if request_id == "missing":
+                    self.callback(request_id, None, RuntimeError("404"))
+                else:
+                    self.callback(request_id, {"id": request.file_id, "parents": ["p"], "md5Checksum": "x"}, None)
+
+    class BatchService(DummyFilesService):
+        def get(self, fileId, fields):
+            return DummyGet(fileId, fields)
+        def new_batch_http_request(self, callback):
+            return DummyBatch(callback)
+
+    monkeypatch.setattr(dw_mod, 'build', lambda *args, **kwargs: BatchService())
+    watcher = DriveWatcher({"credentials_json": "fake.json", "folder_id": "f"})
+
+    ids = [f"id{i}" for i in range(150)] + ["missing", "id0"]
+    meta = watcher.get_metadata(ids)
+
+    assert batches == [100, 51]
+    assert len(meta) == 150
+    assert "missing" not in meta
+    assert meta["id7"]["parents"] == ["p"]
+
+
+def test_http_timeout_without_key_file_uses_default_credentials(monkeypatch):
+    import modules.drive_watcher as dw_mod
+    default_creds = object()
+    monkeypatch.setattr(dw_mod.google.auth, 'default', lambda scopes=None: (default_creds, 'project'))
+    built = []
+    monkeypatch.setattr(dw_mod, 'build', lambda *args, **kwargs: built.append(kwargs) or DummyFilesService())
+
+    DriveWatcher({"credentials_json": "missing.json", "folder_id": "folder123", "http_timeout_s": 30})
+
+    http = built[0]['http']
+    assert isinstance(http, dw_mod.AuthorizedHttp)
+    assert http.credentials is default_creds
+    assert http.http.timeout == 30.0
@@ -44,8 +44,8 @@ def test_merge_results_prefers_regex(extractor):
 
 def test_extract_calls_llm_when_needed(monkeypatch, extractor):
     # Monkeypatch regex to return missing principal and llm to provide it
-    monkeypatch.setattr(extractor, 'extract_with_regex', lambda t: {"StatementDate": "01/01/2025"})
-    monkeypatch.setattr(extractor, 'extract_with_llm', lambda t: {"StatementDate": "01/01/2025", "AmountPrincipal": "500.00"})
+    monkeypatch.setattr(extractor, 'extract_with_regex', lambda t, hits=None: {"StatementDate": "01/01/2025"})
+    monkeypatch.setattr(extractor, 'extract_with_llm', lambda t, fields=None, lender=None: {"StatementDate": "01/01/2025", "AmountPrincipal": "500.00"})
     monkeypatch.setattr(extractor, '_needs_llm', lambda r: True)
     record = extractor.extract("dummy text")
     # Should include both fields
@@ -56,11 +56,166 @@ def test_extract_calls_llm_when_needed(monkeypatch, extractor):
 def test_extract_skips_llm_when_not_needed(monkeypatch, extractor):
     # Regex returns full set
     mock_res = {"StatementDate": "01/01/2025", "AmountPrincipal": "500.00"}
-    monkeypatch.setattr(extractor, 'extract_with_regex', lambda t: mock_res)
-    monkeypatch.setattr(extractor, 'extract_with_llm', lambda t: {"ShouldNot": "used"})
+    monkeypatch.setattr(extractor, 'extract_with_regex', lambda t, hits=None: mock_res)
+    monkeypatch.setattr(extractor, 'extract_with_llm', lambda t, fields=None, lender=None: {"ShouldNot": "used"})
     monkeypatch.setattr(extractor, '_needs_llm', lambda r: False)
     record = extractor.extract("dummy text")
     # Should equal regex result
     assert record["StatementDate"] == "01/01/2025"
     assert record["AmountPrincipal"] == "500.00"
     assert "ShouldNot" not in record
+
+
+def test_extract_pages_stops_once_all_fields_found(monkeypatch, extractor):
+    consumed = []
+
+    def pages():
+        for text in ["Statement Date: 02/20/2025", "Principal: $2,500.00", "Disclosures", "Insert"]:
+            consumed.append(text)
+            yield text
+
+    monkeypatch.setattr(extractor, 'extract_with_llm', lambda t, fields=None, lender=None: pytest.fail("LLM should not be called"))
+    record = extractor.extract_pages(pages())
+    assert record == {"StatementDate": "02/20/2025", "AmountPrincipal": "2,500.00"}
+    # Pages after the one completing the record are never read
+    assert consumed == ["Statement Date: 02/20/2025", "Principal: $2,500.00"]
+
+
+def test_extract_pages_matches_across_page_break(monkeypatch, extractor):
+    monkeypatch.setattr(extractor, 'extract_with_llm', lambda t, fields=None, lender=None: {})
+    record = extractor.extract_pages(iter(["Statement Date:", "02/20/2025\nPrincipal: $10.00"]))
+    assert record["StatementDate"] == "02/20/2025"
+    assert record["AmountPrincipal"] == "10.00"
+
+
+def test_extract_pages_falls_back_to_llm_with_full_text(monkeypatch, extractor):
+    seen = {}
+
+    def fake_llm(text, fields=None, lender=None):
+        seen['text'] = text
+        seen['fields'] = fields
+        return {"AmountPrincipal": "500.00"}
+
+    monkeypatch.setattr(extractor, 'extract_with_llm', fake_llm)
+    record = extractor.extract_pages(["Statement Date: 01/01/2025", "no principal here"])
+    assert seen['text'] == "Statement Date: 01/01/2025\nno principal here"
+    assert seen['fields'] == ["AmountPrincipal"]
+    assert record == {"StatementDate": "01/01/2025", "AmountPrincipal": "500.00"}
+
+
+class DummyCompletions:
+    def __init__(self, replies):
+        self.replies = replies
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        content = self.replies[kwargs['model']]
+        message = type('Msg', (), {'content': content})()
+        choice = type('Choice', (), {'message': message})()
+        return type('Resp', (), {'choices': [choice]})()
+
+
+def _tiered(monkeypatch, replies):
+    import modules.extractor as extractor_module
+    completions = DummyCompletions(replies)
+    chat = type('Chat', (), {'completions': completions})()
+    monkeypatch.setattr(extractor_module.openai, 'chat', chat)
+    lenders_cfg = [{"name": "dummy", "regex_patterns": {
+        "StatementDate": r"Statement Date[:\s]+(?P<value>\S+)",
+        "AmountPrincipal": r"Principal[:\s]+\$(?P<value>\S+)",
+        "LoanNumber": r"Loan[:\s]+(?P<value>\d+)",
+    }}]
+    llm_cfg = {"api_key": "test", "tiers": [{"model": "cheap"}, {"model": "strong", "max_tokens": 256}]}
+    return Extractor(lenders_cfg, llm_cfg), completions
+
+
+def test_extract_pages_skips_llm_for_degraded_stream(monkeypatch, extractor):
+    monkeypatch.setattr(extractor, 'extract_with_llm', lambda *a, **k: pytest.fail("no LLM when degraded"))
+
+    class CutShort(list):
+        degraded = "document has more than 1 page(s); read 1 page(s)"
+
+    record = extractor.extract_pages(CutShort(["Statement Date: 01/01/2025"]))
+    assert record == {"StatementDate": "01/01/2025"}
+    assert extractor.extract("no fields here", llm=False) == {}
+
+
+def test_unpickled_extractor_reapplies_api_key(monkeypatch, extractor):
+    import pickle
+    import modules.extractor as ex_mod
+    payload = pickle.dumps(extractor)
+    # A worker process starts with an unconfigured client
+    monkeypatch.setattr(ex_mod.openai, 'api_key', None)
+    pickle.loads(payload)
+    assert ex_mod.openai.api_key == "test"
+
+
+def test_llm_fallback_reuses_lender_from_regex_pass(monkeypatch):
+    lenders = [
+        {"name": "other", "regex_patterns": {"LoanNumber": r"Loan #(?P<value>\d+)"}},
+        {"name": "dummy", "regex_patterns": {
+            "StatementDate": r"Statement Date[:\s]+(?P<value>\d{1,2}/\d{1,2}/\d{4})",
+            "AmountPrincipal": r"Principal[:\s]+\$(?P<value>[\d,]+\.\d{2})",
+        }},
+    ]
+    extractor = Extractor(lenders, {"model": "gpt-4", "api_key": "test"})
+    monkeypatch.setattr(extractor, 'score_text', lambda t: pytest.fail("no extra regex pass"))
+    seen = []
+    monkeypatch.setattr(extractor, 'extract_with_llm', lambda t, fields=None, lender=None: seen.append(lender) or {})
+    extractor.extract("Statement Date: 01/01/2025")
+    extractor.extract_pages(["Statement Date: 01/01/2025", "no principal"])
+    assert seen == ["dummy", "dummy"]
+
+
+def test_llm_tiers_escalate_only_missing_or_invalid_fields(monkeypatch):
+    replies = {
+        "cheap": '{"StatementDate": "not a date", "AmountPrincipal": "1,200.50", "LoanNumber": null}',
+        "strong": '{"StatementDate": "03/01/2025", "LoanNumber": "12345"}',
+    }
+    extractor, completions = _tiered(monkeypatch, replies)
+    res = extractor.extract_with_llm("statement text")
+
+    assert res == {"AmountPrincipal": "1,200.50", "StatementDate": "03/01/2025", "LoanNumber": "12345"}
+    assert [c['model'] for c in completions.calls] == ["cheap", "strong"]
+    cheap, strong = completions.calls
+    assert cheap['response_format']['type'] == 'json_schema'
+    assert cheap['response_format']['json_schema']['schema']['required'] == ["StatementDate", "AmountPrincipal", "LoanNumber"]
+    # The schema stays the same for every call (it is part of the cached
+    # prefix); the fields still wanted are named in the last message
+    assert strong['response_format']['json_schema']['schema'] == cheap['response_format']['json_schema']['schema']
+    assert strong['messages'][-1]['content'].startswith("Fields to fill: StatementDate, LoanNumber\n")
+    assert strong['max_tokens'] == 256
+    assert extractor.tier_usage == {"cheap": 1, "strong": 1}
+
+
+def test_llm_cheap_tier_is_enough(monkeypatch):
+    replies = {"cheap": '{"LoanNumber": "987"}', "strong": "{}"}
+    extractor, completions = _tiered(monkeypatch, replies)
+    record = extractor.extract("Statement Date: 01/01/2025\nPrincipal: $5.00")
+
+    assert record["LoanNumber"] == "987"
+    assert [c['model'] for c in completions.calls] == ["cheap"]
+    assert completions.calls[0]['messages'][-1]['content'].startswith("Fields to fill: LoanNumber\n")
+
+
+def test_llm_unparseable_reply_escalates(monkeypatch):
+    replies = {"cheap": "Sure! Here is the JSON", "strong": '{"LoanNumber": "42"}'}
+    extractor, completions = _tiered(monkeypatch, replies)
+    res = extractor.extract_with_llm("text", fields=["LoanNumber"])
+    assert res == {"LoanNumber": "42"}
+    assert len(completions.calls) == 2
+
+
+def test_prompt_prefix_is_stable_across_documents(monkeypatch):
+    replies = {"cheap": '{"LoanNumber": "1"}', "strong": "{}"}
+    extractor, completions = _tiered(monkeypatch, replies)
+    extractor.extract_with_llm("first statement", fields=["LoanNumber"], lender="dummy")
+    extractor.extract_with_llm("second, longer statement", fields=["StatementDate", "LoanNumber"], lender="dummy")
+
+    first, second = completions.calls[:2]
+    assert first['messages'][:-1] == second['messages'][:-1]
+    assert first['messages'][0]['role'] == 'system' and 'dummy' in first['messages'][0]['content']
+    assert first['response_format'] == second['response_format']
+    # Variable text goes last
+    assert second['messages'][-1]['content'].endswith("Statement:\nsecond, longer statement")
@@ -0,0 +1,198 @@
+# tests/test_fanout_writer.py
+import threading
+import time
+
+import pytest
+
+import modules.fanout_writer as fw_mod
+from modules.fanout_writer import FanoutWriter
+
+
+class DummySinkWriter:
+    """
+    Stands in for Writer; behaviour is picked by the sink's 'type'.
+    """
+    delivered = {}
+    failures = {}
+    delay = 0.0
+    gate = None
+    checkpoints = []
+
+    def __init__(self, cfg):
+        self.name = cfg['type']
+        self.cfg = cfg
+        self.gate = DummySinkWriter.gate
+        DummySinkWriter.delivered.setdefault(self.name, [])
+
+    def append_record(self, record):
+        if DummySinkWriter.failures.get(self.name, 0):
+            DummySinkWriter.failures[self.name] -= 1
+            raise RuntimeError(f"{self.name} unavailable")
+        if self.gate:
+            self.gate.wait()
+        time.sleep(DummySinkWriter.delay)
+        DummySinkWriter.delivered[self.name].append(record)
+
+    def flush(self):
+        # Like a Parquet part file without its footer: written, not durable
+        pass
+
+    def checkpoint(self):
+        DummySinkWriter.checkpoints.append((self.name, len(DummySinkWriter.delivered[self.name])))
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def dummy_writer(monkeypatch):
+    DummySinkWriter.delivered = {}
+    DummySinkWriter.failures = {}
+    DummySinkWriter.delay = 0.0
+    DummySinkWriter.gate = None
+    DummySinkWriter.checkpoints = []
+    monkeypatch.setattr(fw_mod, 'Writer', DummySinkWriter)
+
+
+def _config(tmp_path, **fanout):
+    cfg = {'wal_path': str(tmp_path / 'wal.jsonl'), 'sinks': ['sheets', 'sqlite'],
+           'retry': {'attempts': 3, 'backoff_s': 0.0}}
+    cfg.update(fanout)
+    return {'type': 'fanout', 'fanout': cfg, 'upsert': {'enabled': True, 'index_path': str(tmp_path / 'idx.json')}}
+
+
+def test_delivers_to_every_sink_concurrently(tmp_path):
+    DummySinkWriter.delay = 0.05
+    writer = FanoutWriter(_config(tmp_path))
+
+    started = time.perf_counter()
+    for i in range(4):
+        writer.append_record({'n': i})
+    # Appending only touches the log
+    assert time.perf_counter() - started < 0.05
+    writer.close()
+    elapsed = time.perf_counter() - started
+
+    assert DummySinkWriter.delivered['sheets'] == [{'n': i} for i in range(4)]
+    assert DummySinkWriter.delivered['sqlite'] == [{'n': i} for i in range(4)]
+    # Sinks run side by side: ~4 x 0.05s, not 8 x 0.05s
+    assert elapsed < 0.05 * 8 * 0.8
+    assert all(s['behind'] == 0 for s in writer.status().values())
+    # Everything acknowledged: the log is emptied
+    assert (tmp_path / 'wal.jsonl').read_text() == ''
+
+
+def test_retries_per_sink_independently(tmp_path):
+    DummySinkWriter.failures = {'sheets': 2}
+    writer = FanoutWriter(_config(tmp_path))
+    writer.append_record({'n': 1})
+    writer.close()
+
+    status = writer.status()
+    assert status['sheets']['retries'] == 2
+    assert status['sqlite']['retries'] == 0
+    assert DummySinkWriter.delivered['sheets'] == [{'n': 1}]
+
+
+def test_sink_that_fell_behind_is_replayed_from_log(tmp_path):
+    DummySinkWriter.failures = {'sheets': 3}
+    writer = FanoutWriter(_config(tmp_path))
+    for i in range(3):
+        writer.append_record({'n': i})
+    writer.close()
+
+    status = writer.status()
+    assert status['sheets']['error'] and status['sheets']['behind'] == 3
+    assert status['sqlite']['behind'] == 0
+    assert DummySinkWriter.delivered['sheets'] == []
+    # Kept for replay
+    assert len((tmp_path / 'wal.jsonl').read_text().splitlines()) == 3
+
+    # Next run: only the lagging sink receives the logged records, then new ones
+    writer = FanoutWriter(_config(tmp_path))
+    writer.append_record({'n': 3})
+    writer.close()
+    assert DummySinkWriter.delivered['sheets'] == [{'n': i} for i in range(4)]
+    assert DummySinkWriter.delivered['sqlite'] == [{'n': i} for i in range(4)]
+    assert (tmp_path / 'wal.jsonl').read_text() == ''
+
+
+def test_crash_before_delivery_replays_logged_records(tmp_path):
+    # Destinations hang, then the process dies without close()
+    stuck = threading.Event()
+    DummySinkWriter.gate = stuck
+    writer = FanoutWriter(_config(tmp_path))
+    writer.append_record({'n': 1})
+    writer.flush()
+
+    DummySinkWriter.gate = None
+    restarted = FanoutWriter(_config(tmp_path))
+    restarted.close()
+    assert DummySinkWriter.delivered['sheets'] == [{'n': 1}]
+    assert DummySinkWriter.delivered['sqlite'] == [{'n': 1}]
+    stuck.set()
+
+
+def test_sink_configs_share_output_settings(tmp_path):
+    cfg = _config(tmp_path, sinks=['sheets', {'name': 'team', 'type': 'airtable', 'airtable': {'base_id': 'b'}}])
+    cfg['sheets'] = {'spreadsheet_id': 's'}
+    writer = FanoutWriter(cfg)
+    writers = {s.name: s.writer.cfg for s in writer._sinks}
+    writer.close()
+
+    assert writers['sheets']['sheets'] == {'spreadsheet_id': 's'}
+    assert writers['team']['type'] == 'airtable' and writers['team']['airtable'] == {'base_id': 'b'}
+    # One upsert index cache per sink
+    assert writers['sheets']['upsert']['index_path'] != writers['team']['upsert']['index_path']
+    with pytest.raises(ValueError):
+        FanoutWriter(_config(tmp_path, sinks=['sheets', 'sheets']))
+
+
+def test_sinks_acknowledge_only_after_a_checkpoint(tmp_path):
+    writer = FanoutWriter(_config(tmp_path, sinks=['sqlite'], flush_every=3, flush_interval_s=60))
+    for i in range(2):
+        writer.append_record({'n': i})
+    deadline = time.monotonic() + 2
+    while len(DummySinkWriter.delivered['sqlite']) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Delivered but not checkpointed: still unacknowledged in the log
+    time.sleep(0.05)
+    assert writer.status()['sqlite']['acked'] == 0
+    assert DummySinkWriter.checkpoints == []
+
+    writer.append_record({'n': 2})
+    writer.close()
+    # One checkpoint at flush_every, and close() finalizes the rest
+    assert DummySinkWriter.checkpoints == [('sqlite', 3)]
+    assert writer.status()['sqlite']['acked'] == 3
+
+
+def test_sinks_checkpoint_on_a_timer(tmp_path):
+    writer = FanoutWriter(_config(tmp_path, sinks=['sqlite'], flush_every=100, flush_interval_s=0.05))
+    writer.append_record({'n': 1})
+    deadline = time.monotonic() + 2
+    while writer.status()['sqlite']['acked'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert DummySinkWriter.checkpoints == [('sqlite', 1)]
+    assert writer.status()['sqlite']['acked'] == 1
+    writer.close()
+
+
+def test_checkpoint_compacts_the_acknowledged_log(tmp_path):
+    wal = tmp_path / 'wal.jsonl'
+    writer = FanoutWriter(_config(tmp_path, flush_every=2, flush_interval_s=60))
+    for i in range(5):
+        writer.append_record({'n': i})
+    deadline = time.monotonic() + 2
+    while min(s['acked'] for s in writer.status().values()) < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.checkpoint()
+    # Only the record no sink has checkpointed yet is kept
+    assert [line for line in wal.read_text().splitlines()] == ['{"seq": 5, "record": {"n": 4}}']
+
+    writer.append_record({'n': 5})
+    writer.flush()
+    assert len(wal.read_text().splitlines()) == 2
+    writer.close()
+    assert wal.read_text() == ''
+    assert DummySinkWriter.delivered['sqlite'] == [{'n': i} for i in range(6)]
@@ -51,3 +51,94 @@ def test_query_returns_matching_records():
     result = idx.query('bar')
     assert isinstance(result, list)
     assert result == [rec]
+
+
+RECORDS = [
+    {'LoanNumber': '12-345', 'PropertyAddress': '10 Main St, Anytown', 'LinkToStatement': 'https://x/1'},
+    {'LoanNumber': '98765', 'PropertyAddress': '22 Oak Avenue, Springfield', 'LinkToStatement': 'https://x/2'},
+    {'LoanNumber': '55555', 'PropertyAddress': '10 Elm St, Anytown', 'LinkToStatement': 'https://x/3'},
+]
+
+
+def test_search_finds_records_without_llm(monkeypatch):
+    idx = Indexer()
+    monkeypatch.setattr(idx.index, 'query', lambda *a, **k: pytest.fail("search must not call the LLM"), raising=False)
+    for rec in RECORDS:
+        idx.add_record(rec)
+
+    # Loan numbers match regardless of punctuation
+    assert idx.search('12345')[0]['LoanNumber'] == '12-345'
+    # Keyword + similarity: the exact address ranks first
+    assert idx.search('10 main st anytown')[0]['LoanNumber'] == '12-345'
+    # Misspelled address still found through vector similarity
+    assert idx.search('Springfeld Oak Av')[0]['LoanNumber'] == '98765'
+    # Field restriction returns only exact field matches
+    assert [r['LoanNumber'] for r in idx.search('55555', field='LoanNumber')] == ['55555']
+    assert idx.search('https', field='LinkToStatement') == []
+
+
+def test_search_cache_invalidated_on_insert():
+    idx = Indexer()
+    idx.add_record(RECORDS[0])
+    assert [r['LoanNumber'] for r in idx.search('anytown')] == ['12-345']
+    assert [r['LoanNumber'] for r in idx.search('anytown')] == ['12-345']
+    assert idx._cache.hits == 1
+
+    idx.add_record(RECORDS[2])
+    assert {r['LoanNumber'] for r in idx.search('anytown')} == {'12-345', '55555'}
+
+
+def test_search_records_reloaded_from_disk(tmp_path):
+    path = str(tmp_path / "index.json")
+    idx = Indexer(persist_path=path)
+    for rec in RECORDS:
+        idx.add_record(rec)
+    # Queued records are embedded and persisted in one batch
+    idx.flush()
+
+    reloaded = Indexer(persist_path=path)
+    assert reloaded.search('98765')[0]['PropertyAddress'] == '22 Oak Avenue, Springfield'
+
+
+class DummyEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, model, input):
+        self.calls.append(list(input))
+        data = [type('Item', (), {'index': i, 'embedding': [float(len(t)), 1.0, 0.0]})() for i, t in enumerate(input)]
+        return type('Resp', (), {'data': list(reversed(data))})()
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    from langfuse.openai import openai
+    embeddings = DummyEmbeddings()
+    monkeypatch.setattr(openai, 'embeddings', embeddings)
+    return embeddings
+
+
+def test_embeddings_batched_and_cached_across_runs(tmp_path, fake_openai):
+    path = str(tmp_path / "index.json")
+    cfg = {'embeddings': {'provider': 'openai', 'batch_size': 2, 'index_batch_size': 3}}
+    idx = Indexer(persist_path=path, search_config=cfg)
+    for rec in RECORDS:
+        idx.add_record(rec)
+    # Three queued records embedded together, split to the provider batch size
+    assert [len(c) for c in fake_openai.calls] == [2, 1]
+    idx.close()
+
+    fake_openai.calls.clear()
+    reloaded = Indexer(persist_path=path, search_config=cfg)
+    reloaded.reindex()
+    # Every record text comes from the persistent cache
+    assert fake_openai.calls == []
+    assert reloaded.embedder.hits == 6
+    assert reloaded.search('98765')[0]['LoanNumber'] == '98765'
+
+
+def test_openai_batches_respect_token_budget():
+    from modules.embeddings import OpenAIEmbedder
+    embedder = OpenAIEmbedder('m', batch_size=100, max_batch_tokens=10)
+    assert [len(b) for b in embedder.batches(["x" * 15, "y" * 15, "z" * 60])] == [1, 1, 1]
+    assert [len(b) for b in embedder.batches(["a", "b", "c"])] == [3]
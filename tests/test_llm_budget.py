@@ -0,0 +1,132 @@
+# tests/test_llm_budget.py
+import pickle
+
+import pytest
+
+import modules.llm_budget as budget_mod
+from modules.extractor import Extractor
+from modules.llm_budget import BudgetExceeded, LLMBudget
+
+
+@pytest.fixture(autouse=True)
+def offline_tokenizer(monkeypatch):
+    # tiktoken downloads its BPE files on first use; count by length instead
+    monkeypatch.setattr(budget_mod, '_encoding', lambda model: None)
+
+
+def test_totals_per_run_day_and_lender(tmp_path):
+    budget = LLMBudget({'persist_path': str(tmp_path / 'usage.sqlite'),
+                        'prices': {'m': {'prompt': 1.0, 'completion': 2.0}}})
+    assert budget.record('acme', 'm', 1000, 500) == pytest.approx(0.002)
+    budget.record('other', 'm', 100, 0, estimated=True)
+    budget.new_run()
+    budget.record('acme', 'm', 10, 10)
+
+    report = budget.report()
+    assert report['run']['tokens'] == 20
+    assert report['today']['tokens'] == 1620
+    assert report['today']['calls'] == 3
+    assert report['lenders_today']['acme']['prompt_tokens'] == 1010
+
+    # Usage is shared through the file, e.g. with parse worker processes
+    other = pickle.loads(pickle.dumps(budget))
+    assert other.totals()['tokens'] == 1620
+
+
+def test_check_enforces_limits():
+    budget = LLMBudget({'tokens_per_run': 1000, 'lenders': {'acme': {'tokens_per_day': 300}}})
+    budget.check('acme', 'm', 100, 100)
+    budget.record('acme', 'm', 200, 50)
+    with pytest.raises(BudgetExceeded) as exc:
+        budget.check('acme', 'm', 100, 100)
+    assert exc.value.scope == 'lenders.acme.tokens_per_day'
+    budget.check('other', 'm', 500, 200)
+    with pytest.raises(BudgetExceeded) as exc:
+        budget.check('other', 'm', 600, 200)
+    assert exc.value.scope == 'tokens_per_run'
+    with pytest.raises(BudgetExceeded):
+        LLMBudget({'tokens_per_document': 100}).check(None, 'm', 50, 20, document_tokens=40)
+    # Survives the trip back from a worker process
+    assert str(pickle.loads(pickle.dumps(exc.value))) == str(exc.value)
+
+
+def test_check_only_sums_limited_totals(tmp_path, monkeypatch):
+    budget = LLMBudget({'persist_path': str(tmp_path / 'usage.sqlite'), 'tokens_per_day': 10_000})
+    budget.record('acme', 'm', 10, 10)
+    indexes = {row[1] for row in budget._db().execute("PRAGMA index_list(llm_usage)")}
+    assert {'llm_usage_run', 'llm_usage_day'} <= indexes
+
+    queries = []
+    original = budget.totals
+    monkeypatch.setattr(budget, 'totals', lambda **where: queries.append(where) or original(**where))
+    budget.check('acme', 'm', 100, 100)
+    assert [sorted(q) for q in queries] == [['day']]
+    unlimited = LLMBudget({})
+    monkeypatch.setattr(unlimited, 'totals', lambda **where: pytest.fail("no limit, no query"))
+    unlimited.check('acme', 'm', 100, 100)
+
+
+class DummyCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        message = type('Msg', (), {'content': '{"LoanNumber": "42"}'})()
+        choice = type('Choice', (), {'message': message})()
+        usage = type('Usage', (), {'prompt_tokens': 120, 'completion_tokens': 8})()
+        return type('Resp', (), {'choices': [choice], 'usage': usage})()
+
+
+def _extractor(monkeypatch, budget_cfg):
+    import modules.extractor as extractor_module
+    completions = DummyCompletions()
+    monkeypatch.setattr(extractor_module.openai, 'chat', type('Chat', (), {'completions': completions})())
+    lenders = [{"name": "acme", "regex_patterns": {"LoanNumber": r"Loan[:\s]+(?P<value>\d+)"}}]
+    return Extractor(lenders, {"api_key": "test", "model": "m", "max_tokens": 50, "budget": budget_cfg}), completions
+
+
+def test_llm_usage_recorded_from_response(monkeypatch):
+    extractor, completions = _extractor(monkeypatch, {})
+    assert extractor.extract("Loan: none") == {"LoanNumber": "42"}
+    run = extractor.budget.report()['run']
+    assert (run['calls'], run['prompt_tokens'], run['completion_tokens']) == (1, 120, 8)
+
+
+def test_over_budget_goes_to_review_without_llm_call(monkeypatch):
+    extractor, completions = _extractor(monkeypatch, {'tokens_per_run': 60})
+    record = extractor.extract("Loan: none")
+    assert completions.calls == 0
+    assert record['needs_review'] is True
+    assert record['budget_exceeded'] == 'tokens_per_run'
+
+
+def test_over_budget_defer_raises(monkeypatch):
+    extractor, completions = _extractor(monkeypatch, {'tokens_per_run': 60, 'on_exceeded': 'defer'})
+    with pytest.raises(BudgetExceeded):
+        extractor.extract("Loan: none")
+    assert completions.calls == 0
+
+
+def test_cached_tokens_priced_and_reported(tmp_path):
+    budget = LLMBudget({'persist_path': str(tmp_path / 'usage.sqlite'),
+                        'prices': {'m': {'prompt': 1.0, 'cached_prompt': 0.5, 'completion': 2.0}}})
+    assert budget.record('acme', 'm', 2000, 0, cached_tokens=1024, latency_s=0.2) == pytest.approx(0.001488)
+    budget.record('acme', 'm', 2000, 0, latency_s=0.6)
+
+    report = budget.report()
+    assert report['run']['cached_tokens'] == 1024
+    cache = report['prompt_cache']
+    assert (cache['calls'], cache['cached_calls'], cache['cached_share']) == (2, 1, 0.256)
+    assert (cache['latency_s_cached'], cache['latency_s_uncached']) == (0.2, 0.6)
+
+
+def test_cached_tokens_read_from_response(monkeypatch):
+    extractor, completions = _extractor(monkeypatch, {})
+    details = type('Details', (), {'cached_tokens': 64})()
+    usage = type('Usage', (), {'prompt_tokens': 120, 'completion_tokens': 8, 'prompt_tokens_details': details})()
+    message = type('Msg', (), {'content': '{"LoanNumber": "42"}'})()
+    resp = type('Resp', (), {'choices': [type('Choice', (), {'message': message})()], 'usage': usage})()
+    completions.create = lambda **kwargs: resp
+    extractor.extract("Loan: none")
+    assert extractor.budget.report()['prompt_cache']['cached_tokens'] == 64
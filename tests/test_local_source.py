@@ -0,0 +1,56 @@
+# tests/test_local_source.py
+import io
+import tarfile
+import zipfile
+import pytest
+from modules.local_source import LocalSource
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "statements"
+    (root / "2023").mkdir(parents=True)
+    (root / "2024").mkdir()
+    (root / "2023" / "jan.pdf").write_bytes(b"%PDF jan")
+    (root / "2024" / "feb.PDF").write_bytes(b"%PDF feb")
+    (root / "2024" / "notes.txt").write_bytes(b"not a pdf")
+    return root
+
+
+def test_directory_listing_and_download(tree):
+    source = LocalSource({'path': str(tree)})
+    files = list(source.iter_new_pdfs())
+    assert [f['id'] for f in files] == ["2023/jan.pdf", "2024/feb.PDF"]
+    assert files[0]['size'] == str(len(b"%PDF jan"))
+    assert files[0]['webViewLink'].startswith("file://")
+    assert source.download_file("2024/feb.PDF") == b"%PDF feb"
+
+
+def test_zip_archive(tmp_path):
+    path = tmp_path / "backfill.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("a/one.pdf", b"%PDF one")
+        zf.writestr("a/readme.md", b"skip")
+    source = LocalSource({'path': str(path)})
+    files = source.list_new_pdfs()
+    assert [f['id'] for f in files] == ["backfill.zip::a/one.pdf"]
+    assert source.download_file(files[0]['id']) == b"%PDF one"
+    source.close()
+
+
+def test_tar_archive(tmp_path):
+    path = tmp_path / "backfill.tar.gz"
+    with tarfile.open(path, "w:gz") as tar:
+        for name, data in [("x/one.pdf", b"%PDF one"), ("x/two.pdf", b"%PDF two")]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    source = LocalSource({'path': str(path)})
+    ids = [f['id'] for f in source.iter_new_pdfs()]
+    assert ids == ["backfill.tar.gz::x/one.pdf", "backfill.tar.gz::x/two.pdf"]
+    assert source.download_file(ids[1]) == b"%PDF two"
+
+
+def test_missing_path_raises(tmp_path):
+    with pytest.raises(ValueError):
+        LocalSource({'path': str(tmp_path / "nope")})
@@ -0,0 +1,42 @@
+# tests/test_patterns.py
+import pytest
+import yaml
+
+from modules import patterns
+from modules.extractor import Extractor
+
+
+def test_config_patterns_pass_lint():
+    with open("config.yaml") as f:
+        cfg = yaml.safe_load(f)
+    assert patterns.lint_lenders(cfg["lenders"]) == []
+
+
+def test_exponential_pattern_rejected():
+    problem = patterns.lint_pattern(r"Balance: (a+)+b", timeout=0.05)
+    assert problem and "timed out" in problem
+
+
+def test_quadratic_pattern_rejected():
+    problem = patterns.lint_pattern(r"Amount.*?Total.*?\$(\d+)", size=8000)
+    assert problem and "super-linear" in problem
+
+
+def test_invalid_pattern_rejected():
+    assert "does not compile" in patterns.lint_pattern(r"Date: (?P<value>\d+")
+
+
+def test_extractor_refuses_bad_lender_pattern():
+    lenders = [{"name": "bad", "regex_patterns": {"Amount": r"Amount.*?Total.*?\$(?P<value>\d+)"}}]
+    with pytest.raises(patterns.PatternLintError) as exc:
+        Extractor(lenders, {"model": "gpt-4"}, {"lint_size": 8000})
+    assert exc.value.problems[0].startswith("bad.Amount:")
+
+
+def test_search_timeout_counts_as_no_match():
+    lenders = [{"name": "slow", "regex_patterns": {"Foo": r"(a+)+(?P<value>b)"}}]
+    extractor = Extractor(lenders, {"model": "gpt-4"}, {"lint": False, "timeout_s": 0.05})
+    assert extractor.extract_with_regex("a" * 3000) == {}
+    assert extractor.regex_timeouts["Foo"] == 1
+    # Patterns still match normally within the limit
+    assert extractor.extract_with_regex("aab") == {"Foo": "b"}
@@ -1,4 +1,6 @@
 # tests/test_pdf_parser.py
+import threading
+import types
 import pytest
 import pdfplumber
 from modules.pdf_parser import PDFParser
@@ -6,10 +8,14 @@ from modules.pdf_parser import PDFParser
 class DummyPage:
     def __init__(self, text):
         self._text = text
+        self.closed = False
 
     def extract_text(self):
         return self._text
 
+    def close(self):
+        self.closed = True
+
 class DummyPDF:
     def __init__(self, pages):
         self.pages = pages
@@ -48,3 +54,337 @@ def test_ocr_fallback_when_pdfplumber_empty(parser, monkeypatch):
     result = parser.extract_text(b"fake pdf bytes")
     # Should be OCR fallback result
     assert result == "OCR output text"
+
+
+def test_iter_pages_streams_and_releases_pages(parser, monkeypatch):
+    pages = [DummyPage("Page 1 text"), DummyPage("Page 2 text"), DummyPage("Page 3 text")]
+    monkeypatch.setattr(pdfplumber, 'open', lambda stream: DummyPDF(pages))
+
+    stream = parser.iter_pages(b"fake pdf bytes")
+    assert next(stream) == "Page 1 text"
+    # Page cache is released as soon as its text has been yielded
+    assert pages[0].closed
+    stream.close()
+    # Closing early leaves the remaining pages unparsed
+    assert not pages[1].closed
+    assert not pages[2].closed
+
+
+def test_iter_pages_ocr_fallback(parser, monkeypatch):
+    dummy_pdf = DummyPDF([DummyPage(""), DummyPage(None)])
+    monkeypatch.setattr(pdfplumber, 'open', lambda stream: dummy_pdf)
+    monkeypatch.setattr(PDFParser, '_ocr_extract', lambda self, b: "OCR output text")
+
+    result = list(parser.iter_pages(b"fake pdf bytes"))
+    assert result == ["", "", "OCR output text"]
+
+
+class FakeBackend:
+    layout_aware = False
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+        self.reads = 0
+
+    def available(self):
+        return True
+
+    def iter_pages(self, pdf_bytes, pages=None):
+        self.reads += 1
+        yield self.text
+
+
+@pytest.fixture
+def fake_backends(monkeypatch):
+    from modules import text_backends
+    fast = FakeBackend('fast', "Statement Date: 01/01/2025")
+    layout = FakeBackend('layout', "Statement Date: 01/01/2025\nPrincipal: $10.00")
+    monkeypatch.setitem(text_backends.BACKENDS, 'fast', fast)
+    monkeypatch.setitem(text_backends.BACKENDS, 'layout', layout)
+    return fast, layout
+
+
+def score(text):
+    return "bank", sum(label in text for label in ("Statement Date", "Principal")) / 2
+
+
+def test_auto_mode_keeps_fast_backend_when_hit_rate_is_high(fake_backends):
+    fast, layout = fake_backends
+    fast.text = layout.text
+    parser = PDFParser({}, {'backend': 'auto', 'auto_order': ['fast', 'layout']})
+    assert parser.adaptive
+    assert parser.extract_best(b"pdf", score) == layout.text
+    assert (fast.reads, layout.reads) == (1, 0)
+    assert parser.backend_usage == {'fast': 1}
+
+
+def test_auto_mode_switches_when_hit_rate_drops(fake_backends):
+    fast, layout = fake_backends
+    parser = PDFParser({}, {'backend': 'auto', 'auto_order': ['fast', 'layout'], 'min_hit_rate': 1.0})
+    assert parser.extract_best(b"pdf", score) == layout.text
+    assert (fast.reads, layout.reads) == (1, 1)
+    assert parser.backend_usage == {'layout': 1}
+
+
+def test_lender_backend_overrides_auto_choice(fake_backends):
+    fast, layout = fake_backends
+    fast.text = layout.text
+    parser = PDFParser({}, {'backend': 'fast', 'lender_backends': {'bank': 'layout'}})
+    assert parser.adaptive
+    assert parser.extract_best(b"pdf", score) == layout.text
+    assert parser.backend_usage == {'layout': 1}
+
+
+def test_unknown_backend_rejected():
+    with pytest.raises(ValueError):
+        PDFParser({}, {'backend': 'nope'})
+
+
+def test_installed_backends_agree_on_simple_pdf():
+    from benchmarks.bench_parsers import make_pdf
+    from modules.text_backends import available_backends
+    pdf = make_pdf([["Statement Date: 02/20/2025", "Principal Balance: $1,000.00"], ["Page two"]])
+    parser = PDFParser({})
+    for name in available_backends():
+        pages = [p.strip() for p in parser.iter_pages(pdf, backend=name)]
+        assert pages == ["Statement Date: 02/20/2025\nPrincipal Balance: $1,000.00", "Page two"], name
+
+
+def test_page_cap_degrades_instead_of_failing(monkeypatch):
+    pages = [DummyPage(f"Page {i}") for i in range(5)]
+    monkeypatch.setattr(pdfplumber, 'open', lambda stream: DummyPDF(pages))
+    monkeypatch.setattr(PDFParser, '_ocr_extract', lambda self, b: pytest.fail("no OCR when degraded"))
+    parser = PDFParser({}, {'max_pages': 2})
+    assert parser.memory_bounded
+
+    stream = parser.iter_pages(b"fake pdf bytes")
+    assert list(stream) == ["Page 0", "Page 1"]
+    assert "more than 2 page(s)" in stream.degraded
+    assert stream.pages_read == 2
+
+
+def test_page_cap_not_degraded_at_exact_limit(monkeypatch):
+    monkeypatch.setattr(pdfplumber, 'open', lambda stream: DummyPDF([DummyPage("a"), DummyPage("b")]))
+    stream = PDFParser({}, {'max_pages': 2}).iter_pages(b"fake pdf bytes")
+    assert list(stream) == ["a", "b"]
+    assert stream.degraded is None
+
+
+def test_memory_cap_stops_after_current_page(monkeypatch):
+    import modules.pdf_parser as pdf_parser_mod
+    rss = iter([100, 100, 100 + 2 * 1024 * 1024, 100 + 2 * 1024 * 1024])
+    monkeypatch.setattr(pdf_parser_mod, '_rss_bytes', lambda: next(rss))
+    pages = [DummyPage("Page 0"), DummyPage("Page 1"), DummyPage("Page 2")]
+    monkeypatch.setattr(pdfplumber, 'open', lambda stream: DummyPDF(pages))
+
+    stream = PDFParser({}, {'max_memory_mb': 1}).iter_pages(b"fake pdf bytes")
+    assert list(stream) == ["Page 0", "Page 1"]
+    assert "memory grew by 2 MB" in stream.degraded
+    assert not pages[2].closed
+
+
+def test_degraded_document_is_flagged_for_review(monkeypatch):
+    from modules.processing_chain import parse_and_extract
+    pages = [DummyPage("Statement Date: 01/01/2025") for _ in range(3)]
+    monkeypatch.setattr(pdfplumber, 'open', lambda stream: DummyPDF(pages))
+
+    class Extractor:
+        def extract_pages(self, page_iter):
+            return {"text": "\n".join(page_iter)}
+
+    record = parse_and_extract(PDFParser({}, {'max_pages': 1}), Extractor(), False, b"pdf")
+    assert record["needs_review"] is True
+    assert record["text"] == "Statement Date: 01/01/2025"
+    assert "more than 1 page(s)" in record["degraded"]
+
+
+def test_caps_apply_to_adaptive_backend_choice_and_skip_the_llm(fake_backends):
+    from modules.processing_chain import parse_and_extract
+    fast, layout = fake_backends
+    extracted = []
+
+    def three_pages(pdf_bytes, pages=None):
+        for i, text in enumerate(["Statement Date: 01/01/2025", "Principal: $10.00", "more"]):
+            if pages is not None and i not in pages:
+                yield ""
+                continue
+            extracted.append(i)
+            yield text
+
+    fast.iter_pages = three_pages
+    parser = PDFParser({}, {'backend': 'auto', 'auto_order': ['fast', 'layout'], 'max_pages': 1})
+
+    class Extractor:
+        def score_text(self, text):
+            return score(text)
+
+        def extract(self, text, llm=True):
+            assert llm is False
+            return {"text": text}
+
+    record = parse_and_extract(parser, Extractor(), False, b"pdf")
+    assert record["text"] == "Statement Date: 01/01/2025"
+    assert record["needs_review"] is True and "more than 1 page(s)" in record["degraded"]
+    # The page over the cap is never extracted
+    assert extracted == [0]
+    # A cut-short read ends the backend search: the next one would be cut short too
+    assert layout.reads == 0
+    assert parser.backend_usage == {'fast': 1}
+
+
+def _routing_pdf(pages=None) -> bytes:
+    """
+    By default four pages: text, a full-page scan, blank, and a scan with
+    an invisible OCR text layer. `pages` gives (content, resources) pairs.
+    """
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        "<< /Type /XObject /Subtype /Image /Width 1 /Height 1 /ColorSpace /DeviceGray "
+        "/BitsPerComponent 8 /Length 1 >>\nstream\n\xff\nendstream",
+    ]
+    scan = "q 612 0 0 792 0 0 cm /Im1 Do Q"
+    layer = "BT /F1 10 Tf 3 Tr 72 700 Td (Statement Date: 03/01/2025) Tj ET"
+    pages = pages or [
+        ("BT /F1 10 Tf 72 700 Td (Statement Date: 02/20/2025) Tj ET", "/Font << /F1 3 0 R >>"),
+        (scan, "/XObject << /Im1 4 0 R >>"),
+        ("", ""),
+        (scan + "\n" + layer, "/Font << /F1 3 0 R >> /XObject << /Im1 4 0 R >>"),
+    ]
+    kids = []
+    for content, resources in pages:
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << {resources} >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(out)
+
+
+def test_page_classifier_reads_raw_objects():
+    from modules.page_classifier import PageClassifier
+    pages = PageClassifier().classify(_routing_pdf())
+    assert [p['kind'] for p in pages] == ['text', 'ocr', 'empty', 'text']
+    assert pages[0]['chars'] == len("Statement Date: 02/20/2025") and pages[0]['fonts']
+    assert pages[1]['image_coverage'] == 1.0 and not pages[1]['fonts']
+
+
+def test_page_classifier_handles_nested_parentheses_and_textless_fonts():
+    from modules.page_classifier import PageClassifier
+    font = "/Font << /F1 3 0 R >>"
+    pdf = _routing_pdf([
+        ("BT /F1 10 Tf 72 700 Td ((555) 123-4567 and more text here ok) Tj ET", font),
+        # Fonts but no string operands the scanner recognises
+        ("BT /F1 10 Tf 72 700 Td ET", font),
+        ("", ""),
+    ])
+    pages = PageClassifier().classify(pdf)
+    assert [p['kind'] for p in pages] == ['text', 'text', 'empty']
+    assert pages[0]['chars'] == len("(555) 123-4567 and more text here ok")
+    assert PDFParser({}).extract_text(pdf).strip() == "(555) 123-4567 and more text here ok"
+
+
+def test_scanned_pages_routed_to_ocr_without_text_extraction(monkeypatch):
+    from modules import text_backends
+    extracted = []
+    original = text_backends.PdfplumberBackend.iter_pages
+
+    def spy(self, pdf_bytes, pages=None):
+        extracted.append(pages)
+        return original(self, pdf_bytes, pages)
+
+    monkeypatch.setattr(text_backends.PdfplumberBackend, 'iter_pages', spy)
+    monkeypatch.setattr(PDFParser, '_ocr_page', lambda self, b, i: f"OCR page {i + 1}")
+    monkeypatch.setattr(PDFParser, '_ocr_extract', lambda self, b: pytest.fail("no whole-document OCR"))
+    parser = PDFParser({})
+
+    pages = [p.strip() for p in parser.iter_pages(_routing_pdf())]
+    assert pages == ["Statement Date: 02/20/2025", "OCR page 2", "", "Statement Date: 03/01/2025"]
+    assert [[i for i in range(4) if i in routes] for routes in extracted] == [[0, 3]]
+    assert parser.page_routes == {'text': 2, 'ocr': 1, 'empty': 1}
+    # Nothing about the document is kept once the stream is done
+    assert not vars(parser._memo)
+
+    # Disabled: every page goes through the text backend as before
+    extracted.clear()
+    plain = PDFParser({}, {'page_routing': {'enabled': False}})
+    assert [p.strip() for p in plain.iter_pages(_routing_pdf())][1] == ""
+    assert extracted == [None]
+
+
+def test_pages_are_classified_lazily_within_the_page_cap(monkeypatch):
+    monkeypatch.setattr(PDFParser, '_ocr_page', lambda self, b, i: f"OCR page {i + 1}")
+    parser = PDFParser({}, {'max_pages': 1})
+    stream = parser.iter_pages(_routing_pdf())
+    assert [p.strip() for p in stream] == ["Statement Date: 02/20/2025"]
+    assert stream.degraded
+    # Page 2 was found over the cap without being classified or OCRed
+    assert parser.page_routes == {'text': 1}
+
+
+def test_extract_best_drops_the_document_memo(monkeypatch):
+    monkeypatch.setattr(PDFParser, '_ocr_page', lambda self, b, i: f"OCR page {i + 1}")
+    parser = PDFParser({}, {'backend': 'auto', 'auto_order': ['pdfplumber', 'pypdf'], 'min_hit_rate': 1.0})
+    text = parser.extract_best(_routing_pdf(), lambda t: (None, 0.0))
+    assert "OCR page 2" in text
+    # Both backends shared one classification, then the memo was dropped
+    assert parser.page_routes == {'text': 2, 'ocr': 1, 'empty': 1}
+    assert not vars(parser._memo)
+
+
+def test_pdfium_calls_are_serialized(monkeypatch):
+    import modules.pdf_parser as pp_mod
+    import modules.text_backends as tb_mod
+    from modules.text_backends import PDFIUM_LOCK, Pypdfium2Backend
+    unlocked = []
+
+    def check(call):
+        # Another thread can take the lock only if the call runs without it
+        def probe():
+            if PDFIUM_LOCK.acquire(blocking=False):
+                PDFIUM_LOCK.release()
+                unlocked.append(call)
+        thread = threading.Thread(target=probe)
+        thread.start()
+        thread.join()
+
+    class FakeObj:
+        def __init__(self, name):
+            self.name = name
+        def __getattr__(self, attr):
+            def call(*args, **kwargs):
+                check(f"{self.name}.{attr}")
+                return FakeObj(attr) if attr != 'get_text_bounded' else "text"
+            return call
+        def __len__(self):
+            check('len')
+            return 2
+        def __getitem__(self, i):
+            check('getitem')
+            return FakeObj('page')
+
+    def document(data):
+        check('PdfDocument')
+        return FakeObj('pdf')
+
+    fake = types.SimpleNamespace(PdfDocument=document)
+    monkeypatch.setattr(tb_mod, 'pdfium', fake)
+    monkeypatch.setattr(pp_mod, 'pdfium', fake)
+    monkeypatch.setattr(pp_mod, 'pytesseract', types.SimpleNamespace(image_to_string=lambda image, lang: "ocr"))
+    assert list(Pypdfium2Backend().iter_pages(b"%PDF")) == ["text", "text"]
+    assert PDFParser(ocr_config={})._ocr_page(b"%PDF", 0) == "ocr"
+    assert unlocked == []
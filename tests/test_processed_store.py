@@ -0,0 +1,70 @@
+# tests/test_processed_store.py
+import json
+from modules.processed_store import ProcessedStore
+
+
+def test_loads_legacy_list_format(tmp_path):
+    path = tmp_path / "processed.json"
+    path.write_text(json.dumps(["a", "b"]))
+    store = ProcessedStore(store_path=str(path))
+    assert store.has_processed("a")
+    assert store.has_processed("b")
+    assert store.find_by_checksum("abc") is None
+
+
+def test_checksum_index_and_duplicates_persist(tmp_path):
+    path = str(tmp_path / "processed.json")
+    store = ProcessedStore(store_path=path)
+    store.mark_processed("file1", checksum="md5-1")
+    store.link_duplicate("file2", "file1")
+
+    reloaded = ProcessedStore(store_path=path)
+    assert reloaded.find_by_checksum("md5-1") == "file1"
+    assert reloaded.has_processed("file2")
+    assert reloaded.original_of("file2") == "file1"
+
+
+def test_failures_quarantine_and_release(tmp_path):
+    path = str(tmp_path / "processed.json")
+    store = ProcessedStore(store_path=path)
+    assert store.record_failure("bad", "StageTimeout: parse", max_failures=2) is False
+    assert store.failure_count("bad") == 1
+    assert store.record_failure("bad", "StageTimeout: parse", max_failures=2) is True
+
+    reloaded = ProcessedStore(store_path=path)
+    assert reloaded.is_quarantined("bad")
+    assert reloaded.quarantined()["bad"]["failures"] == 2
+    assert not reloaded.has_processed("bad")
+
+    reloaded.release("bad")
+    assert not ProcessedStore(store_path=path).is_quarantined("bad")
+
+
+def test_success_clears_failure_count(tmp_path):
+    store = ProcessedStore(store_path=str(tmp_path / "processed.json"))
+    store.record_failure("flaky", "timeout")
+    store.mark_processed("flaky")
+    assert store.failure_count("flaky") == 0
+
+
+def test_batched_store_saves_on_flush(tmp_path):
+    path = tmp_path / "processed.json"
+    store = ProcessedStore(store_path=str(path), autoflush=False)
+    store.mark_processed("a", checksum="md5-a")
+    store.link_duplicate("b", "a")
+    store.record_failure("c", "timeout")
+    assert not path.exists()
+
+    store.flush()
+    reloaded = ProcessedStore(store_path=str(path))
+    assert reloaded.has_processed("a") and reloaded.original_of("b") == "a"
+    assert reloaded.failure_count("c") == 1
+    assert not (tmp_path / "processed.json.tmp").exists()
+
+
+def test_unreadable_store_is_kept_aside(tmp_path):
+    path = tmp_path / "processed.json"
+    path.write_text('{"processed": ["a", "b"')
+    store = ProcessedStore(store_path=str(path))
+    assert not store.has_processed("a")
+    assert (tmp_path / "processed.json.corrupt").read_text() == '{"processed": ["a", "b"'
@@ -51,10 +51,10 @@ def stub_chain(monkeypatch):
     # Monkeypatch the instantiation inside ProcessingChain
     import modules.processing_chain as pc_mod
     monkeypatch.setattr(pc_mod, 'DriveWatcher', lambda cfg: watcher)
-    monkeypatch.setattr(pc_mod, 'PDFParser', lambda cfg: parser)
+    monkeypatch.setattr(pc_mod, 'PDFParser', lambda cfg, parser_cfg=None: parser)
 
     # Sequence extractor calls: first returns extractor1 results, then extractor2
-    def fake_extractor_factory(cfg1, cfg2):
+    def fake_extractor_factory(cfg1, cfg2, cfg3=None):
         class E:
             def __init__(self):
                 self._count = 0
@@ -76,7 +76,357 @@ def test_processing_chain_calls_components(stub_chain):
     result = chain({})
     # Should process both files, but write only one (the second)
     assert result['processed'] == 2
-    assert writer.records == [{"needs_review": False, "foo": "bar"}]
+    # Written with the fields upsert is keyed on, validated or not
+    assert writer.records == [{
+        "needs_review": False, "foo": "bar",
+        "StatementFileName": "", "LinkToStatement": "https://drive.google.com/file/d/2/view",
+    }]
 
 
+def test_processing_chain_validates_records_in_batches(monkeypatch, tmp_path):
+    import modules.processing_chain as pc_mod
+    files = [{"id": "1", "name": "a.pdf"}, {"id": "2", "name": "b.pdf"}]
+    watcher = DummyWatcher(files)
+    writer = DummyWriter()
+    good = {
+        "StatementDate": "01/15/2025",
+        "MostRecentPaymentAmount": "$1,234.56",
+        "AmountPrincipal": "2,000.00",
+        "AmountInterest": "150.50",
+        "AmountTaxInsurance": "$75.25",
+        "AmountUnpaidBalance": "10,000.00",
+        "AmountInterestRate": "3.75%",
+        "PastDueAmount": "$200.00",
+        "PropertyAddress": "123 Main St",
+    }
+    results = iter([dict(good), dict(good, AmountPrincipal="unknown")])
+    monkeypatch.setattr(pc_mod, 'DriveWatcher', lambda cfg: watcher)
+    monkeypatch.setattr(pc_mod, 'PDFParser', lambda cfg, parser_cfg=None: DummyParser())
+    monkeypatch.setattr(pc_mod, 'Extractor', lambda c1, c2, c3=None: type('E', (), {'extract': lambda self, t: next(results)})())
+    monkeypatch.setattr(pc_mod, 'Writer', lambda cfg: writer)
+
+    chain = ProcessingChain({
+        'validation': {'enabled': True, 'batch_size': 10},
+        'store': {'persist_path': str(tmp_path / 'processed.json')},
+    })
+    chain({})
+
+    # Only the valid record is written, typed and with file metadata filled in
+    assert len(writer.records) == 1
+    row = writer.records[0]
+    assert row['StatementFileName'] == 'a.pdf'
+    assert row['StatementDate'] == '2025-01-15'
+    assert row['AmountPrincipal'] == 2000.0
+    assert row['LinkToStatement'] == 'https://drive.google.com/file/d/1/view'
+    assert chain.store.has_processed('1')
+    assert not chain.store.has_processed('2')
+
+
+def test_processing_chain_skips_duplicate_content(monkeypatch, tmp_path):
+    import modules.processing_chain as pc_mod
+    files = [
+        {"id": "1", "name": "a.pdf", "md5Checksum": "aaa"},
+        {"id": "2", "name": "a (1).pdf", "md5Checksum": "aaa"},
+        {"id": "3", "name": "b.pdf", "md5Checksum": "bbb"},
+    ]
+    watcher = DummyWatcher(files)
+    writer = DummyWriter()
+    monkeypatch.setattr(pc_mod, 'DriveWatcher', lambda cfg: watcher)
+    monkeypatch.setattr(pc_mod, 'PDFParser', lambda cfg, parser_cfg=None: DummyParser())
+    monkeypatch.setattr(pc_mod, 'Extractor', lambda c1, c2, c3=None: DummyExtractor({"foo": "bar"}))
+    monkeypatch.setattr(pc_mod, 'Writer', lambda cfg: writer)
+
+    store_path = str(tmp_path / 'processed.json')
+    chain = ProcessingChain({'store': {'persist_path': store_path}})
+    chain.store.mark_processed("0", checksum="bbb")
+    result = chain({})
+
+    # Only the first copy of "aaa" is downloaded; "bbb" was already known
+    assert watcher.downloaded == ["1"]
+    assert result['duplicates'] == 2
+    assert chain.store.original_of("2") == "1"
+    assert chain.store.original_of("3") == "0"
+
+
+def test_processing_chain_local_source_parallel(monkeypatch, tmp_path):
+    import modules.processing_chain as pc_mod
+    root = tmp_path / "backfill"
+    root.mkdir()
+    for i in range(20):
+        (root / f"stmt_{i:02d}.pdf").write_bytes(f"pdf-{i}".encode())
+
+    class EchoParser:
+        def extract_text(self, pdf_bytes):
+            return pdf_bytes.decode()
+
+    class EchoExtractor:
+        def extract(self, text):
+            return {"text": text}
+
+    writer = DummyWriter()
+    monkeypatch.setattr(pc_mod, 'PDFParser', lambda cfg, parser_cfg=None: EchoParser())
+    monkeypatch.setattr(pc_mod, 'Extractor', lambda c1, c2, c3=None: EchoExtractor())
+    monkeypatch.setattr(pc_mod, 'Writer', lambda cfg: writer)
+
+    chain = ProcessingChain({
+        'source': {'type': 'local', 'path': str(root)},
+        'processing': {'workers': 4},
+        'store': {'persist_path': str(tmp_path / 'processed.json')},
+    })
+    result = chain({})
+
+    assert result['processed'] == 20
+    # Results are written in listing order regardless of worker scheduling
+    assert [r['text'] for r in writer.records] == [f"pdf-{i}" for i in range(20)]
+    assert chain.store.has_processed("stmt_19.pdf")
+
+
+def test_processing_chain_schedules_smallest_first(monkeypatch, tmp_path):
+    import modules.processing_chain as pc_mod
+    files = [
+        {"id": "big", "name": "big.pdf", "size": "900000"},
+        {"id": "small", "name": "small.pdf", "size": "1000"},
+    ]
+    watcher = DummyWatcher(files)
+    monkeypatch.setattr(pc_mod, 'DriveWatcher', lambda cfg: watcher)
+    monkeypatch.setattr(pc_mod, 'PDFParser', lambda cfg, parser_cfg=None: DummyParser())
+    monkeypatch.setattr(pc_mod, 'Extractor', lambda c1, c2, c3=None: DummyExtractor({"foo": "bar"}))
+    monkeypatch.setattr(pc_mod, 'Writer', lambda cfg: DummyWriter())
+
+    chain = ProcessingChain({
+        'store': {'persist_path': str(tmp_path / 'processed.json')},
+        'scheduling': {'policy': 'smallest'},
+    })
+    result = chain({})
+
+    assert watcher.downloaded == ["small", "big"]
+    assert result['queue']['policy'] == 'smallest'
+    assert set(result['queue']['waits']) == {"small", "big"}
+
+
+class HangingParser:
+    def extract_text(self, pdf_bytes):
+        if pdf_bytes == b"poison":
+            import time
+            time.sleep(30)
+        return "parsed-text"
+
+
+class CountingParser:
+    def __init__(self):
+        from collections import Counter
+        self.backend_usage = Counter()
+
+    def extract_text(self, pdf_bytes):
+        self.backend_usage['fast'] += 1
+        return "parsed-text"
+
+
+def test_processing_chain_merges_worker_usage_counters(monkeypatch, tmp_path):
+    import modules.processing_chain as pc_mod
+    files = [{"id": "1", "name": "a.pdf"}, {"id": "2", "name": "b.pdf"}]
+    monkeypatch.setattr(pc_mod, 'DriveWatcher', lambda cfg: DummyWatcher(files))
+    monkeypatch.setattr(pc_mod, 'PDFParser', lambda cfg, parser_cfg=None: CountingParser())
+    monkeypatch.setattr(pc_mod, 'Extractor', lambda c1, c2, c3=None: DummyExtractor({"foo": "bar"}))
+    monkeypatch.setattr(pc_mod, 'Writer', lambda cfg: DummyWriter())
+    chain = ProcessingChain({
+        'store': {'persist_path': str(tmp_path / 'processed.json')},
+        'processing': {'timeouts': {'parse_s': 30}},
+    })
+    chain({})
+    # Parsed in worker processes, counted here
+    assert chain.parser.backend_usage == {'fast': 2}
+
+
+def test_processing_chain_times_out_and_quarantines_bad_file(monkeypatch, tmp_path):
+    import modules.processing_chain as pc_mod
+
+    class Watcher(DummyWatcher):
+        def download_file(self, file_id):
+            self.downloaded.append(file_id)
+            return b"poison" if file_id == "bad" else b"pdf-bytes"
 
+    watcher = Watcher([{"id": "bad", "name": "bad.pdf"}, {"id": "good", "name": "good.pdf"}])
+    writer = DummyWriter()
+    monkeypatch.setattr(pc_mod, 'DriveWatcher', lambda cfg: watcher)
+    monkeypatch.setattr(pc_mod, 'PDFParser', lambda cfg, parser_cfg=None: HangingParser())
+    monkeypatch.setattr(pc_mod, 'Extractor', lambda c1, c2, c3=None: DummyExtractor({"foo": "bar"}))
+    monkeypatch.setattr(pc_mod, 'Writer', lambda cfg: writer)
+
+    chain = ProcessingChain({
+        'store': {'persist_path': str(tmp_path / 'processed.json')},
+        'processing': {'timeouts': {'parse_s': 0.5}, 'max_failures': 2},
+    })
+    first = chain({})
+    # The hanging file is cut off; the good one is still written
+    assert [(r["foo"], r["StatementFileName"]) for r in writer.records] == [("bar", "good.pdf")]
+    assert [(f['id'], f['quarantined']) for f in first['failed']] == [("bad", False)]
+    assert "parse timed out" in first['failed'][0]['error']
+
+    second = chain({})
+    assert second['failed'][0]['quarantined'] is True
+    assert second['quarantined'] == ["bad"]
+
+    watcher.downloaded = []
+    chain({})
+    # Quarantined files are no longer attempted
+    assert watcher.downloaded == []
+
+
+def test_processing_chain_defers_files_over_llm_budget(monkeypatch, tmp_path):
+    import modules.processing_chain as pc_mod
+    from modules.llm_budget import BudgetExceeded
+
+    class BudgetExtractor:
+        def extract(self, text):
+            raise BudgetExceeded('tokens_per_day', 1000, 1200)
+
+    watcher = DummyWatcher([{"id": "1", "name": "a.pdf"}])
+    writer = DummyWriter()
+    monkeypatch.setattr(pc_mod, 'DriveWatcher', lambda cfg: watcher)
+    monkeypatch.setattr(pc_mod, 'PDFParser', lambda cfg, parser_cfg=None: DummyParser())
+    monkeypatch.setattr(pc_mod, 'Extractor', lambda c1, c2, c3=None: BudgetExtractor())
+    monkeypatch.setattr(pc_mod, 'Writer', lambda cfg: writer)
+
+    chain = ProcessingChain({'store': {'persist_path': str(tmp_path / 'processed.json')}})
+    result = chain({})
+
+    assert result['deferred'] == 1
+    assert result['failed'] == []
+    assert writer.records == []
+    # Not marked processed, so the next run picks it up again
+    assert not chain.store.has_processed("1")
+
+
+def test_processing_chain_marks_degraded_files_sent_to_review(monkeypatch, tmp_path):
+    import modules.processing_chain as pc_mod
+    watcher = DummyWatcher([{"id": "big", "name": "big.pdf"}, {"id": "odd", "name": "odd.pdf"}])
+    writer = DummyWriter()
+    notified = []
+
+    class CappedExtractor:
+        def extract(self, text):
+            self.calls = getattr(self, 'calls', 0) + 1
+            if self.calls % 2:
+                return {"needs_review": True, "degraded": "document has more than 1 page(s); read 1 page(s)"}
+            return {"needs_review": True}
+
+    monkeypatch.setattr(pc_mod, 'DriveWatcher', lambda cfg: watcher)
+    monkeypatch.setattr(pc_mod, 'PDFParser', lambda cfg, parser_cfg=None: DummyParser())
+    monkeypatch.setattr(pc_mod, 'Extractor', lambda c1, c2, c3=None: CappedExtractor())
+    monkeypatch.setattr(pc_mod, 'Writer', lambda cfg: writer)
+    chain = ProcessingChain({'store': {'persist_path': str(tmp_path / 'processed.json')}})
+    monkeypatch.setattr(chain, '_notify', notified.append)
+    chain({})
+
+    assert len(notified) == 2 and writer.records == []
+    # The degraded file is handled once in review; the other is retried
+    assert chain.store.has_processed("big")
+    assert not chain.store.has_processed("odd")
+    watcher.downloaded = []
+    chain({})
+    assert watcher.downloaded == ["odd"]
+
+
+def test_processing_chain_marks_files_processed_at_checkpoints(monkeypatch, tmp_path):
+    import modules.processing_chain as pc_mod
+    files = [{"id": str(i), "name": f"{i}.pdf"} for i in range(5)]
+    events = []
+
+    class CheckpointWriter(DummyWriter):
+        def append_record(self, record):
+            events.append(('write', sorted(chain.store._processed)))
+            super().append_record(record)
+
+        def checkpoint(self):
+            events.append(('checkpoint', len(self.records)))
+
+        def close(self):
+            events.append(('close', None))
+
+    writer = CheckpointWriter()
+    monkeypatch.setattr(pc_mod, 'DriveWatcher', lambda cfg: DummyWatcher(files))
+    monkeypatch.setattr(pc_mod, 'PDFParser', lambda cfg, parser_cfg=None: DummyParser())
+    monkeypatch.setattr(pc_mod, 'Extractor', lambda c1, c2, c3=None: DummyExtractor({"foo": "bar"}))
+    monkeypatch.setattr(pc_mod, 'Writer', lambda cfg: writer)
+    chain = ProcessingChain({
+        'output': {'checkpoint_every': 2, 'checkpoint_s': 0},
+        'store': {'persist_path': str(tmp_path / 'processed.json')},
+    })
+    chain({})
+
+    assert [e for e in events if e[0] != 'write'] == [('checkpoint', 2), ('checkpoint', 4), ('checkpoint', 5), ('close', None)]
+    # Nothing is marked processed before the checkpoint covering it
+    assert events[1] == ('write', [])
+    assert events[3] == ('write', ['0', '1'])
+    assert all(chain.store.has_processed(f['id']) for f in files)
+
+
+def test_processing_chain_counts_write_failures_per_file(monkeypatch, tmp_path):
+    import modules.processing_chain as pc_mod
+    files = [{"id": "1", "name": "a.pdf"}, {"id": "2", "name": "b.pdf"}, {"id": "3", "name": "c.pdf"}]
+    results = iter([{"n": 1}, {"n": 2}, {"n": 3}])
+
+    class FlakyWriter(DummyWriter):
+        checkpoints = 0
+
+        def append_record(self, record):
+            if record["n"] == 2:
+                raise IOError("disk full")
+            super().append_record(record)
+
+        def checkpoint(self):
+            self.checkpoints += 1
+            if self.checkpoints == 1:
+                raise IOError("commit failed")
+
+    writer = FlakyWriter()
+    monkeypatch.setattr(pc_mod, 'DriveWatcher', lambda cfg: DummyWatcher(files))
+    monkeypatch.setattr(pc_mod, 'PDFParser', lambda cfg, parser_cfg=None: DummyParser())
+    monkeypatch.setattr(pc_mod, 'Extractor', lambda c1, c2, c3=None: type('E', (), {'extract': lambda self, t: next(results)})())
+    monkeypatch.setattr(pc_mod, 'Writer', lambda cfg: writer)
+    chain = ProcessingChain({
+        'output': {'checkpoint_every': 1, 'checkpoint_s': 0},
+        'store': {'persist_path': str(tmp_path / 'processed.json')},
+    })
+    result = chain({})
+
+    # The failed append and the failed checkpoint each fail their file only
+    assert sorted(f['id'] for f in result['failed']) == ['1', '2']
+    assert all('write failed' in f['error'] for f in result['failed'])
+    assert not chain.store.has_processed('1') and not chain.store.has_processed('2')
+    assert chain.store.has_processed('3')
+
+
+def test_processing_chain_memory_cap_needs_process_isolation(monkeypatch, tmp_path):
+    import modules.processing_chain as pc_mod
+
+    class CappedParser(DummyParser):
+        max_memory = 512 * 1024 * 1024
+
+    monkeypatch.setattr(pc_mod, 'PDFParser', lambda cfg, parser_cfg=None: CappedParser())
+    monkeypatch.setattr(pc_mod, 'DriveWatcher', lambda cfg: DummyWatcher([]))
+    monkeypatch.setattr(pc_mod, 'Writer', lambda cfg: DummyWriter())
+    config = {
+        'store': {'persist_path': str(tmp_path / 'processed.json')},
+        'llm': {'budget': {'persist_path': str(tmp_path / 'usage.sqlite')}},
+        'processing': {'workers': 4},
+    }
+    with pytest.raises(ValueError, match="max_memory_mb"):
+        ProcessingChain(config)
+    ProcessingChain(dict(config, processing={'workers': 4, 'executor': 'process'}))
+
+
+def test_processing_chain_worker_processes_need_a_persisted_budget(monkeypatch, tmp_path):
+    import modules.processing_chain as pc_mod
+    monkeypatch.setattr(pc_mod, 'DriveWatcher', lambda cfg: DummyWatcher([]))
+    monkeypatch.setattr(pc_mod, 'Writer', lambda cfg: DummyWriter())
+    config = {
+        'store': {'persist_path': str(tmp_path / 'processed.json')},
+        'processing': {'timeouts': {'parse_s': 30}},
+    }
+    # Each worker would count LLM usage against its own empty ledger
+    with pytest.raises(ValueError, match="persist_path"):
+        ProcessingChain(config)
+    ProcessingChain(dict(config, llm={'budget': {'persist_path': str(tmp_path / 'usage.sqlite')}}))
+    ProcessingChain(dict(config, processing={}))
@@ -0,0 +1,60 @@
+# tests/test_profiler.py
+import json
+import time
+from modules import profiler
+from modules.profiler import Profiler
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_stage_is_noop_without_active_profile():
+    with profiler.stage('regex'):
+        pass
+    profiler.count('pages')
+    assert profiler.current() is None
+
+
+def test_slowest_documents_report_with_stage_breakdown(tmp_path):
+    prof = Profiler({'enabled': True, 'top_n': 2, 'interval_ms': 1, 'output_dir': str(tmp_path)})
+    for file_id, parse_s in [('fast', 0.01), ('slow', 0.08), ('medium', 0.04)]:
+        with prof.document(file_id, f"{file_id}.pdf") as doc:
+            with profiler.stage('pdf_pages'):
+                busy(parse_s)
+            profiler.count('pages', 3)
+        # Writes happen later, outside the document block
+        with profiler.activate(doc), profiler.stage('write'):
+            busy(0.005)
+        prof.finish(doc)
+
+    assert [d.file_id for d in prof.slowest()] == ['slow', 'medium']
+    out = prof.write_report()
+
+    report = json.loads((tmp_path / 'slowest.json').read_text())
+    assert report['documents_profiled'] == 3
+    slow = report['slowest'][0]
+    assert slow['file_id'] == 'slow'
+    assert set(slow['stages_s']) == {'pdf_pages', 'write'}
+    assert slow['counters'] == {'pages': 3}
+    assert slow['total_s'] >= slow['stages_s']['pdf_pages'] + slow['stages_s']['write']
+
+    stacks = (tmp_path / 'stacks.collapsed').read_text().splitlines()
+    assert out == str(tmp_path)
+    assert any('test_profiler.py:busy' in line for line in stacks)
+
+
+def test_sample_rate_zero_profiles_nothing(tmp_path):
+    prof = Profiler({'enabled': True, 'sample_rate': 0.0, 'output_dir': str(tmp_path)})
+    with prof.document('a') as doc:
+        assert doc is None
+    prof.finish(doc)
+    assert prof.slowest() == []
+
+
+def test_disabled_profiler_writes_no_report(tmp_path):
+    prof = Profiler({'output_dir': str(tmp_path / 'out')})
+    assert prof.write_report() is None
+    assert not (tmp_path / 'out').exists()
@@ -0,0 +1,52 @@
+# tests/test_prompts.py
+import json
+
+import pytest
+
+from modules.prompts import PromptBuilder
+
+LENDERS = [
+    {"name": "acme", "regex_patterns": {"StatementDate": "x", "LoanNumber": "y"},
+     "examples": [{"text": "Statement Date: 01/15/2025", "output": {"StatementDate": "01/15/2025"}}]},
+    {"name": "other", "regex_patterns": {"AmountPrincipal": "z"}},
+]
+
+
+def test_cached_layout_puts_lender_prefix_first_and_text_last():
+    builder = PromptBuilder(LENDERS, {"cache_key": True})
+    request = builder.build("Loan: 7", ["LoanNumber"], lender="acme")
+
+    system, example_user, example_reply, last = request['messages']
+    assert "acme" in system['content'] and "- AmountPrincipal: amount or number" in system['content']
+    assert example_user['content'].endswith("Statement:\nStatement Date: 01/15/2025")
+    # Few-shot replies cover the whole schema, like real replies
+    assert json.loads(example_reply['content']) == {"StatementDate": "01/15/2025", "LoanNumber": None, "AmountPrincipal": None}
+    assert last == {"role": "user", "content": "Fields to fill: LoanNumber\n\nStatement:\nLoan: 7"}
+    assert request['schema_fields'] == ["StatementDate", "LoanNumber", "AmountPrincipal"]
+    assert request['prompt_cache_key'] == "statement-extract:acme"
+    # The prefix is reused verbatim
+    assert builder.build("other", ["StatementDate"], lender="acme")['messages'][0] is system
+    assert len(builder.build("t", ["AmountPrincipal"], lender="other")['messages']) == 2
+
+
+def test_inline_layout_and_unknown_layout():
+    request = PromptBuilder(LENDERS, {"layout": "inline"}).build("text", ["LoanNumber"])
+    assert len(request['messages']) == 1
+    assert request['messages'][0]['content'].startswith("Extract the following fields")
+    assert request['schema_fields'] == ["LoanNumber"]
+    with pytest.raises(ValueError):
+        PromptBuilder(LENDERS, {"layout": "sideways"})
+
+
+def test_short_prompt_prefix_warns_at_startup(caplog):
+    from modules.extractor import Extractor
+    lenders = [{"name": "acme", "regex_patterns": {"LoanNumber": "Loan (?P<value>\\d+)"}}]
+    with caplog.at_level("WARNING"):
+        Extractor(lenders, {"api_key": "test", "model": "m"})
+    assert any("shorter than the 1024 tokens" in r.message and "acme" in r.message for r in caplog.records)
+
+    examples = [{"text": "Loan 42 " * 600, "output": {"LoanNumber": "42"}}]
+    caplog.clear()
+    with caplog.at_level("WARNING"):
+        Extractor(lenders, {"api_key": "test", "model": "m", "prompt": {"examples": examples}})
+    assert not any("shorter than" in r.message for r in caplog.records)
@@ -0,0 +1,74 @@
+# tests/test_records.py
+import math
+from datetime import date
+
+import pytest
+
+from modules.records import RecordBatch, RecordSchema
+
+LENDERS = [{'name': 'l', 'regex_patterns': {'LoanNumber': r'Loan (?P<value>\d+)', 'AmountPrincipal': r'x'}}]
+
+TYPED = {
+    'StatementFileName': 'a.pdf',
+    'StatementDate': date(2025, 1, 15),
+    'MostRecentPaymentDate': None,
+    'MostRecentPaymentAmount': 1234.56,
+    'AmountPrincipal': 2000.0,
+    'AmountInterest': 150.5,
+    'AmountTaxInsurance': 75.25,
+    'AmountUnpaidBalance': 10000.0,
+    'AmountInterestRate': 3.75,
+    'PastDueAmount': 0.0,
+    'LinkToStatement': 'https://x/a',
+    'PropertyAddress': '1 Main St',
+    'LoanNumber': '42',
+}
+
+
+def test_schema_from_lenders_adds_pattern_fields_once():
+    schema = RecordSchema.from_lenders(LENDERS)
+    assert schema.fields.count('AmountPrincipal') == 1
+    assert schema.fields[-1] == 'LoanNumber'
+    assert schema.types['AmountPrincipal'] is float
+    assert schema.types['StatementDate'] is date
+    assert schema.types['LoanNumber'] is str
+
+
+def test_slotted_record_round_trip_and_conversions():
+    schema = RecordSchema.from_lenders(LENDERS)
+    rec = schema.record(dict(TYPED, needs_review=False))
+    assert not hasattr(rec, '__dict__')
+    assert rec['LoanNumber'] == '42'
+    assert rec.get('needs_review') is False
+    assert 'Missing' not in rec
+    assert rec.to_dict() == dict(TYPED, needs_review=False)
+    assert rec.to_row(['LoanNumber', 'Nope', 'PastDueAmount']) == ['42', '', 0.0]
+    assert rec.to_statement_record().AmountInterestRate == 3.75
+    with pytest.raises(KeyError):
+        rec['Missing']
+
+
+def test_batch_packs_typed_columns_and_round_trips_everything_else():
+    schema = RecordSchema.from_lenders(LENDERS)
+    json_mode = dict(TYPED, StatementDate='2025-01-15')
+    raw = {'StatementDate': '01/15/2025', 'AmountPrincipal': '$2,000.00', 'Extra': [1], 'PastDueAmount': 5}
+    batch = RecordBatch(schema, [TYPED, json_mode, raw])
+
+    assert len(batch) == 3
+    assert batch[0] == TYPED
+    assert batch[1] == json_mode
+    assert batch[-1] == raw
+    assert batch[1:] == [json_mode, raw]
+    # Typed values live in the packed columns
+    principal = batch.column('AmountPrincipal')
+    assert principal.typecode == 'd' and principal[0] == 2000.0 and math.isnan(principal[2])
+    assert list(batch.column('StatementDate')[:2]) == [date(2025, 1, 15).toordinal(), -date(2025, 1, 15).toordinal()]
+    # Text columns share one copy of each distinct string
+    batch.append(dict(TYPED, PropertyAddress=''.join(['1 Main ', 'St'])))
+    column = batch.column('PropertyAddress')
+    assert column[0] is column[3]
+
+    rows = batch.to_rows(['StatementFileName', 'AmountPrincipal'])
+    assert rows[0] == ['a.pdf', 2000.0] and rows[2] == ['', '$2,000.00']
+    statements = RecordBatch(schema, [TYPED, json_mode]).to_statement_records()
+    assert [s.StatementDate for s in statements] == [date(2025, 1, 15)] * 2
@@ -0,0 +1,67 @@
+# tests/test_scheduler.py
+import pytest
+from modules.scheduler import Scheduler
+
+FILES = [
+    {'id': 'big', 'name': 'acme_bundle.pdf', 'size': str(300 * 1024 * 1024), 'modifiedTime': '2025-01-01T00:00:00Z'},
+    {'id': 'small', 'name': 'acme_1.pdf', 'size': str(100 * 1024), 'modifiedTime': '2025-01-01T00:05:00Z'},
+    {'id': 'mid', 'name': 'vip_1.pdf', 'size': str(2 * 1024 * 1024), 'modifiedTime': '2025-01-01T00:03:00Z'},
+]
+
+
+def ids(scheduler, files=FILES):
+    return [m['id'] for m in scheduler.order(iter(files))]
+
+
+def test_fifo_keeps_listing_order():
+    assert ids(Scheduler({})) == ['big', 'small', 'mid']
+
+
+def test_newest_and_smallest_policies():
+    assert ids(Scheduler({'policy': 'newest'})) == ['small', 'mid', 'big']
+    assert ids(Scheduler({'policy': 'smallest'})) == ['small', 'mid', 'big']
+
+
+def test_deadline_uses_tenant_sla():
+    cfg = {
+        'policy': 'deadline',
+        'default_sla_minutes': 60,
+        'tenants': [{'name': 'vip', 'pattern': 'vip_*', 'sla_minutes': 1}],
+    }
+    # vip: 00:04, big: 01:00, small: 01:05
+    assert ids(Scheduler(cfg)) == ['mid', 'big', 'small']
+
+
+def test_aging_lets_old_large_files_through():
+    old_big = {'id': 'old', 'size': str(50 * 1024 * 1024), 'modifiedTime': '2025-01-01T00:00:00Z'}
+    new_small = {'id': 'new', 'size': str(1024 * 1024), 'modifiedTime': '2025-01-01T02:00:00Z'}
+    # 120 minutes of waiting outweighs 49 MB at 1 MB/minute
+    assert ids(Scheduler({'policy': 'aging'}), [new_small, old_big]) == ['old', 'new']
+    # A slow aging rate behaves like smallest-first
+    assert ids(Scheduler({'policy': 'aging', 'aging_mb_per_minute': 0.1}), [new_small, old_big]) == ['new', 'old']
+
+
+def test_window_bounds_reordering():
+    assert ids(Scheduler({'policy': 'smallest', 'window': 2})) == ['small', 'mid', 'big']
+    files = FILES + [{'id': 'tiny', 'size': '1'}]
+    # 'big' is released once the window of 2 fills with 'small'
+    assert ids(Scheduler({'policy': 'smallest', 'window': 2}), files) == ['small', 'mid', 'tiny', 'big']
+
+
+def test_wait_report():
+    now = [100.0]
+    scheduler = Scheduler({'policy': 'smallest'}, clock=lambda: now[0])
+    for i, meta in enumerate(scheduler.order(iter(FILES))):
+        now[0] += 10
+        scheduler.started(meta)
+    report = scheduler.report()
+    assert report['files'] == 3
+    assert report['waits']['small']['wait_s'] == 10
+    assert report['waits']['big']['wait_s'] == 30
+    assert report['max_wait_s'] == 30
+    assert report['p50_wait_s'] == 20
+
+
+def test_unknown_policy_rejected():
+    with pytest.raises(ValueError):
+        Scheduler({'policy': 'random'})
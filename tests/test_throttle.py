@@ -0,0 +1,105 @@
+# tests/test_throttle.py
+import pytest
+import requests
+from modules.throttle import AdaptiveThrottler, get_throttler, rate_limit_info
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+    def __call__(self):
+        return self.now
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def rate_limited_error(retry_after=None):
+    response = requests.Response()
+    response.status_code = 429
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(retry_after)
+    return requests.HTTPError("429 Too Many Requests", response=response)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_token_bucket_limits_burst(clock):
+    throttler = AdaptiveThrottler('test', rate=5.0, burst=5, clock=clock, sleep=clock.sleep)
+    for _ in range(5):
+        assert throttler.acquire() == 0.0
+    # Sixth request waits for one token to refill
+    assert throttler.acquire() == pytest.approx(0.2)
+
+
+def test_rate_limited_call_honors_retry_after_and_backs_off(clock):
+    throttler = AdaptiveThrottler('test', rate=4.0, burst=4, clock=clock, sleep=clock.sleep)
+    attempts = []
+
+    def flaky():
+        attempts.append(clock.now)
+        if len(attempts) == 1:
+            raise rate_limited_error(retry_after=3)
+        return "ok"
+
+    assert throttler.call(flaky) == "ok"
+    assert attempts[1] >= 3.0
+    assert throttler.metrics()['rate_limited'] == 1
+    # Rate halved on 429, then recovers slightly on success
+    assert throttler.rate == pytest.approx(2.0 + 4.0 * 0.05)
+
+
+def test_non_rate_limit_errors_are_raised(clock):
+    throttler = AdaptiveThrottler('test', rate=1.0, clock=clock, sleep=clock.sleep)
+
+    def broken():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        throttler.call(broken)
+
+
+def test_gives_up_after_max_retries(clock):
+    throttler = AdaptiveThrottler('test', rate=10.0, max_retries=2, clock=clock, sleep=clock.sleep)
+
+    def always_limited():
+        raise rate_limited_error()
+
+    with pytest.raises(requests.HTTPError):
+        throttler.call(always_limited)
+    assert throttler.metrics()['rate_limited'] == 2
+    assert throttler.rate >= throttler.min_rate
+
+
+def test_rate_limit_info_parses_headers():
+    assert rate_limit_info(rate_limited_error(retry_after=7)) == (True, 7.0)
+    assert rate_limit_info(rate_limited_error()) == (True, None)
+    assert rate_limit_info(ValueError()) == (False, None)
+
+
+def test_throttlers_are_shared_per_destination():
+    a = get_throttler('airtable', 'base-shared-test')
+    b = get_throttler('airtable', 'base-shared-test')
+    c = get_throttler('airtable', 'other-base-test')
+    assert a is b
+    assert a is not c
+    assert a.max_rate == 5.0
+
+
+def test_sheets_default_quota_holds_over_any_minute(clock):
+    from modules.throttle import DEFAULT_QUOTAS, TokenBucket
+    bucket = TokenBucket(*DEFAULT_QUOTAS['sheets'], clock)
+    # Idle long enough to fill the bucket, then send as fast as allowed
+    clock.sleep(60)
+    start, sent = clock(), 0
+    while clock() - start <= 60:
+        wait = bucket.try_acquire()
+        if wait:
+            clock.sleep(max(wait, 1e-6))
+        else:
+            sent += 1
+    assert sent <= 60
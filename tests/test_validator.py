@@ -0,0 +1,63 @@
+# tests/test_validator.py
+import pytest
+from datetime import date
+from modules.validator import RecordValidator
+from modules.utils import parse_date, parse_currency
+
+
+def make_raw(**overrides):
+    raw = {
+        "StatementFileName": "stmt1.pdf",
+        "StatementDate": "01/15/2025",
+        "MostRecentPaymentDate": "Jan 2, 2025",
+        "MostRecentPaymentAmount": "$1,234.56",
+        "AmountPrincipal": "2,000.00",
+        "AmountInterest": "150.50",
+        "AmountTaxInsurance": "$75.25",
+        "AmountUnpaidBalance": "10,000.00",
+        "AmountInterestRate": "3.75%",
+        "PastDueAmount": "$200.00",
+        "LinkToStatement": "https://drive.google.com/file/d/ABC123/view",
+        "PropertyAddress": "123 Main St, Anytown, USA",
+    }
+    raw.update(overrides)
+    return raw
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("01/15/2025", date(2025, 1, 15)),
+    ("2025-01-15", date(2025, 1, 15)),
+    ("January 15, 2025", date(2025, 1, 15)),
+    ("1/15/25", date(2025, 1, 15)),
+    # Not a fast-path format: handled by the dateutil fallback
+    ("15 Jan 2025 10:30", date(2025, 1, 15)),
+])
+def test_parse_date_formats(value, expected):
+    assert parse_date(value) == expected
+
+
+def test_parse_currency_fast_and_slow_paths():
+    assert parse_currency("1234.56") == 1234.56
+    assert parse_currency("$1,234.56") == 1234.56
+    assert parse_currency("3.75%") == 3.75
+    assert parse_currency(12) == 12.0
+
+
+def test_validate_batch_all_valid():
+    validator = RecordValidator({"batch_size": 10})
+    valid, invalid = validator.validate_batch([make_raw(), make_raw(StatementFileName="b.pdf")])
+    assert invalid == []
+    assert [i for i, _ in valid] == [0, 1]
+    assert valid[0][1].MostRecentPaymentDate == date(2025, 1, 2)
+    assert valid[1][1].StatementFileName == "b.pdf"
+
+
+def test_validate_batch_isolates_invalid_records():
+    validator = RecordValidator({})
+    records = [make_raw(), make_raw(AmountPrincipal="n/a"), make_raw(StatementFileName="c.pdf")]
+    valid, invalid = validator.validate_batch(records)
+    assert [i for i, _ in valid] == [0, 2]
+    assert valid[1][1].StatementFileName == "c.pdf"
+    assert len(invalid) == 1
+    assert invalid[0][0] == 1
+    assert "AmountPrincipal" in invalid[0][1]
@@ -5,8 +5,26 @@ from modules.writer import Writer
 class DummyWorksheet:
     def __init__(self):
         self.rows = []
+        self.calls = []
     def append_row(self, row):
         self.rows.append(row)
+    def row_values(self, index):
+        return self.rows[index - 1] if len(self.rows) >= index else []
+    def insert_row(self, row, index):
+        self.rows.insert(index - 1, row)
+    def col_values(self, col):
+        self.calls.append('col_values')
+        return [r[col - 1] for r in self.rows]
+    def append_rows(self, rows):
+        self.calls.append('append_rows')
+        start = len(self.rows) + 1
+        self.rows.extend(rows)
+        return {'updates': {'updatedRange': f"Sheet1!A{start}:C{len(self.rows)}"}}
+    def batch_update(self, data):
+        self.calls.append('batch_update')
+        for item in data:
+            row = int(item['range'].split(':')[0][1:])
+            self.rows[row - 1] = item['values'][0]
 
 class DummySpreadsheet:
     def __init__(self):
@@ -29,6 +47,16 @@ class DummyAirtable:
     def insert(self, data):
         self.records.append(data)
         return data
+    def get_all(self, fields):
+        return [{'id': f"rec{i}", 'fields': r} for i, r in enumerate(self.records)]
+    def batch_insert(self, records):
+        created = []
+        for r in records:
+            created.append({'id': f"rec{len(self.records)}", 'fields': r})
+            self.records.append(r)
+        return created
+    def update(self, record_id, fields):
+        self.records[int(record_id[3:])] = fields
 
 @pytest.fixture(autouse=True)
 def patch_clients(monkeypatch):
@@ -63,3 +91,166 @@ def test_append_record_to_airtable():
     # DummyAirtable should have recorded insertion
     at = writer._airtable  # internal reference
     assert at.records == [record]
+
+
+def test_upsert_sheets_updates_existing_rows(tmp_path):
+    index_path = tmp_path / "row_index.json"
+    config = {
+        'type': 'sheets',
+        'sheets': {'spreadsheet_id': 'sheet123', 'headers': ['File', 'Amount', 'Date']},
+        'upsert': {'enabled': True, 'key': ['File'], 'index_path': str(index_path), 'batch_size': 10},
+    }
+    writer = Writer(config)
+    ws = writer._worksheet
+    ws.rows.append(['a.pdf', '1.00', '2025-01-01'])
+
+    writer.append_record({'File': 'a.pdf', 'Amount': '2.00', 'Date': '2025-02-01'})
+    writer.append_record({'File': 'b.pdf', 'Amount': '3.00', 'Date': '2025-02-01'})
+    # Retried record replaces the pending one instead of adding a row
+    writer.append_record({'File': 'b.pdf', 'Amount': '4.00', 'Date': '2025-02-01'})
+    assert len(ws.rows) == 2
+    writer.flush()
+
+    assert ws.rows == [
+        ['File', 'Amount', 'Date'],
+        ['a.pdf', '2.00', '2025-02-01'],
+        ['b.pdf', '4.00', '2025-02-01'],
+    ]
+    # One bulk index read, one batched update, one bulk append
+    assert ws.calls == ['col_values', 'batch_update', 'append_rows']
+
+    # A later retry reuses the synced index without re-reading the sheet
+    writer.append_record({'File': 'b.pdf', 'Amount': '5.00', 'Date': '2025-02-01'})
+    writer.flush()
+    assert ws.rows[2] == ['b.pdf', '5.00', '2025-02-01']
+    assert ws.calls.count('col_values') == 1
+    assert index_path.exists()
+
+
+def test_upsert_airtable_by_composite_key():
+    config = {
+        'type': 'airtable',
+        'airtable': {'base_id': 'base123', 'table_name': 'Table', 'api_key': 'keyabc'},
+        'upsert': {'enabled': True, 'key': ['PropertyAddress', 'StatementDate'], 'batch_size': 1},
+    }
+    writer = Writer(config)
+    writer.append_record({'PropertyAddress': '1 Main St', 'StatementDate': '2025-01-01', 'Amount': 1})
+    writer.append_record({'PropertyAddress': '1 Main St', 'StatementDate': '2025-01-01', 'Amount': 2})
+    writer.append_record({'PropertyAddress': '1 Main St', 'StatementDate': '2025-02-01', 'Amount': 3})
+    assert [r['Amount'] for r in writer._airtable.records] == [2, 3]
+
+
+def test_upsert_key_must_be_in_headers():
+    config = {
+        'type': 'sheets',
+        'sheets': {'spreadsheet_id': 'sheet123', 'headers': ['File']},
+        'upsert': {'enabled': True, 'key': ['Missing']},
+    }
+    with pytest.raises(ValueError):
+        Writer(config)
+
+
+LOCAL_HEADERS = ['StatementFileName', 'StatementDate', 'AmountPrincipal']
+LOCAL_RECORDS = [
+    {'StatementFileName': 'a.pdf', 'StatementDate': '01/15/2025', 'AmountPrincipal': '$2,000.00'},
+    {'StatementFileName': 'b.pdf', 'StatementDate': '2025-02-15', 'AmountPrincipal': 'n/a'},
+]
+
+
+def test_csv_output_streams_typed_rows(tmp_path):
+    path = tmp_path / "out.csv"
+    writer = Writer({'type': 'csv', 'csv': {'path': str(path), 'headers': LOCAL_HEADERS}})
+    for rec in LOCAL_RECORDS:
+        writer.append_record(rec)
+    writer.close()
+    assert path.read_text().splitlines() == [
+        'StatementFileName,StatementDate,AmountPrincipal',
+        'a.pdf,2025-01-15,2000.0',
+        'b.pdf,2025-02-15,',
+    ]
+
+
+def test_sqlite_output_wal_and_upsert(tmp_path):
+    import sqlite3
+    path = tmp_path / "out.db"
+    config = {
+        'type': 'sqlite',
+        'sqlite': {'path': str(path), 'headers': LOCAL_HEADERS, 'batch_size': 10},
+        'upsert': {'enabled': True, 'key': ['StatementFileName']},
+    }
+    writer = Writer(config)
+    for rec in LOCAL_RECORDS:
+        writer.append_record(rec)
+    writer.append_record(dict(LOCAL_RECORDS[0], AmountPrincipal='2500'))
+    writer.close()
+
+    conn = sqlite3.connect(str(path))
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    rows = conn.execute("SELECT * FROM statements ORDER BY StatementFileName").fetchall()
+    assert rows == [('a.pdf', '2025-01-15', 2500.0), ('b.pdf', '2025-02-15', None)]
+
+
+def test_parquet_output_row_groups(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    out_dir = tmp_path / "parquet"
+    config = {'type': 'parquet', 'parquet': {'path': str(out_dir), 'headers': LOCAL_HEADERS, 'row_group_size': 1}}
+    writer = Writer(config)
+    for rec in LOCAL_RECORDS:
+        writer.append_record(rec)
+    writer.close()
+
+    parts = list(out_dir.glob('*.parquet'))
+    assert len(parts) == 1
+    pf = pq.ParquetFile(str(parts[0]))
+    assert pf.num_row_groups == 2
+    table = pf.read()
+    assert str(table.schema.field('StatementDate').type) == 'date32[day]'
+    assert table.column('AmountPrincipal').to_pylist() == [2000.0, None]
+
+
+def test_parquet_checkpointed_rows_survive_a_crash(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    out_dir = tmp_path / "parquet"
+    config = {'type': 'parquet', 'parquet': {'path': str(out_dir), 'headers': LOCAL_HEADERS}}
+    writer = Writer(config)
+    for rec in LOCAL_RECORDS:
+        writer.append_record(rec)
+    writer.checkpoint()
+    writer.flush()
+    writer.append_record({'StatementFileName': 'lost.pdf'})
+    # Crash: the part is never finished, the last row never checkpointed
+    writer._sink._writer = None
+
+    Writer(config).close()
+    parts = list(out_dir.glob('*.parquet'))
+    assert len(parts) == 1
+    table = pq.read_table(str(parts[0]))
+    assert table.column('StatementFileName').to_pylist() == ['a.pdf', 'b.pdf']
+    assert str(table.schema.field('StatementDate').type) == 'date32[day]'
+    assert [p.name for p in out_dir.iterdir()] == [parts[0].name]
+
+
+def test_local_checkpoint_makes_rows_readable_before_close(tmp_path):
+    import sqlite3
+    pq = pytest.importorskip('pyarrow.parquet')
+    out_dir = tmp_path / "parquet"
+    writer = Writer({'type': 'parquet', 'parquet': {'path': str(out_dir), 'headers': LOCAL_HEADERS}})
+    writer.append_record(LOCAL_RECORDS[0])
+    writer.checkpoint()
+    writer.append_record(LOCAL_RECORDS[1])
+    writer.checkpoint()
+    # Checkpoints spool rows instead of finishing a part file per checkpoint
+    assert list(out_dir.glob('*.parquet')) == []
+    assert len((out_dir / '_pending.jsonl').read_text().splitlines()) == 2
+    writer.close()
+    parts = list(out_dir.glob('*.parquet'))
+    assert len(parts) == 1
+    assert pq.read_table(str(parts[0])).num_rows == 2
+    assert not (out_dir / '_pending.jsonl').exists()
+
+    path = tmp_path / "out.db"
+    writer = Writer({'type': 'sqlite', 'sqlite': {'path': str(path), 'headers': LOCAL_HEADERS, 'batch_size': 100}})
+    writer.append_record(LOCAL_RECORDS[0])
+    writer.checkpoint()
+    assert sqlite3.connect(str(path)).execute("SELECT COUNT(*) FROM statements").fetchone()[0] == 1
+    writer.close()